@@ -0,0 +1,127 @@
+"""
+Size and load time of the training dataset, before (dense TF-IDF .npy, float32 image
+features and int64 labels, read fully with np.load) and after (dataset package: CSR text,
+float16 image features, uint8 labels and a manifest). Also times building the package and
+checking it again when nothing changed.
+
+Load times are measured cold: the page cache of the files is dropped first
+(posix_fadvise), as after copying them into a fresh container.
+
+Usage:
+    python -m benchmarks.bench_dataset_package --rows 20000 --vocabulary 5000 --image-dim 1280
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from src.api.dataset_package import build_dataset_package, load_dataset_package
+from src.api.sparse_features import save_text_features
+
+
+# Function to write a synthetic dataset in the original dense layout and as the CSR source of the package
+def write_sources(directory, rows, vocabulary, image_dim, density, num_classes):
+    rng = np.random.default_rng(0)
+    text = sp.random(rows, vocabulary, density=density, format='csr', dtype=np.float32, random_state=0)
+    paths = {
+        'dense_text': os.path.join(directory, 'X_train_tfidf_balanced.npy'),
+        'text': os.path.join(directory, 'X_train_tfidf_balanced.npz'),
+        'image_features': os.path.join(directory, 'train_image_features_balanced.npy'),
+        'labels': os.path.join(directory, 'Y_train_balanced.npy'),
+    }
+    np.save(paths['dense_text'], text.toarray())
+    save_text_features(paths['text'], text)
+    images = np.lib.format.open_memmap(paths['image_features'], mode='w+', dtype=np.float32, shape=(rows, image_dim))
+    for start in range(0, rows, 10000):
+        # Pooled EfficientNet features are non-negative activations of a few units
+        images[start:start + 10000] = rng.gamma(1.0, 0.5, size=images[start:start + 10000].shape)
+    images.flush()
+    del images
+    np.save(paths['labels'], rng.integers(0, num_classes, rows).astype(np.int64))
+    return paths
+
+
+# Function to drop the page cache of a directory tree, so the next read comes from disk
+def drop_cache(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def directory_size(paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def load_before(paths):
+    text = np.load(paths['dense_text'])
+    images = np.load(paths['image_features'])
+    labels = np.load(paths['labels'])
+    return text.shape[0] + images.shape[0] + labels.shape[0]
+
+
+def load_after(package_dir):
+    text, images, labels, _ = load_dataset_package(package_dir)
+    # Read every image row once, as an epoch does
+    checksum = sum(float(np.asarray(images[start:start + 10000], dtype=np.float32).sum())
+                   for start in range(0, images.shape[0], 10000))
+    return text.shape[0] + labels.shape[0] + int(checksum > 0)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help="Rows of the dataset")
+    parser.add_argument('--vocabulary', type=int, default=5000, help="Columns of the TF-IDF features")
+    parser.add_argument('--density', type=float, default=0.005, help="Fraction of non-zero TF-IDF values")
+    parser.add_argument('--image-dim', type=int, default=1280, help="Size of the pooled image features")
+    parser.add_argument('--classes', type=int, default=27, help="Number of classes")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_sources(directory, args.rows, args.vocabulary, args.image_dim, args.density, args.classes)
+        sources = {name: paths[name] for name in ('text', 'image_features', 'labels')}
+        package_dir = os.path.join(directory, 'dataset')
+
+        build_seconds, (manifest, _) = timed(build_dataset_package, package_dir, sources)
+        check_seconds, (_, rebuilt) = timed(build_dataset_package, package_dir, sources)
+        assert not rebuilt
+        # Sources copied again (new modification times, same content): reused after hashing
+        for path in sources.values():
+            os.utime(path)
+        rehash_seconds, (_, rebuilt) = timed(build_dataset_package, package_dir, sources)
+        assert not rebuilt
+
+        before_size = directory_size([paths['dense_text'], paths['image_features'], paths['labels']])
+        after_size = directory_size([os.path.join(package_dir, name) for name in os.listdir(package_dir)])
+        drop_cache(directory)
+        before_seconds, _ = timed(load_before, paths)
+        drop_cache(directory)
+        after_seconds, _ = timed(load_after, package_dir)
+
+        print(f"Rows: {args.rows}, vocabulary: {args.vocabulary}, image features: {args.image_dim}, "
+              f"package {manifest['fingerprint']}")
+        print(f"before  size={before_size / 1e6:9.1f} MB  cold load={before_seconds:7.2f} s")
+        print(f"after   size={after_size / 1e6:9.1f} MB  cold load={after_seconds:7.2f} s  "
+              f"({before_size / after_size:.1f}x smaller, {before_seconds / after_seconds:.1f}x faster)")
+        print(f"package build={build_seconds:.2f} s  unchanged check={check_seconds * 1000:.1f} ms  "
+              f"check after copy (hashing)={rehash_seconds:.2f} s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
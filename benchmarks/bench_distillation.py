@@ -0,0 +1,104 @@
+"""
+Teacher (the architecture of `retrain_model()`) versus the compact student distilled from
+it by `distillation.py`, on a synthetic balanced dataset whose class is visible in both the
+terms and the image features.
+
+Reports parameters, artifact sizes, weighted F1 on the test split, agreement with the
+teacher and the latency of one product through the head (Keras `predict_on_batch` and the
+dynamic-range TFLite 'head' signature). Both models share the image backbone, whose time per
+image is measured once and added to give the latency of a whole /predict request (set
+BACKBONE_WEIGHTS=none to run without the ImageNet weights).
+
+Usage:
+    python -m benchmarks.bench_distillation --rows 20000 --text-dim 5000 --epochs 15
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.metrics import f1_score
+from tensorflow.keras.callbacks import EarlyStopping
+
+from benchmarks.bench_incremental_training import make_products
+from benchmarks.bench_text_reduction import request_latency
+from src.api.config import BACKBONE_WEIGHTS
+from src.api.distillation import distill_student
+from src.api.image_features import IMAGE_FEATURE_DIM, extract_image_features, load_feature_extractor
+from src.api.retrain_model import build_model
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.tflite_model import export_tflite, TFLiteModel
+from src.api.training_data import compute_split_indices
+
+
+# Function to time the shared backbone on one image, as in a /predict request
+def backbone_latency(n_requests=30):
+    load_feature_extractor(None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS)
+    image = np.random.default_rng(0).uniform(0, 255, (1, 224, 224, 3)).astype(np.float32)
+    extract_image_features(image)
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        extract_image_features(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help="Products of the dataset")
+    parser.add_argument('--text-dim', type=int, default=5000, help="Size of the TF-IDF vocabulary")
+    parser.add_argument('--epochs', type=int, default=15, help="Maximum training epochs of each model")
+    parser.add_argument('--student-text-dim', type=int, default=128, help="SVD dimensions of the student's text input")
+    parser.add_argument('--requests', type=int, default=200, help="Single-product requests timed per model")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    text, images, labels = make_products(args.rows, args.text_dim, IMAGE_FEATURE_DIM, rng)
+    # Noisier images than the default, so the text branch matters
+    images = images + rng.normal(scale=4.0, size=images.shape).astype(np.float32)
+    splits = compute_split_indices(args.rows)
+    backbone_ms = backbone_latency()
+
+    start = time.perf_counter()
+    teacher = build_model(text.shape[1], images.shape[1], int(labels.max()) + 1)
+    teacher.fit(
+        SparseFeatureDataset(text, images, labels, batch_size=64, shuffle=True, indices=splits['train']),
+        epochs=args.epochs,
+        validation_data=SparseFeatureDataset(text, images, labels, batch_size=256, indices=splits['val']),
+        callbacks=[EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)],
+        verbose=0,
+    )
+    teacher_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    student, _ = distill_student(teacher, text, images, labels, splits, text_dim=args.student_text_dim, epochs=args.epochs)
+    student_seconds = time.perf_counter() - start
+
+    test_dataset = SparseFeatureDataset(text, images, batch_size=256, indices=splits['test'])
+    teacher_predictions = np.argmax(teacher.predict(test_dataset, verbose=0), axis=1)
+    test_rows = splits['test'][:args.requests]
+    directory = tempfile.mkdtemp()
+    try:
+        print(f"Rows: {args.rows}, vocabulary: {args.text_dim}, image features: {IMAGE_FEATURE_DIM}, "
+              f"backbone: {backbone_ms:.2f} ms per image")
+        for name, model, seconds in (('teacher', teacher, teacher_seconds), ('student', student, student_seconds)):
+            predictions = np.argmax(model.predict(test_dataset, verbose=0), axis=1)
+            keras_path = os.path.join(directory, f"{name}.keras")
+            model.save(keras_path)
+            tflite_path = os.path.join(directory, f"{name}.tflite")
+            export_tflite(model, tflite_path, quantization='dynamic')
+            p50, p99 = request_latency(model, text[test_rows], images[test_rows], len(test_rows))
+            tflite_p50, tflite_p99 = request_latency(TFLiteModel(tflite_path), text[test_rows], images[test_rows], len(test_rows))
+            print(f"{name:<8} params={model.count_params():>9,}  keras={os.path.getsize(keras_path) / 1e6:6.2f} MB  "
+                  f"tflite={os.path.getsize(tflite_path) / 1e6:5.2f} MB  "
+                  f"F1={f1_score(labels[splits['test']], predictions, average='weighted'):.4f}  "
+                  f"agreement={np.mean(predictions == teacher_predictions):.4f}  train={seconds:6.1f} s")
+            print(f"         head keras p50={p50:5.2f} ms p99={p99:5.2f} ms  tflite p50={tflite_p50:5.2f} ms "
+                  f"p99={tflite_p99:5.2f} ms  request (backbone + tflite head) p50={backbone_ms + tflite_p50:6.2f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-request latency of the image branch of /predict, before and after sharing the
+EfficientNetB0 feature extractor across requests.
+
+Usage:
+    python -m benchmarks.bench_feature_extractor --requests 20 --weights imagenet
+"""
+import argparse
+import time
+import numpy as np
+from PIL import Image
+from tensorflow.keras.applications import EfficientNetB0
+from tensorflow.keras.layers import GlobalAveragePooling2D
+
+from src.api.util_model import preprocess_image
+from src.api.image_features import load_feature_extractor, warmup_feature_extractor, extract_image_features
+
+
+# Function to reproduce the previous behaviour: a new backbone for every request
+def per_request_backbone(processed_image, weights):
+    image_features = EfficientNetB0(weights=weights, include_top=False)(processed_image)
+    return GlobalAveragePooling2D()(image_features).numpy()
+
+
+# Function to time a callable over several requests
+def time_requests(fn, n_requests):
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def report(name, latencies):
+    print(f"{name:<22} mean={latencies.mean():9.1f} ms  p50={np.percentile(latencies, 50):9.1f} ms  "
+          f"p99={np.percentile(latencies, 99):9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20, help="Number of simulated requests per variant")
+    parser.add_argument('--weights', default='imagenet', help="'imagenet' or 'none' (offline runs)")
+    args = parser.parse_args()
+    weights = None if args.weights.lower() == 'none' else args.weights
+
+    image = Image.fromarray(np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8))
+
+    before = time_requests(lambda: per_request_backbone(preprocess_image(image), weights), args.requests)
+
+    start = time.perf_counter()
+    load_feature_extractor(weights)
+    warmup_feature_extractor()
+    startup_ms = (time.perf_counter() - start) * 1000
+    after = time_requests(lambda: extract_image_features(preprocess_image(image)), args.requests)
+
+    print(f"Requests per variant: {args.requests}, weights: {weights}")
+    report("before (per request)", before)
+    report("after (shared)", after)
+    print(f"One-off startup cost of the shared extractor: {startup_ms:.1f} ms")
+    print(f"Mean speed-up: {before.mean() / after.mean():.1f}x")
+
+
+if __name__ == "__main__":
+    main()
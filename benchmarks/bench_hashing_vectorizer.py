@@ -0,0 +1,118 @@
+"""
+Transform throughput and per-worker memory of the fitted TF-IDF vectorizer (joblib, with
+its vocabulary dict) versus the stateless hashing vectorizer built from it (hashed columns
+weighted by a memory-mapped IDF array).
+
+Memory is measured in fresh interpreters after importing scikit-learn, loading the
+vectorizer and transforming a batch of texts: RssAnon is the private memory every uvicorn
+worker pays again, RssFile the file-backed pages (the memory-mapped IDF array) that forked
+workers share through the page cache. The texts are drawn from the vocabulary of the
+vectorizer, with a few unknown words.
+
+Usage:
+    python -m benchmarks.bench_hashing_vectorizer --vectorizer src/models/Tfidf_Vectorizer.joblib --texts 20000 --n-features 16384
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from joblib import load as joblib_load
+
+from src.api.hashing_vectorizer import build_hashing_vectorizer, load_text_vectorizer
+
+# Load a vectorizer in a fresh interpreter, transform the texts and print the memory it uses
+MEMORY_SNIPPET = """
+import json, sys
+def read_status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+import numpy, scipy.sparse, sklearn.feature_extraction.text, joblib
+before = {{field: read_status(field) for field in ('RssAnon', 'RssFile')}}
+from src.api.hashing_vectorizer import load_text_vectorizer
+vectorizer = load_text_vectorizer({path!r})
+with open({texts_path!r}) as f:
+    texts = json.load(f)
+vectorizer.transform(texts)
+print(json.dumps({{field: read_status(field) - before[field] for field in ('RssAnon', 'RssFile')}}))
+"""
+
+
+# Function to draw product texts from the vocabulary of the vectorizer
+def make_texts(vectorizer, n_texts, words_per_text, rng):
+    vocabulary = np.asarray(vectorizer.get_feature_names_out())
+    unknown = np.array([f"inconnu{index}" for index in range(1000)])
+    texts = []
+    for _ in range(n_texts):
+        words = list(rng.choice(vocabulary, words_per_text)) + list(rng.choice(unknown, 2))
+        texts.append(' '.join(words))
+    return texts
+
+
+# Function to measure the transform throughput of a vectorizer, one request at a time and in batches
+def throughput(vectorizer, texts, batch_size):
+    vectorizer.transform(texts[:batch_size])
+    start = time.perf_counter()
+    for text in texts[:2000]:
+        vectorizer.transform([text])
+    single = min(len(texts), 2000) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        vectorizer.transform(texts[offset:offset + batch_size])
+    batched = len(texts) / (time.perf_counter() - start)
+    return single, batched
+
+
+# Function to get the size of a vectorizer file and the arrays saved next to it
+def artifact_size(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.startswith(stem + '.'))
+
+
+# Function to run the memory snippet in a fresh interpreter and read the JSON line it prints
+def run_fresh(path, texts_path):
+    snippet = MEMORY_SNIPPET.format(path=path, texts_path=texts_path)
+    output = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectorizer', default='src/models/Tfidf_Vectorizer.joblib', help="Fitted TF-IDF vectorizer")
+    parser.add_argument('--texts', type=int, default=20000, help="Number of texts transformed")
+    parser.add_argument('--words', type=int, default=12, help="Known words per text")
+    parser.add_argument('--batch-size', type=int, default=256, help="Texts per transform call in batched mode")
+    parser.add_argument('--n-features', type=int, default=2 ** 14, help="Columns of the hashing vectorizer")
+    args = parser.parse_args()
+
+    tfidf = joblib_load(args.vectorizer)
+    texts = make_texts(tfidf, args.texts, args.words, np.random.default_rng(0))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hashing_path = os.path.join(tmp_dir, 'Hashing_Vectorizer.json')
+        build_hashing_vectorizer(args.vectorizer, hashing_path, args.n_features)
+        texts_path = os.path.join(tmp_dir, 'texts.json')
+        with open(texts_path, 'w') as f:
+            json.dump(texts[:args.batch_size], f)
+
+        print(f"Texts: {args.texts}, vocabulary: {len(tfidf.vocabulary_)}, hashed columns: {args.n_features}")
+        for name, path in (('tfidf', args.vectorizer), ('hashing', hashing_path)):
+            size = artifact_size(path)
+            start = time.perf_counter()
+            vectorizer = load_text_vectorizer(path)
+            load_seconds = time.perf_counter() - start
+            single, batched = throughput(vectorizer, texts, args.batch_size)
+            memory = run_fresh(path, texts_path)
+            print(f"{name:<8} artifact={size / 1e6:6.2f} MB  load={load_seconds * 1000:7.1f} ms  "
+                  f"single={single:8.0f} texts/s  batched={batched:8.0f} texts/s  "
+                  f"worker RssAnon=+{memory['RssAnon']:5.1f} MB  RssFile=+{memory['RssFile']:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
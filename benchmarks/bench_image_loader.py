@@ -0,0 +1,78 @@
+"""
+Throughput of the image input pipeline of training (read, decode and preprocess the stored
+product images) with the ParallelImageLoader, for several numbers of decoding threads.
+With --backbone the EfficientNetB0 features are also computed, so decoding overlaps the
+forward passes (set BACKBONE_WEIGHTS=none to run without the ImageNet weights).
+
+Usage:
+    python -m benchmarks.bench_image_loader --images 256 --workers 0 1 2 4 8 --width 1200 --height 900
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from src.api.config import BACKBONE_WEIGHTS
+from src.api.image_features import load_feature_extractor
+from src.api.image_loader import ParallelImageLoader
+from src.api.util_model import preprocess_image, compute_image_features
+from benchmarks.bench_image_preprocessing import make_jpeg
+
+
+# Function to write the same photo-like JPEG under several file names, like the product images
+def write_images(directory, n_images, width, height):
+    data = make_jpeg(width, height)
+    paths = []
+    for index in range(n_images):
+        path = os.path.join(directory, f"image_{index}.jpg")
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+# Function to time one pass over the images, with or without the backbone
+def time_loader(paths, workers, prefetch, batch_size, backbone):
+    loader = ParallelImageLoader(workers, prefetch)
+    start = time.perf_counter()
+    if backbone:
+        compute_image_features(paths, batch_size=batch_size, loader=loader)
+    else:
+        for _ in loader.iter_batches(paths, preprocess_image, batch_size):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=256, help="Number of images")
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8], help="Decoding threads to compare")
+    parser.add_argument('--prefetch', type=int, default=64, help="Images loaded ahead of the consumer")
+    parser.add_argument('--batch-size', type=int, default=32, help="Images per batch")
+    parser.add_argument('--width', type=int, default=1200, help="Width of the stored images")
+    parser.add_argument('--height', type=int, default=900, help="Height of the stored images")
+    parser.add_argument('--backbone', action='store_true', help="Also run the EfficientNetB0 feature extractor")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_images(directory, args.images, args.width, args.height)
+        if args.backbone:
+            # Build the backbone and trace its graph before timing
+            load_feature_extractor(None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS)
+            compute_image_features(paths[:args.batch_size], batch_size=args.batch_size)
+        print(f"Images: {args.images} ({args.width}x{args.height} JPEG), CPUs: {os.cpu_count()}, "
+              f"backbone: {'yes' if args.backbone else 'no'}")
+        baseline = None
+        for workers in args.workers:
+            seconds = time_loader(paths, workers, args.prefetch, args.batch_size, args.backbone)
+            baseline = baseline or seconds
+            print(f"workers={workers:<3} {seconds:7.2f} s  {args.images / seconds:8.1f} images/s  "
+                  f"speed-up={baseline / seconds:5.2f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
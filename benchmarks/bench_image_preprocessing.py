@@ -0,0 +1,80 @@
+"""
+Throughput of the image preprocessing of /predict on phone-sized JPEG uploads, before
+(full decode, LANCZOS, float64 scaling) and after (draft-mode reduced decode, BICUBIC,
+float32 scaling). Decoding is included, the backbone is not.
+
+Usage:
+    python -m benchmarks.bench_image_preprocessing --images 20 --width 4032 --height 3024
+"""
+import argparse
+import time
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+from tensorflow import expand_dims, convert_to_tensor, float32
+from tensorflow.keras.applications.efficientnet import preprocess_input
+
+from src.api.util_model import preprocess_image
+
+
+# Function to reproduce the previous behaviour: full-resolution decode and float64 intermediates
+def reference_preprocess_image(image, target_size=(224, 224)):
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = ImageOps.fit(image, target_size, Image.LANCZOS)
+    image = np.array(image) / 255.0
+    image = convert_to_tensor(image, dtype=float32)
+    image = preprocess_input(image)
+    return expand_dims(image, axis=0)
+
+
+# Function to build a photo-like JPEG (smooth gradients, sensor noise) of the given size
+def make_jpeg(width, height, quality=90):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x / width * 255, y / height * 255, (x + y) % 512 / 2], axis=-1)
+    pixels += rng.normal(0, 6, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(2))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+# Function to time the preprocessing of the same upload several times
+def time_images(fn, data, n_images):
+    latencies = []
+    for _ in range(n_images):
+        start = time.perf_counter()
+        fn(Image.open(BytesIO(data)))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def report(name, latencies):
+    print(f"{name:<10} mean={latencies.mean():8.1f} ms  p99={np.percentile(latencies, 99):8.1f} ms  "
+          f"throughput={1000 / latencies.mean():8.1f} images/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=20, help="Number of images per variant")
+    parser.add_argument('--width', type=int, default=4032, help="Width of the uploaded photo")
+    parser.add_argument('--height', type=int, default=3024, help="Height of the uploaded photo")
+    args = parser.parse_args()
+
+    data = make_jpeg(args.width, args.height)
+    before = time_images(reference_preprocess_image, data, args.images)
+    after = time_images(preprocess_image, data, args.images)
+
+    expected = np.asarray(reference_preprocess_image(Image.open(BytesIO(data))))
+    difference = np.abs(preprocess_image(Image.open(BytesIO(data))) - expected)
+
+    print(f"Images per variant: {args.images}, upload: {args.width}x{args.height} JPEG ({len(data) / 1e6:.1f} MB)")
+    report("before", before)
+    report("after", after)
+    print(f"Speed-up: {before.mean() / after.mean():.1f}x, "
+          f"pixel difference: mean={difference.mean():.4f} max={difference.max():.4f}")
+
+
+if __name__ == "__main__":
+    main()
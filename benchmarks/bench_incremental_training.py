@@ -0,0 +1,120 @@
+"""
+Full retrain versus incremental fine-tuning after new products arrive.
+
+A base model is trained on a synthetic balanced dataset. New products are then generated
+with a drifted vocabulary and image features (e.g. new product lines). We compare:
+- a full retrain: a fresh model fitted on the training split plus the new products,
+  as `retrain_model()` does;
+- incremental training: the base model fine-tuned on the new products plus a replay
+  sample of the training split, as `run_incremental_training()` does.
+
+Both report the wall-clock time of the fit and the weighted F1-score on the held-out test
+split of the original data (forgetting) and on held-out new products (adaptation).
+
+Usage:
+    python -m benchmarks.bench_incremental_training --rows 20000 --new 1000 --epochs 30
+"""
+import argparse
+import time
+import numpy as np
+import scipy.sparse as sp
+from sklearn.metrics import f1_score
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+
+from src.api.incremental_training import fine_tune_model
+from src.api.retrain_model import build_model
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.training_data import compute_split_indices
+
+NUM_CLASSES = 27
+
+
+# Function to generate products whose terms and image features depend on their class
+def make_products(n_samples, text_dim, image_dim, rng, drift=0.0):
+    labels = rng.integers(0, NUM_CLASSES, n_samples)
+    # Each class owns a block of the vocabulary; drifted products use the next block half of the time
+    block = text_dim // (NUM_CLASSES + 1)
+    shifted = rng.random(n_samples) < drift
+    class_terms = (labels + shifted)[:, None] * block + rng.integers(0, block, (n_samples, 6))
+    noise_terms = rng.integers(0, text_dim, (n_samples, 6))
+    terms = np.sort(np.concatenate([class_terms, noise_terms], axis=1), axis=1)
+    text = sp.csr_matrix(
+        (rng.random(terms.size, dtype=np.float32), terms.ravel(), np.arange(0, terms.size + 1, terms.shape[1])),
+        shape=(n_samples, text_dim),
+    )
+    text.sum_duplicates()
+    centers = np.random.default_rng(1).normal(size=(NUM_CLASSES, image_dim)).astype(np.float32)
+    offset = np.random.default_rng(2).normal(size=image_dim).astype(np.float32) * drift
+    images = centers[labels] + offset + rng.normal(scale=2.0, size=(n_samples, image_dim)).astype(np.float32)
+    return text, images, labels
+
+
+def f1(model, text, images, labels):
+    predictions = model.predict(SparseFeatureDataset(text, images, batch_size=256), verbose=0)
+    return f1_score(labels, np.argmax(predictions, axis=1), average='weighted')
+
+
+# Function to fit a fresh model the way run_retraining() does
+def train_from_scratch(text, images, labels, train_indices, val_indices, epochs):
+    model = build_model(text.shape[1], images.shape[1], NUM_CLASSES)
+    model.fit(
+        SparseFeatureDataset(text, images, labels, batch_size=64, shuffle=True, indices=train_indices),
+        epochs=epochs,
+        validation_data=SparseFeatureDataset(text, images, labels, batch_size=64, indices=val_indices),
+        callbacks=[EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True),
+                   ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-6)],
+        verbose=0,
+    )
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help="Products of the original training dataset")
+    parser.add_argument('--new', type=int, default=1000, help="New products added since the last training")
+    parser.add_argument('--text-dim', type=int, default=2000, help="Size of the TF-IDF vocabulary")
+    parser.add_argument('--image-dim', type=int, default=256, help="Size of the image feature vectors")
+    parser.add_argument('--epochs', type=int, default=30, help="Maximum epochs of the full retrain")
+    parser.add_argument('--replay-ratio', type=float, default=2.0, help="Replayed rows per new product")
+    parser.add_argument('--drift', type=float, default=0.5, help="How much the new products differ from the old ones")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    text, images, labels = make_products(args.rows, args.text_dim, args.image_dim, rng)
+    splits = compute_split_indices(args.rows)
+    new_text, new_images, new_labels = make_products(args.new * 2, args.text_dim, args.image_dim, rng, drift=args.drift)
+    # Half of the new products are held out to measure how well each model learned them
+    held_out = (new_text[args.new:], new_images[args.new:], new_labels[args.new:])
+    new_text, new_images, new_labels = new_text[:args.new], new_images[:args.new], new_labels[:args.new]
+    test = (text[splits['test']], images[splits['test']], labels[splits['test']])
+
+    print(f"Training the base model on {len(splits['train'])} products...")
+    base_model = train_from_scratch(text, images, labels, splits['train'], splits['val'], args.epochs)
+    base_weights = base_model.get_weights()
+    results = {'base model': (None, f1(base_model, *test), f1(base_model, *held_out))}
+
+    # Full retrain: the new products appended to the dataset and to its training split
+    all_text = sp.vstack([text, new_text], format='csr')
+    all_images = np.concatenate([images, new_images])
+    all_labels = np.concatenate([labels, new_labels])
+    all_train = np.concatenate([splits['train'], np.arange(args.rows, args.rows + args.new)])
+    start = time.perf_counter()
+    full_model = train_from_scratch(all_text, all_images, all_labels, all_train, splits['val'], args.epochs)
+    results['full retrain'] = (time.perf_counter() - start, f1(full_model, *test), f1(full_model, *held_out))
+
+    # Incremental: the base model fine-tuned on the new products plus a replay sample
+    base_model.set_weights(base_weights)
+    start = time.perf_counter()
+    fine_tune_model(base_model, new_text, new_images, new_labels, text, images, labels, splits['train'],
+                    splits['val'], replay_ratio=args.replay_ratio)
+    results['incremental'] = (time.perf_counter() - start, f1(base_model, *test), f1(base_model, *held_out))
+
+    print(f"Rows: {args.rows}, new products: {args.new}, replay ratio: {args.replay_ratio}, drift: {args.drift}")
+    print(f"{'':<14}{'fit time':>10}{'F1 test split':>16}{'F1 new products':>18}")
+    for name, (seconds, f1_test, f1_new) in results.items():
+        fit_time = '-' if seconds is None else f"{seconds:.1f}s"
+        print(f"{name:<14}{fit_time:>10}{f1_test:>16.4f}{f1_new:>18.4f}")
+
+
+if __name__ == "__main__":
+    main()
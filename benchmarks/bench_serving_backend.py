@@ -0,0 +1,78 @@
+"""
+Latency and artifact size of the Keras serving backend versus the exported TFLite
+artifact (dynamic int8 and float16 weights), for the full /predict forward pass:
+backbone on a preprocessed image batch followed by the classification head.
+
+Usage:
+    python -m benchmarks.bench_serving_backend --requests 20 --batch-size 8 --weights imagenet
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from src.api.image_features import IMAGE_FEATURE_DIM, load_feature_extractor, warmup_feature_extractor, extract_image_features
+from src.api.retrain_model import build_model
+from src.api.sparse_features import to_sparse_tensor
+from src.api.tflite_model import export_tflite, TFLiteModel
+
+
+# Function to time a callable over several requests
+def time_requests(fn, n_requests):
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def report(name, latencies, size_bytes):
+    print(f"{name:<16} mean={latencies.mean():8.1f} ms  p50={np.percentile(latencies, 50):8.1f} ms  "
+          f"p99={np.percentile(latencies, 99):8.1f} ms  size={size_bytes / 1e6:7.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20, help="Number of simulated requests per backend")
+    parser.add_argument('--batch-size', type=int, default=8, help="Products per forward pass")
+    parser.add_argument('--text-dim', type=int, default=5000, help="Size of the TF-IDF vocabulary")
+    parser.add_argument('--weights', default='imagenet', help="'imagenet' or 'none' (offline runs)")
+    args = parser.parse_args()
+    weights = None if args.weights.lower() == 'none' else args.weights
+
+    feature_extractor = load_feature_extractor(weights)
+    warmup_feature_extractor(args.batch_size)
+    model = build_model(args.text_dim, IMAGE_FEATURE_DIM, num_classes=27)
+
+    rng = np.random.default_rng(0)
+    images = rng.uniform(-1, 1, (args.batch_size, 224, 224, 3)).astype(np.float32)
+    text = sp.random(args.batch_size, args.text_dim, density=0.01, format='csr', dtype=np.float32, random_state=0)
+    text_tensor = to_sparse_tensor(text)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        keras_path = os.path.join(tmp_dir, 'model.keras')
+        model.save(keras_path)
+        keras_size = os.path.getsize(keras_path) + sum(w.size * 4 for w in feature_extractor.get_weights())
+        keras_latencies = time_requests(
+            lambda: model.predict_on_batch([text_tensor, extract_image_features(images)]), args.requests
+        )
+        print(f"Requests per backend: {args.requests}, batch size: {args.batch_size}, weights: {weights}")
+        report("keras", keras_latencies, keras_size)
+
+        reference = model.predict_on_batch([text_tensor, extract_image_features(images)])
+        for quantization in ('dynamic', 'float16'):
+            tflite_path = os.path.join(tmp_dir, f'model-{quantization}.tflite')
+            export_tflite(model, tflite_path, quantization=quantization, feature_extractor=feature_extractor)
+            tflite_model = TFLiteModel(tflite_path, num_threads=os.cpu_count())
+            run = lambda: tflite_model.predict_on_batch([text, tflite_model.extract_image_features(images)])
+            run()  # Allocates the interpreter of this thread
+            report(f"tflite-{quantization}", time_requests(run, args.requests), os.path.getsize(tflite_path))
+            difference = np.max(np.abs(np.asarray(reference) - run()))
+            print(f"{'':<16} max probability difference vs keras: {difference:.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cold start of the API: time to import src.api.main, and time until the vectorizer, model
+and backbone are loaded by a sequential (previous behaviour) versus parallel warmup.
+Every measurement runs in a fresh interpreter, so each one pays for importing TensorFlow.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 3 --weights imagenet
+"""
+import argparse
+import json
+import subprocess
+import sys
+import numpy as np
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import src.api.main
+print(json.dumps({'seconds': time.perf_counter() - start}))
+"""
+
+WARMUP_SNIPPET = """
+import json, time
+start = time.perf_counter()
+from src.api.startup import ModelRegistry
+registry = ModelRegistry(
+    'src/models/Tfidf_Vectorizer.joblib', 'src/models/retrained_balanced_model.keras',
+    'src/models/retrained_balanced_model.tflite', backbone_weights={weights!r},
+)
+assert registry.warmup(max_workers={workers})
+print(json.dumps({{'seconds': time.perf_counter() - start, 'components': registry.status()['components']}}))
+"""
+
+
+# Function to run a snippet in a fresh interpreter and read the JSON line it prints
+def run_fresh(snippet):
+    output = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(name, seconds):
+    seconds = np.array(seconds)
+    print(f"{name:<20} mean={seconds.mean():7.2f} s  min={seconds.min():7.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters per measurement")
+    parser.add_argument('--weights', default='imagenet', help="'imagenet' or 'none' (offline runs)")
+    args = parser.parse_args()
+    weights = None if args.weights.lower() == 'none' else args.weights
+
+    imports = [run_fresh(IMPORT_SNIPPET)['seconds'] for _ in range(args.runs)]
+    sequential = [run_fresh(WARMUP_SNIPPET.format(weights=weights, workers=1)) for _ in range(args.runs)]
+    parallel = [run_fresh(WARMUP_SNIPPET.format(weights=weights, workers=3)) for _ in range(args.runs)]
+
+    print(f"Runs: {args.runs}, weights: {weights}")
+    report("import src.api.main", imports)
+    report("sequential warmup", [run['seconds'] for run in sequential])
+    report("parallel warmup", [run['seconds'] for run in parallel])
+    for name in parallel[-1]['components']:
+        print(f"  {name:<18} sequential={sequential[-1]['components'][name]['seconds']:6.2f} s  "
+              f"parallel={parallel[-1]['components'][name]['seconds']:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
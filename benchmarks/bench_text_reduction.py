@@ -0,0 +1,131 @@
+"""
+Model size, per-request latency and F1-score of the classifier with the full TF-IDF
+vocabulary as text input versus a frozen text projection (truncated SVD or signed hashing
+buckets) at several dimensions, on a synthetic balanced dataset whose class is visible in
+both the terms and the image features.
+
+Latency is the time of `predict_on_batch` on one product (the text and image features are
+given, the backbone is not included), like the head of /predict. With --tflite the
+dynamic-range TFLite artifact (which also embeds the backbone) is exported and its head timed;
+the image features then have the 1280 dimensions of the backbone.
+
+Usage:
+    python -m benchmarks.bench_text_reduction --rows 20000 --text-dim 5000 --dims 64 128 256 --methods svd hashing
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.metrics import f1_score
+from tensorflow.keras.callbacks import EarlyStopping
+
+from benchmarks.bench_incremental_training import make_products
+from src.api.retrain_model import build_model
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.text_reduction import fit_text_projection
+from src.api.training_data import compute_split_indices
+
+
+# Function to time the forward pass of the model on single products
+def request_latency(model, text, images, n_requests):
+    inputs = [SparseFeatureDataset(text, images, batch_size=1)[index][0] for index in range(n_requests)]
+    model.predict_on_batch(inputs[0])
+    latencies = []
+    for batch in inputs:
+        start = time.perf_counter()
+        model.predict_on_batch(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.median(latencies), np.percentile(latencies, 99)
+
+
+# Function to train, save and measure one variant of the model
+def run_variant(name, projection, text, images, labels, splits, args, directory):
+    start = time.perf_counter()
+    model = build_model(text.shape[1], images.shape[1], int(labels.max()) + 1, text_projection=projection)
+    model.fit(
+        SparseFeatureDataset(text, images, labels, batch_size=64, shuffle=True, indices=splits['train']),
+        epochs=args.epochs,
+        validation_data=SparseFeatureDataset(text, images, labels, batch_size=256, indices=splits['val']),
+        callbacks=[EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)],
+        verbose=0,
+    )
+    train_seconds = time.perf_counter() - start
+    predictions = model.predict(SparseFeatureDataset(text, images, batch_size=256, indices=splits['test']), verbose=0)
+    f1 = f1_score(labels[splits['test']], np.argmax(predictions, axis=1), average='weighted')
+
+    path = os.path.join(directory, f"{name}.keras")
+    model.save(path)
+    test_rows = splits['test'][:args.requests]
+    p50, p99 = request_latency(model, text[test_rows], images[test_rows], len(test_rows))
+    result = {
+        'name': name, 'params': model.count_params(), 'size': os.path.getsize(path), 'p50': p50, 'p99': p99,
+        'f1': f1, 'train_seconds': train_seconds,
+    }
+    if args.tflite:
+        from src.api.tflite_model import export_tflite, TFLiteModel
+
+        tflite_path = os.path.join(directory, f"{name}.tflite")
+        export_tflite(model, tflite_path, quantization='dynamic', feature_extractor=None)
+        result['tflite_size'] = os.path.getsize(tflite_path)
+        result['tflite_p50'], _ = request_latency(TFLiteModel(tflite_path), text[test_rows], images[test_rows], len(test_rows))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help="Products of the dataset")
+    parser.add_argument('--text-dim', type=int, default=5000, help="Size of the TF-IDF vocabulary")
+    parser.add_argument('--image-dim', type=int, default=256, help="Size of the image feature vectors")
+    parser.add_argument('--dims', type=int, nargs='+', default=[64, 128, 256], help="Reduced text dimensions")
+    parser.add_argument('--methods', nargs='+', default=['svd', 'hashing'], help="Text projections to compare")
+    parser.add_argument('--epochs', type=int, default=15, help="Maximum training epochs per variant")
+    parser.add_argument('--requests', type=int, default=200, help="Single-product requests timed per variant")
+    parser.add_argument('--tflite', action='store_true', help="Also export and time the TFLite artifact")
+    args = parser.parse_args()
+
+    if args.tflite:
+        # The artifact embeds the backbone, so the head takes its pooled EfficientNetB0 features
+        args.image_dim = 1280
+
+    rng = np.random.default_rng(0)
+    text, images, labels = make_products(args.rows, args.text_dim, args.image_dim, rng)
+    # Noisier images than the default, so the text branch matters
+    images = images + rng.normal(scale=4.0, size=images.shape).astype(np.float32)
+    splits = compute_split_indices(args.rows)
+    if args.tflite:
+        from src.api.config import BACKBONE_WEIGHTS
+        from src.api.image_features import load_feature_extractor
+
+        # The artifact embeds the backbone too (set BACKBONE_WEIGHTS=none to run without the ImageNet weights)
+        load_feature_extractor(None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS)
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = [run_variant('full', None, text, images, labels, splits, args, directory)]
+        for method in args.methods:
+            for dim in args.dims:
+                fit_start = time.perf_counter()
+                projection = fit_text_projection(text, dim, method, indices=splits['train'])
+                fit_seconds = time.perf_counter() - fit_start
+                result = run_variant(f"{method}-{dim}", projection, text, images, labels, splits, args, directory)
+                result['fit_seconds'] = fit_seconds
+                results.append(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Rows: {args.rows}, vocabulary: {args.text_dim}, image features: {args.image_dim}")
+    for result in results:
+        line = (f"{result['name']:<12} params={result['params']:>9,}  keras={result['size'] / 1e6:6.2f} MB  "
+                f"p50={result['p50']:6.2f} ms  p99={result['p99']:6.2f} ms  F1={result['f1']:.4f}  "
+                f"train={result['train_seconds']:6.1f} s")
+        if 'fit_seconds' in result:
+            line += f"  fit={result['fit_seconds']:5.1f} s"
+        if 'tflite_size' in result:
+            line += f"  tflite={result['tflite_size'] / 1e6:5.2f} MB  tflite p50={result['tflite_p50']:5.2f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Memory used by the retraining data pipeline, before (dense arrays loaded into RAM and
+split with train_test_split) and after (memory-mapped arrays, persisted split indices and
+batches gathered on the fly). Both variants iterate one epoch of training batches.
+
+Peak RSS (VmHWM) includes the clean, reclaimable pages of the memory-mapped files;
+peak RssAnon is the memory the process cannot give back, which is what gets a pod OOM-killed.
+
+Usage:
+    python -m benchmarks.bench_training_memory --rows 50000 --image-dim 1280
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+
+from src.api.sparse_features import save_text_features
+
+BEFORE_SNIPPET = """
+import numpy as np
+from sklearn.model_selection import train_test_split
+from src.api.sparse_features import load_text_features, SparseFeatureDataset
+from benchmarks.bench_training_memory import track, report
+X_text = load_text_features({text!r})
+images = np.load({images!r})
+labels = np.load({labels!r})
+X_text, X_test_text, labels, y_test = train_test_split(X_text, labels, test_size=0.10, random_state=42)
+images, test_images = train_test_split(images, test_size=0.10, random_state=42)
+X_text, X_val_text, labels, y_val = train_test_split(X_text, labels, test_size=0.20, random_state=42)
+images, val_images = train_test_split(images, test_size=0.20, random_state=42)
+dataset = SparseFeatureDataset(X_text, images, labels, batch_size={batch_size}, shuffle=True)
+report(track(dataset))
+"""
+
+AFTER_SNIPPET = """
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.training_data import load_training_data, load_split_indices
+from benchmarks.bench_training_memory import track, report
+X_text, images, labels = load_training_data({text!r}, {images!r}, {labels!r})
+splits = load_split_indices(X_text.shape[0], path={splits!r})
+dataset = SparseFeatureDataset(X_text, images, labels, batch_size={batch_size}, shuffle=True, indices=splits['train'])
+report(track(dataset))
+"""
+
+
+# Function to read a memory counter (in MB) of this process from /proc
+def read_status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+# Function to iterate one epoch of a dataset, sampling the anonymous memory after every batch
+def track(dataset):
+    peak_anon = read_status('RssAnon')
+    for index in range(len(dataset)):
+        dataset[index]
+        peak_anon = max(peak_anon, read_status('RssAnon'))
+    return peak_anon
+
+
+def report(peak_anon):
+    print(json.dumps({'peak_rss_mb': read_status('VmHWM'), 'peak_anon_mb': peak_anon}))
+
+
+# Function to run a snippet in a fresh interpreter and read the JSON line it prints
+def run_fresh(snippet):
+    output = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help="Number of products in the synthetic dataset")
+    parser.add_argument('--image-dim', type=int, default=1280, help="Size of the image feature vectors")
+    parser.add_argument('--text-dim', type=int, default=5000, help="Size of the TF-IDF vocabulary")
+    parser.add_argument('--batch-size', type=int, default=64, help="Training batch size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {name: os.path.join(tmp_dir, file_name) for name, file_name in (
+            ('text', 'text.npz'), ('images', 'images.npy'), ('labels', 'labels.npy'), ('splits', 'splits.npz'),
+        )}
+        rng = np.random.default_rng(0)
+        # Ten TF-IDF terms per product, built directly in CSR form
+        terms = np.sort(rng.integers(0, args.text_dim, (args.rows, 10)), axis=1)
+        save_text_features(paths['text'], sp.csr_matrix(
+            (rng.random(terms.size, dtype=np.float32), terms.ravel(), np.arange(0, terms.size + 1, 10)),
+            shape=(args.rows, args.text_dim),
+        ))
+        images = np.lib.format.open_memmap(paths['images'], mode='w+', dtype=np.float32, shape=(args.rows, args.image_dim))
+        for start in range(0, args.rows, 10000):
+            images[start:start + 10000] = rng.random((min(10000, args.rows - start), args.image_dim), dtype=np.float32)
+        images.flush()
+        del images
+        np.save(paths['labels'], rng.integers(0, 27, args.rows))
+
+        before = run_fresh(BEFORE_SNIPPET.format(batch_size=args.batch_size, **paths))
+        after = run_fresh(AFTER_SNIPPET.format(batch_size=args.batch_size, **paths))
+
+    dataset_mb = args.rows * args.image_dim * 4 / 1024 ** 2
+    print(f"Rows: {args.rows}, image features: {dataset_mb:.0f} MB, batch size: {args.batch_size}")
+    for name, result in (('before', before), ('after', after)):
+        print(f"{name:<7} peak RSS={result['peak_rss_mb']:8.0f} MB  peak anonymous={result['peak_anon_mb']:8.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
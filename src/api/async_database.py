@@ -0,0 +1,198 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import select, func, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.api.database import User, Product, Log, create_database_engine
+
+# Async engine and sessions of the configured database (DATABASE_URL with the aiosqlite or asyncpg driver),
+# used by the API handlers so SQL never blocks the event loop. Training, the feature store backfill and the
+# scripts keep the synchronous SessionLocal of database.py.
+async_engine = create_database_engine(asynchronous=True)
+# Objects stay readable after commit (e.g. the id of a new product handed to the inference threads)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Dependency to get an async session from the database
+async def get_async_db():
+    """
+    Provide an async database session dependency for FastAPI routes.
+
+    Yields:
+        AsyncSession: SQLAlchemy async session connected to the database.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+# Function to create a new user in the database
+async def create_user(session: AsyncSession, username: str, hashed_password: str, role: str):
+    new_user = User(username=username, password_hash=hashed_password, role=role)
+    session.add(new_user)
+    await session.commit()
+    return new_user
+
+# Function to get a user by username
+async def get_user(session: AsyncSession, username: str):
+    result = await session.execute(select(User).where(User.username == username).limit(1))
+    return result.scalars().first()
+
+# Function to count the users (the first one to sign up becomes admin)
+async def count_users(session: AsyncSession) -> int:
+    return (await session.execute(select(func.count()).select_from(User))).scalar_one()
+
+# Function to delete a user and their logs by username
+async def delete_user(session: AsyncSession, username: str):
+    """
+    Deletes a user and their logs from the database by username. The deletion itself is
+    recorded by the caller through the audit log writer (see audit_log.py).
+
+    The logs and the user are removed with DELETE statements: deleting the ORM object would
+    lazy-load its `logs` relationship, which async sessions cannot do implicitly.
+
+    Args:
+        session (AsyncSession): SQLAlchemy async session to connect to the database.
+        username (str): Username of the user to delete.
+
+    Returns:
+        int: ID of the deleted user, or None if the user was not found.
+    """
+    user = await get_user(session, username)
+    if not user:
+        print(f"User '{username}' not found.")
+        return None
+
+    user_id = user.id
+    await session.execute(delete(Log).where(Log.user_id == user_id))
+    await session.execute(delete(User).where(User.id == user_id))
+    await session.commit()
+    print(f"User '{username}' deleted successfully.")
+    return user_id
+
+# Function to get all users
+async def get_all_users(session: AsyncSession):
+    return (await session.execute(select(User))).scalars().all()
+
+# Function to add a product to the database
+async def add_product(session: AsyncSession, image_path: str, designation: str, description: str, category: str):
+    """
+    Adds a new product to the database.
+
+    Args:
+        session (AsyncSession): SQLAlchemy async session to connect to the database.
+        image_path (str): Path to the product image.
+        designation (str): Designation of the product.
+        description (str): Description of the product.
+        category (str): Category of the product.
+
+    Returns:
+        Product: The created Product object.
+    """
+    new_product = Product(
+        image_path=image_path,
+        designation=designation,
+        description=description,
+        category=category,
+        state=0  # Default state is 0 (not trained)
+    )
+    session.add(new_product)
+    await session.commit()
+    print(f"Product '{designation}' added successfully.")
+    return new_product
+
+# Function to get all logs
+async def get_all_logs(session: AsyncSession):
+    return (await session.execute(select(Log))).scalars().all()
+
+# Function to encode the position after a log as an opaque pagination cursor
+def encode_log_cursor(log: Log) -> str:
+    return base64.urlsafe_b64encode(f"{log.timestamp.isoformat()}|{log.id}".encode()).decode()
+
+# Function to decode a pagination cursor into the (timestamp, id) key it points after
+def decode_log_cursor(cursor: str):
+    """
+    Decodes a cursor returned by `encode_log_cursor`.
+
+    Args:
+        cursor (str): Cursor of the previous page.
+
+    Returns:
+        tuple: Timestamp and ID of the last log of the previous page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+# Function to build the query of the logs matching the filters, in (timestamp, id) order
+def select_logs(after=None, user_id=None, since=None, until=None, descending=False):
+    """
+    Builds a keyset query of the logs: it starts right after the `after` key instead of
+    skipping rows with OFFSET, so every page is an index range scan of the same cost.
+
+    Args:
+        after (tuple): (timestamp, id) of the last log already returned, or None to start.
+        user_id (int): Only the logs of this user.
+        since (datetime): Only the logs at or after this time.
+        until (datetime): Only the logs before this time.
+        descending (bool): Newest logs first.
+
+    Returns:
+        Select: The query, served by the (timestamp, id) or (user_id, timestamp, id) index.
+    """
+    query = select(Log)
+    if user_id is not None:
+        query = query.where(Log.user_id == user_id)
+    if since is not None:
+        query = query.where(Log.timestamp >= since)
+    if until is not None:
+        query = query.where(Log.timestamp < until)
+    key = tuple_(Log.timestamp, Log.id)
+    if after is not None:
+        query = query.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    if descending:
+        return query.order_by(Log.timestamp.desc(), Log.id.desc())
+    return query.order_by(Log.timestamp, Log.id)
+
+# Function to get one page of logs
+async def get_logs_page(session: AsyncSession, limit: int, **filters):
+    """
+    Gets the logs of one page and the cursor of the next one.
+
+    Args:
+        session (AsyncSession): SQLAlchemy async session to connect to the database.
+        limit (int): Maximum number of logs of the page.
+        **filters: Position and filters of `select_logs`.
+
+    Returns:
+        tuple: List of Log objects and the cursor of the next page (None on the last page).
+    """
+    # One extra row tells whether a next page exists
+    logs = (await session.execute(select_logs(**filters).limit(limit + 1))).scalars().all()
+    if len(logs) > limit:
+        return logs[:limit], encode_log_cursor(logs[limit - 1])
+    return logs, None
+
+# Function to stream the matching logs in chunks from a server-side cursor
+async def stream_logs(session: AsyncSession, chunk_size: int = 1000, **filters):
+    """
+    Yields the logs matching the filters, `chunk_size` rows at a time, without loading the
+    result in memory (a server-side cursor on PostgreSQL).
+
+    Args:
+        session (AsyncSession): SQLAlchemy async session to connect to the database.
+        chunk_size (int): Number of rows fetched from the cursor at a time.
+        **filters: Position and filters of `select_logs`.
+
+    Yields:
+        list: Rows of one chunk, with the columns of Log as attributes (plain rows are
+        several times cheaper to build than ORM objects).
+    """
+    query = select_logs(**filters).with_only_columns(Log.id, Log.timestamp, Log.user_id, Log.event)
+    result = await session.stream(query.execution_options(yield_per=chunk_size))
+    async for chunk in result.partitions():
+        yield chunk
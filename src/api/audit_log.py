@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from src.api.database import Log
+from src.api.metrics import (
+    AUDIT_LOG_QUEUE_DEPTH, AUDIT_LOG_BATCH_SIZE, AUDIT_LOG_FLUSH_LATENCY, AUDIT_LOG_WRITE_ERRORS, AUDIT_LOG_REJECTED,
+    AUDIT_LOG_SPILLED,
+)
+
+# Queue marker closing the batch being collected (explicit flush or shutdown)
+_FLUSH = object()
+
+
+class AuditLogWriter:
+    """
+    Buffers audit events in memory and writes them to the logs table in batches, with one
+    multi-row INSERT per batch, off the request path.
+
+    A batch is written as soon as it holds `max_batch_size` events or its oldest event has
+    waited `flush_interval_ms`. The buffer is bounded: while `max_queue_size` events are
+    waiting, `log` waits for room instead of dropping the event. A failed write is retried
+    with exponential backoff, the events staying in memory meanwhile; only rows the database
+    refuses (e.g. a user deleted in between) are reported and skipped. `stop` writes every
+    buffered event; those still unwritten after `shutdown_timeout` (database down) are
+    appended to `spill_path` and written by the next `start`, as are the events of a task
+    whose event loop was closed. An event interrupted between its commit and the end of
+    the write may thus be written twice, but none is lost.
+    """
+
+    def __init__(self, session_factory, max_batch_size=500, flush_interval_ms=1000, max_queue_size=10000,
+                 retry_delay=0.5, max_retry_delay=30.0, shutdown_timeout=10.0, spill_path=None):
+        """
+        Args:
+            session_factory (callable): Factory of async sessions (e.g. AsyncSessionLocal).
+            max_batch_size (int): Maximum number of events per INSERT.
+            flush_interval_ms (float): Maximum time the first event of a batch waits for more events.
+            max_queue_size (int): Maximum number of buffered events before `log` waits.
+            retry_delay (float): First delay (seconds) before retrying a failed write.
+            max_retry_delay (float): Upper bound of the retry delay (seconds).
+            shutdown_timeout (float): Seconds `stop` spends writing the buffered events.
+            spill_path (str): JSON-lines file of the events that could not be written at shutdown.
+        """
+        self.session_factory = session_factory
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.spill_path = spill_path
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._stopping = False
+        self._in_flight = []
+        self._carried = []
+        # Events accepted by `log` and events written (or refused), to let `flush` wait for its own
+        self._logged = 0
+        self._processed = 0
+        self._progress = None
+
+    # Function to start the background writing task on the running event loop
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        # Events left by a task bound to a previous (closed) loop are written first
+        self._carried = self._unwritten()
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._progress = asyncio.Condition()
+        self._stopping = False
+        # The carried events count as logged, so that `flush` waits for them too
+        self._logged, self._processed = len(self._carried), 0
+        self._task = loop.create_task(self._run())
+
+    # Function to record one audit event (waits only while the buffer is full)
+    async def log(self, user_id: int, event: str):
+        self.start()
+        await self._queue.put({'user_id': user_id, 'event': event, 'timestamp': datetime.utcnow()})
+        self._logged += 1
+        AUDIT_LOG_QUEUE_DEPTH.set(self._queue.qsize())
+
+    # Function to wait until every event logged so far is written
+    async def flush(self, timeout=None) -> bool:
+        """
+        Args:
+            timeout (float): Seconds to wait at most (None: however long the database stays down).
+
+        Returns:
+            bool: True once the events are written, False if `timeout` passed first (they stay buffered).
+        """
+        if self._task is None:
+            return True
+        self.start()
+        try:
+            await asyncio.wait_for(self._wait_processed(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _wait_processed(self):
+        target = self._logged
+        await self._queue.put(_FLUSH)
+        async with self._progress:
+            await self._progress.wait_for(lambda: self._processed >= target or self._task.done())
+
+    # Function to write the buffered events and stop the writing task
+    async def stop(self):
+        if self._task is None:
+            return
+        self.start()
+        self._stopping = True
+        await self._queue.put(_FLUSH)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        remaining = self._unwritten()
+        if remaining:
+            self._spill(remaining)
+        AUDIT_LOG_QUEUE_DEPTH.set(0)
+        self._task = None
+
+    # Function to take the events of the batch being written and of the queue
+    def _unwritten(self):
+        rows = self._carried + self._in_flight
+        self._carried, self._in_flight = [], []
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _FLUSH:
+                rows.append(item)
+        return rows
+
+    async def _collect_batch(self):
+        # Collected in place, so a cancelled task leaves its events to `_unwritten`
+        batch = self._in_flight = []
+        item = await self._queue.get()
+        deadline = self._loop.time() + self.flush_interval
+        while item is not _FLUSH:
+            batch.append(item)
+            if len(batch) >= self.max_batch_size:
+                break
+            remaining = deadline - self._loop.time()
+            try:
+                if remaining <= 0 or self._stopping:
+                    item = self._queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        AUDIT_LOG_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _insert(self, rows):
+        async with self.session_factory() as session:
+            await session.execute(insert(Log).values(rows))
+            await session.commit()
+            rows.clear()  # Written: not carried over or spilled if the task is cancelled from here
+
+    # Function to write rows one by one, skipping those the database refuses
+    async def _insert_individually(self, rows):
+        for row in list(rows):
+            try:
+                await self._insert([row])
+            except IntegrityError as e:
+                AUDIT_LOG_REJECTED.inc()
+                logging.error(f"Audit event refused by the database, skipped: {row} ({e.orig})")
+
+    # Function to write a batch, retrying with exponential backoff until it succeeds
+    async def _write_batch(self, rows):
+        AUDIT_LOG_BATCH_SIZE.observe(len(rows))
+        start = time.perf_counter()
+        delay = self.retry_delay
+        while True:
+            try:
+                await self._insert(rows)
+                break
+            except IntegrityError:
+                await self._insert_individually(rows)
+                break
+            except Exception as e:
+                AUDIT_LOG_WRITE_ERRORS.inc()
+                logging.warning(f"Could not write {len(rows)} audit events ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        AUDIT_LOG_FLUSH_LATENCY.observe(time.perf_counter() - start)
+
+    async def _run(self):
+        await self._write_spilled()
+        while self._carried:
+            self._in_flight, self._carried = self._carried[:self.max_batch_size], self._carried[self.max_batch_size:]
+            size = len(self._in_flight)
+            await self._write_batch(self._in_flight)
+            self._in_flight = []
+            await self._advance(size)
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect_batch()
+            size = len(batch)
+            if batch:
+                await self._write_batch(batch)
+            self._in_flight = []
+            await self._advance(size)
+
+    async def _advance(self, size):
+        async with self._progress:
+            self._processed += size
+            self._progress.notify_all()
+
+    # Function to save events that could not be written before shutdown
+    def _spill(self, rows):
+        if not self.spill_path:
+            for row in rows:
+                logging.error(f"Audit event lost at shutdown: {row}")
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+        with open(self.spill_path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps({**row, 'timestamp': row['timestamp'].isoformat()}) + '\n')
+        AUDIT_LOG_SPILLED.inc(len(rows))
+        logging.warning(f"{len(rows)} audit events saved to {self.spill_path}, they will be written on the next start")
+
+    # Function to write the events spilled by a previous shutdown, then remove the spill file
+    async def _write_spilled(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+        for offset in range(0, len(rows), self.max_batch_size):
+            await self._write_batch(rows[offset:offset + self.max_batch_size])
+        os.remove(self.spill_path)
+        logging.info(f"Wrote {len(rows)} audit events spilled by the previous shutdown")
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+from src.api.metrics import PREDICT_QUEUE_DEPTH, PREDICT_BATCH_SIZE, PREDICT_BATCH_LATENCY
+from src.api.inference_executor import InferenceQueueFull
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches and runs them through a batch function.
+
+    A batch is closed as soon as it holds `max_batch_size` items or the oldest item
+    has waited `max_wait_ms`. The batch function receives the list of items and
+    must return one result per item, in the same order.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0, executor=None, max_queue_size=None, retry_after=1):
+        """
+        Args:
+            process_batch (callable): Function mapping a list of items to a list of results.
+            max_batch_size (int): Maximum number of items per batch.
+            max_wait_ms (float): Maximum time the first item of a batch waits for more items.
+            executor: Executor running the batch function (None uses the loop's default).
+            max_queue_size (int): Maximum number of waiting items; more raise InferenceQueueFull.
+            retry_after (int): Seconds suggested to rejected clients.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_queue_size = max_queue_size
+        self.retry_after = retry_after
+        self._queue = None
+        self._task = None
+        self._loop = None
+
+    # Function to start the background batching task on the running event loop
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    # Function to stop the batching task and fail the requests still waiting
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped before the request was processed"))
+        PREDICT_QUEUE_DEPTH.set(0)
+        self._task = None
+
+    # Function to submit one item and wait for its own result
+    async def submit(self, item):
+        self.start()
+        if self.max_queue_size is not None and self._queue.qsize() >= self.max_queue_size:
+            raise InferenceQueueFull(self.retry_after)
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        PREDICT_QUEUE_DEPTH.set(self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        PREDICT_QUEUE_DEPTH.set(self._queue.qsize())
+        # Callers that gave up (e.g. disconnected clients) do not need a forward pass
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run_batch(self, items):
+        return await self._loop.run_in_executor(self.executor, self.process_batch, items)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            PREDICT_BATCH_SIZE.observe(len(items))
+            start = time.perf_counter()
+            try:
+                results = await self._run_batch(items)
+            except asyncio.CancelledError:
+                raise
+            except InferenceQueueFull as e:
+                results = [e] * len(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    # Re-run the items one by one so a single bad input only fails its own request
+                    logging.warning(f"Batch of {len(batch)} failed ({e}), retrying items individually")
+                    results = []
+                    for item in items:
+                        try:
+                            results.extend(await self._run_batch([item]))
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as item_error:
+                            results.append(item_error)
+            PREDICT_BATCH_LATENCY.observe(time.perf_counter() - start)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
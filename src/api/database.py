@@ -1,14 +1,104 @@
-from sqlalchemy import create_engine, Column, String, Integer, ForeignKey, DateTime, Text
+from sqlalchemy import create_engine, event, select, update, Column, String, Integer, ForeignKey, DateTime, Text, Index
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from datetime import datetime
 import os
 
-# Path to the existing database located in `src/data/test.db`
-DATABASE_URL = "sqlite:///./src/data/test.db"
+from src.api.config import (
+    DATABASE_URL, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT, DATABASE_POOL_RECYCLE,
+    DATABASE_POOL_PRE_PING, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_ASYNC_POOL_SIZE,
+    PRODUCT_CHUNK_SIZE,
+)
 
-# Setting up the connection to the existing database
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Async driver of each backend, used by the async session layer (see async_database.py)
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+# Function to get the async equivalent of a database URL
+def async_database_url(url: str) -> str:
+    """
+    Replace the driver of a database URL by the async driver of its backend
+    (e.g. postgresql+psycopg2://... becomes postgresql+asyncpg://...).
+
+    Raises:
+        ValueError: If the backend has no supported async driver.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for the '{backend}' database backend (supported: {', '.join(ASYNC_DRIVERS)})")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+# Function to create the engine of a database URL, tuned for its backend
+def create_database_engine(url: str = DATABASE_URL, pool_size: int = DATABASE_POOL_SIZE,
+                           max_overflow: int = DATABASE_MAX_OVERFLOW, pool_timeout: float = DATABASE_POOL_TIMEOUT,
+                           pool_recycle: int = DATABASE_POOL_RECYCLE, pool_pre_ping: bool = DATABASE_POOL_PRE_PING,
+                           journal_mode: str = SQLITE_JOURNAL_MODE, synchronous: str = SQLITE_SYNCHRONOUS,
+                           busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS, asynchronous: bool = False,
+                           sqlite_async_pool_size: int = SQLITE_ASYNC_POOL_SIZE):
+    """
+    Create the SQLAlchemy engine of the API.
+
+    Server backends (e.g. PostgreSQL through psycopg2) get a bounded connection pool: `pool_size`
+    connections kept open, up to `max_overflow` more under load, replaced after `pool_recycle`
+    seconds and tested on checkout when `pool_pre_ping` is set, so connections dropped by the
+    server or a proxy are not handed to a request.
+
+    SQLite gets its pragmas set on every new connection: in WAL journal mode readers no longer
+    wait for the writer, synchronous=NORMAL syncs the log at checkpoints instead of on every
+    commit, and the busy timeout makes a writer wait for the lock instead of failing at once.
+
+    Args:
+        url (str): SQLAlchemy URL of the database.
+        journal_mode (str): SQLite journal mode ('WAL', or 'DELETE' for the SQLite default).
+        synchronous (str): SQLite synchronous level ('NORMAL' or 'FULL').
+        busy_timeout_ms (int): Milliseconds an SQLite connection waits for a lock.
+        asynchronous (bool): Create an AsyncEngine with the async driver of the backend (see `async_database_url`).
+        sqlite_async_pool_size (int): Connections of an async SQLite engine. SQLite has a single writer, so
+            more connections only sleep in its busy handler (and stretch the latency tail).
+
+    Returns:
+        Engine: The configured engine (connections are opened on first use).
+    """
+    create = create_engine
+    if asynchronous:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        create, url = create_async_engine, async_database_url(url)
+
+    if make_url(url).get_backend_name() != 'sqlite':
+        return create(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+        )
+
+    options = {}
+    if asynchronous and make_url(url).database not in (None, '', ':memory:'):
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        # aiosqlite defaults to a new connection (and thread) per session; keep a few open instead
+        options.update(poolclass=AsyncAdaptedQueuePool, pool_size=sqlite_async_pool_size, max_overflow=0,
+                       pool_timeout=pool_timeout)
+    sqlite_engine = create(url, connect_args={"check_same_thread": False, "timeout": busy_timeout_ms / 1000}, **options)
+
+    # Async engines emit the connection events on their synchronous proxy
+    @event.listens_for(sqlite_engine.sync_engine if asynchronous else sqlite_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # The journal mode is stored in the file; in-memory databases keep 'memory'
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+    return sqlite_engine
+
+# Setting up the connection to the configured database (`src/data/test.db` unless DATABASE_URL is set)
+engine = create_database_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -26,6 +116,10 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    # The products waiting for training (state 0) are read in id order from this index, without a table scan or a sort
+    __table_args__ = (
+        Index('ix_products_state_id', 'state', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     image_path = Column(String, nullable=False)  # Path to the image
     designation = Column(Text, nullable=False)  # Title of the product
@@ -35,8 +129,13 @@ class Product(Base):
 
 class Log(Base):
     __tablename__ = "logs"
+    # Keyset pagination of /admin/logs walks (timestamp, id), over all the logs or those of one user
+    __table_args__ = (
+        Index('ix_logs_timestamp_id', 'timestamp', 'id'),
+        Index('ix_logs_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # ID of the user
     event = Column(String, nullable=False)  # Description of the event
 
@@ -47,7 +146,7 @@ class Log(Base):
 def connect_to_database():
     try:
         with engine.connect() as connection:
-            print("Successfully connected to the existing database.")
+            print(f"Successfully connected to the database {engine.url.render_as_string(hide_password=True)}.")
     except Exception as e:
         print(f"Error connecting to the database: {e}")
 
@@ -130,7 +229,26 @@ def get_all_users(session: Session):
 
 # Function to get untrained products
 def get_untrained_products(session: Session):
-    return session.query(Product).filter(Product.state == 0).all()
+    return session.query(Product).filter(Product.state == 0).order_by(Product.id).all()
+
+# Function to iterate over the untrained products, one chunk at a time
+def iter_untrained_products(session: Session, chunk_size: int = PRODUCT_CHUNK_SIZE):
+    """
+    Yields the products not used for training yet (state 0) in id order, `chunk_size` at a
+    time. They are fetched with yield_per from a single query (a server-side cursor on
+    PostgreSQL), so only the current chunk of Product objects is built, unlike
+    `get_untrained_products`.
+
+    Args:
+        session (Session): SQLAlchemy session to connect to the database.
+        chunk_size (int): Number of products per chunk.
+
+    Yields:
+        list: Product objects of one chunk.
+    """
+    query = select(Product).where(Product.state == 0).order_by(Product.id).execution_options(yield_per=chunk_size)
+    for chunk in session.execute(query).scalars().partitions():
+        yield chunk
 
 # Function to add a product to the database
 def add_product(session: Session, image_path: str, designation: str, description: str, category: str):
@@ -159,19 +277,50 @@ def add_product(session: Session, image_path: str, designation: str, description
     print(f"Product '{designation}' added successfully.")
     return new_product
 
-# Function to update the state of a product
-def update_product_state(session: Session, product_id: int, new_state: int):
-    product = session.query(Product).filter(Product.id == product_id).first()
-    if product:
-        product.state = new_state
-        session.commit()
-        print(f"Product ID: {product_id} updated to state: {new_state}")
-    else:
-        print(f"Product ID: {product_id} not found.")
+# Function to move products to a new state
+def update_product_state(session: Session, product_ids, new_state: int = 1, chunk_size: int = PRODUCT_CHUNK_SIZE):
+    """
+    Sets the state of one or many products with one UPDATE ... WHERE id IN (...) per chunk of
+    `chunk_size` IDs, committed together: the products are not loaded, and every chunk stays
+    within the bound parameter limit of the database.
+
+    Args:
+        session (Session): SQLAlchemy session to connect to the database.
+        product_ids (int or list): ID or IDs of the products.
+        new_state (int): State to set (1: used for training).
+        chunk_size (int): Number of IDs per UPDATE.
+
+    Returns:
+        int: Number of updated products.
+    """
+    if isinstance(product_ids, int):
+        product_ids = [product_ids]
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return 0
+    updated = 0
+    for offset in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[offset:offset + chunk_size]
+        updated += session.execute(
+            update(Product).where(Product.id.in_(chunk)).values(state=new_state).execution_options(synchronize_session=False)
+        ).rowcount
+    session.commit()
+    if updated < len(product_ids):
+        print(f"{len(product_ids) - updated} of {len(product_ids)} products not found.")
+    print(f"{updated} products updated to state: {new_state}")
+    return updated
+
+# Function to mark products as used for training
+def mark_products_trained(session: Session, product_ids, new_state: int = 1):
+    return update_product_state(session, product_ids, new_state)
 
 # Function to create all tables in the database
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    # create_all skips the existing tables: add the indexes declared since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 # Function to get all logs
 def get_all_logs(session: Session):
@@ -0,0 +1,260 @@
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from src.api.sparse_features import load_text_features
+
+# Version of the layout below; packages written with another version are rebuilt
+DATASET_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# File of each artifact inside the package directory
+ARTIFACT_FILES = {'text': 'text.npz', 'image_features': 'image_features.npy', 'labels': 'labels.npy'}
+
+# Supported storage types of the pooled image features
+IMAGE_DTYPES = ('float16', 'float32')
+
+
+# Function to hash the content of a file without reading it into memory at once
+def file_sha256(path, chunk_size=4 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to pick the smallest unsigned integer type able to hold the labels
+def compact_label_dtype(num_classes: int):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if num_classes <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Function to write a file next to its destination and move it in place once complete
+def _write_atomic(path, write):
+    # Same extension as the destination, so numpy does not append one to the temporary name
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp' + os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        write(tmp_path)
+        # mkstemp creates the file readable by its owner only; the package is read by other users (e.g. in containers)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_manifest(directory):
+    """
+    Returns:
+        dict: The manifest of the package in `directory`, or None when there is no (readable) package.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format_version') == DATASET_FORMAT_VERSION else None
+
+
+# Function to tell whether the artifact of a package was built from the current source with the same options
+def _artifact_is_current(directory, entry, source_path, options):
+    if entry is None or entry.get('options') != options:
+        return False
+    artifact_path = os.path.join(directory, entry['file'])
+    if not os.path.exists(artifact_path) or _file_state(artifact_path) != entry['state']:
+        return False
+    source = entry['source']
+    if _file_state(source_path) == source['state']:
+        return True
+    # Rewritten (or copied) without changing the content: only the hash can tell
+    if file_sha256(source_path) == source['sha256']:
+        source['state'] = _file_state(source_path)
+        return True
+    return False
+
+
+def _build_text(source_path, artifact_path, options):
+    text_features = load_text_features(source_path)
+    text_features.sort_indices()
+    # Uncompressed: the CSR arrays already skip the zeros, and loading them needs no inflate step
+    _write_atomic(artifact_path, lambda tmp_path: sp.save_npz(tmp_path, text_features, compressed=False))
+    return {'shape': list(text_features.shape), 'nnz': int(text_features.nnz), 'dtype': str(text_features.dtype)}
+
+
+def _build_image_features(source_path, artifact_path, options, chunk_rows=16384):
+    source = np.load(source_path, mmap_mode='r')
+    dtype = np.dtype(options['dtype'])
+
+    def write(tmp_path):
+        # Converted chunk by chunk from the memory-mapped source, so memory does not grow with the dataset
+        target = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=source.shape)
+        for start in range(0, source.shape[0], chunk_rows):
+            chunk = np.asarray(source[start:start + chunk_rows], dtype=np.float32)
+            if dtype == np.float16 and np.abs(chunk).max(initial=0) > np.finfo(np.float16).max:
+                raise ValueError("Image features exceed the float16 range, package them as float32")
+            target[start:start + chunk_rows] = chunk
+        target.flush()
+        del target
+
+    _write_atomic(artifact_path, write)
+    return {'shape': list(source.shape), 'dtype': dtype.name}
+
+
+def _build_labels(source_path, artifact_path, options):
+    labels = np.load(source_path, mmap_mode='r')
+    if labels.ndim != 1 or not np.issubdtype(labels.dtype, np.integer) or (labels.size and labels.min() < 0):
+        raise ValueError("Labels must be a 1-D array of non-negative integers")
+    num_classes = int(labels.max()) + 1 if labels.size else 0
+    compact = np.asarray(labels, dtype=compact_label_dtype(num_classes))
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, compact)
+
+    _write_atomic(artifact_path, write)
+    return {'shape': list(compact.shape), 'dtype': compact.dtype.name, 'num_classes': num_classes}
+
+
+_BUILDERS = {'text': _build_text, 'image_features': _build_image_features, 'labels': _build_labels}
+
+
+# Function to package the training dataset, rebuilding only the artifacts whose source changed
+def build_dataset_package(directory, sources, image_dtype='float16'):
+    """
+    Write (or update) a dataset package.
+
+    The package holds the TF-IDF features as CSR arrays, the pooled image features as a
+    `image_dtype` .npy file (memory-mappable), the labels in the smallest unsigned integer
+    type, and a manifest with the SHA-256 of every artifact and of its source. An artifact
+    is reused when its source has the same size and modification time, or else the same
+    content hash, as when it was built.
+
+    Args:
+        directory (str): Directory of the package.
+        sources (dict): 'text', 'image_features' and 'labels' source files (see `load_training_data`).
+        image_dtype (str): 'float16' or 'float32'.
+
+    Returns:
+        tuple: The manifest and the list of the artifacts that were rebuilt.
+    """
+    if image_dtype not in IMAGE_DTYPES:
+        raise ValueError(f"Unsupported image feature type '{image_dtype}', expected one of {IMAGE_DTYPES}")
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory) or {'artifacts': {}}
+    entries = copy.deepcopy(previous['artifacts'])
+    options = {'text': {}, 'image_features': {'dtype': image_dtype}, 'labels': {}}
+
+    artifacts = {}
+    rebuilt = []
+    for name, file_name in ARTIFACT_FILES.items():
+        source_path = sources[name]
+        if name == 'text' and not os.path.exists(source_path):
+            # A legacy dense .npy is converted by load_text_features, which writes the .npz
+            load_text_features(source_path)
+        entry = entries.get(name)
+        if _artifact_is_current(directory, entry, source_path, options[name]):
+            artifacts[name] = entry
+            continue
+
+        logging.info(f"Packaging {name} from {source_path}...")
+        artifact_path = os.path.join(directory, file_name)
+        details = _BUILDERS[name](source_path, artifact_path, options[name])
+        artifacts[name] = {
+            'file': file_name,
+            'sha256': file_sha256(artifact_path),
+            'state': _file_state(artifact_path),
+            'options': options[name],
+            'source': {'path': source_path, 'sha256': file_sha256(source_path), 'state': _file_state(source_path)},
+            **details,
+        }
+        rebuilt.append(name)
+
+    rows = {artifact['shape'][0] for artifact in artifacts.values()}
+    if len(rows) != 1:
+        raise ValueError(f"Row counts differ between the artifacts: {sorted(rows)}")
+    digest = hashlib.sha256(f"v{DATASET_FORMAT_VERSION}".encode())
+    for name in ARTIFACT_FILES:
+        digest.update(f";{name}:{artifacts[name]['sha256']}".encode())
+
+    manifest = {
+        'format_version': DATASET_FORMAT_VERSION,
+        'fingerprint': digest.hexdigest()[:16],
+        'rows': rows.pop(),
+        'num_classes': artifacts['labels']['num_classes'],
+        'created_at': time.time() if rebuilt else previous.get('created_at', time.time()),
+        'artifacts': artifacts,
+    }
+    # Source states may have been refreshed even when nothing was rebuilt
+    if manifest != previous:
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+        _write_atomic(os.path.join(directory, MANIFEST_NAME), write)
+    return manifest, rebuilt
+
+
+# Function to open a dataset package for training or evaluation
+def load_dataset_package(directory, verify=False):
+    """
+    Open a dataset package. The image features and labels are memory-mapped.
+
+    Args:
+        directory (str): Directory of the package.
+        verify (bool): Check the SHA-256 of every artifact against the manifest (reads every file once).
+
+    Returns:
+        tuple: CSR text features, image features, labels and the manifest.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No dataset package (format {DATASET_FORMAT_VERSION}) in {directory}")
+    artifacts = manifest['artifacts']
+    paths = {name: os.path.join(directory, artifacts[name]['file']) for name in ARTIFACT_FILES}
+    if verify:
+        for name, path in paths.items():
+            if file_sha256(path) != artifacts[name]['sha256']:
+                raise ValueError(f"Artifact {name} of the dataset package in {directory} does not match its manifest")
+
+    text_features = sp.load_npz(paths['text']).tocsr()
+    image_features = np.load(paths['image_features'], mmap_mode='r')
+    labels = np.load(paths['labels'], mmap_mode='r')
+    for name, array in (('text', text_features), ('image_features', image_features), ('labels', labels)):
+        if list(array.shape) != artifacts[name]['shape']:
+            raise ValueError(f"Artifact {name} of the dataset package in {directory} does not match its manifest")
+    return text_features, image_features, labels, manifest
+
+
+if __name__ == "__main__":
+    from src.api.config import DATASET_DIR, DATASET_IMAGE_DTYPE
+    from src.api.training_data import DATASET_SOURCES
+
+    parser = argparse.ArgumentParser(description="Package the training dataset (reusing the artifacts that did not change).")
+    parser.add_argument('--output', default=DATASET_DIR, help="Directory of the package")
+    parser.add_argument('--image-dtype', default=DATASET_IMAGE_DTYPE, choices=IMAGE_DTYPES, help="Storage type of the image features")
+    parser.add_argument('--verify', action='store_true', help="Check the hashes of the package afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manifest, rebuilt = build_dataset_package(args.output, DATASET_SOURCES, image_dtype=args.image_dtype)
+    if args.verify:
+        load_dataset_package(args.output, verify=True)
+    logging.info(f"Dataset package {manifest['fingerprint']}: {manifest['rows']} rows, "
+                 f"rebuilt: {', '.join(rebuilt) or 'nothing'}")
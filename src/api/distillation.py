@@ -0,0 +1,220 @@
+import logging
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Dense, Dropout, Input, Activation, concatenate
+from tensorflow.keras.models import Model, load_model
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+from tensorflow.keras.optimizers import Nadam
+
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.training_data import load_dataset, load_split_indices
+from src.api.text_reduction import fit_text_projection
+from src.api.retrain_model import MODEL_PATH, evaluate_model_on_test_data
+from src.api.config import (
+    EXPORT_TFLITE, TFLITE_QUANTIZATION, TEXT_FEATURIZER, STUDENT_TEXT_DIM, DISTILLATION_TEMPERATURE, DISTILLATION_ALPHA,
+)
+
+# Output paths of the distilled student model and its TFLite artifact (compared with the teacher, not served)
+STUDENT_MODEL_PATH = 'src/models/student_model.keras'
+STUDENT_TFLITE_MODEL_PATH = 'src/models/student_model.tflite'
+
+
+# Function to build the compact student model
+def build_student_model(input_shape_text, input_shape_image, num_classes, text_projection=None, text_units=128,
+                        image_units=64, sparse_text=True):
+    """
+    Build a student with the inputs and output of the teacher (see `build_model`) and a much
+    smaller head: one narrow layer per branch, no hidden layer after the concatenation.
+
+    The layer producing the logits is named 'logits', so `distillation_loss` can be trained
+    on them while the saved model outputs probabilities like the teacher.
+
+    Args:
+        input_shape_text (int): Number of text features (TF-IDF or hashed columns).
+        input_shape_image (int): Size of the pooled image features.
+        num_classes (int): Number of classes.
+        text_projection (np.ndarray): Frozen projection of the text features (see `fit_text_projection`).
+        text_units (int): Units of the text layer.
+        image_units (int): Units of the image layer.
+
+    Returns:
+        Model: Uncompiled student model.
+    """
+    text_input = Input(shape=(input_shape_text,), sparse=sparse_text, name='text_input')
+    x1 = text_input
+    if text_projection is not None:
+        projection_layer = Dense(text_projection.shape[1], use_bias=False, trainable=False, name='text_projection')
+        x1 = projection_layer(x1)
+    x1 = Dense(text_units, activation='relu')(x1)
+    x1 = Dropout(0.3)(x1)
+
+    image_input = Input(shape=(input_shape_image,), name='image_input')
+    x2 = Dense(image_units, activation='relu')(image_input)
+    x2 = Dropout(0.3)(x2)
+
+    logits = Dense(num_classes, name='logits')(concatenate([x1, x2]))
+    output = Activation('softmax', name='probabilities')(logits)
+    model = Model(inputs=[text_input, image_input], outputs=output, name='student')
+    if text_projection is not None:
+        projection_layer.set_weights([text_projection])
+    return model
+
+
+# Function to soften probabilities as if their logits were divided by a temperature
+def soften_probabilities(probabilities, temperature):
+    """
+    softmax(log(p) / T): the teacher outputs probabilities, whose logarithm equals its logits
+    up to a per-row constant, so this is the softmax of the teacher logits at temperature T.
+    """
+    log_probabilities = np.log(np.clip(probabilities, 1e-12, 1.0)) / temperature
+    log_probabilities -= log_probabilities.max(axis=1, keepdims=True)
+    softened = np.exp(log_probabilities)
+    return (softened / softened.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+# Function to compute the distillation targets of the rows the student is trained and validated on
+def distillation_targets(teacher, X_text, image_features, labels, indices, temperature, batch_size=1024):
+    """
+    Run the teacher over the given rows and pack its softened probabilities with the labels.
+
+    Returns:
+        np.ndarray: float32 array of shape (rows of the dataset, classes + 1): the softened
+        teacher probabilities followed by the label. Rows outside `indices` are zero; the array
+        is indexed by dataset row, like the labels it stands in for.
+    """
+    indices = np.sort(np.asarray(indices))
+    num_classes = teacher.output_shape[-1]
+    targets = np.zeros((X_text.shape[0], num_classes + 1), dtype=np.float32)
+    dataset = SparseFeatureDataset(X_text, image_features, batch_size=batch_size, indices=indices)
+    for index in range(len(dataset)):
+        rows = indices[index * batch_size:(index + 1) * batch_size]
+        targets[rows, :num_classes] = soften_probabilities(np.asarray(teacher.predict_on_batch(dataset[index][0])), temperature)
+    targets[indices, num_classes] = np.asarray(labels[indices])
+    return targets
+
+
+# Function to build the loss of the student: soft teacher targets plus the true labels
+def distillation_loss(temperature, alpha):
+    """
+    alpha * T² * CE(softened teacher, softmax(logits / T)) + (1 - alpha) * CE(label, softmax(logits)).
+
+    The T² factor keeps the gradients of the soft term on the scale of the hard one.
+    `y_true` is a row of `distillation_targets`.
+    """
+    def loss(y_true, logits):
+        soft_targets, hard_labels = y_true[:, :-1], tf.cast(y_true[:, -1], tf.int32)
+        soft_loss = tf.keras.losses.categorical_crossentropy(soft_targets, logits / temperature, from_logits=True)
+        hard_loss = tf.keras.losses.sparse_categorical_crossentropy(hard_labels, logits, from_logits=True)
+        return alpha * temperature ** 2 * soft_loss + (1 - alpha) * hard_loss
+
+    return loss
+
+
+# Function to train a student on the teacher's soft probabilities
+def distill_student(teacher, X_text, image_features, labels, splits, text_dim=STUDENT_TEXT_DIM,
+                    temperature=DISTILLATION_TEMPERATURE, alpha=DISTILLATION_ALPHA, epochs=30, batch_size=64,
+                    callbacks=None):
+    """
+    Args:
+        teacher: Trained classification model (e.g. retrained_balanced_model.keras).
+        X_text, image_features, labels: Balanced training dataset (see `load_dataset`).
+        splits (dict): 'train' and 'val' row indices (see `load_split_indices`).
+        text_dim (int): Dimensions of the frozen SVD projection of the text features (0 feeds all of them).
+        temperature (float): Softening of the teacher and student distributions in the soft term.
+        alpha (float): Weight of the soft term against the true labels.
+        callbacks (list): Extra Keras callbacks for the fit.
+
+    Returns:
+        tuple: The student model (outputting probabilities) and the Keras History of the fit.
+    """
+    fit_indices = np.concatenate([splits['train'], splits['val']])
+    logging.info(f"Computing the teacher targets of {len(fit_indices)} rows (temperature {temperature})...")
+    targets = distillation_targets(teacher, X_text, image_features, labels, fit_indices, temperature)
+
+    text_projection = None
+    if text_dim:
+        text_projection = fit_text_projection(X_text, text_dim, 'svd', indices=splits['train'])
+    student = build_student_model(X_text.shape[1], image_features.shape[1], teacher.output_shape[-1],
+                                  text_projection=text_projection)
+
+    # Trained on its logits; shares every layer with the saved student
+    trainer = Model(inputs=student.inputs, outputs=student.get_layer('logits').output)
+    trainer.compile(optimizer=Nadam(learning_rate=0.001), loss=distillation_loss(temperature, alpha))
+    early_stopping = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+    reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-5)
+    logging.info(f"Distilling a student with {student.count_params()} parameters "
+                 f"(teacher: {teacher.count_params()})...")
+    history = trainer.fit(
+        SparseFeatureDataset(X_text, image_features, targets, batch_size=batch_size, shuffle=True, indices=splits['train']),
+        epochs=epochs,
+        validation_data=SparseFeatureDataset(X_text, image_features, targets, batch_size=256, indices=splits['val']),
+        callbacks=[early_stopping, reduce_lr] + list(callbacks or []),
+    )
+    student.compile(optimizer=Nadam(learning_rate=0.001), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return student, history
+
+
+# Function to time the forward pass of a model on single products
+def head_latency_ms(model, X_text, image_features, indices, n_requests=100):
+    """
+    Returns:
+        tuple: Median and 99th percentile of the latency of `predict_on_batch` on one product, in ms.
+    """
+    dataset = SparseFeatureDataset(X_text, image_features, batch_size=1, indices=np.asarray(indices)[:n_requests])
+    inputs = [dataset[index][0] for index in range(len(dataset))]
+    model.predict_on_batch(inputs[0])
+    latencies = []
+    for batch in inputs:
+        start = time.perf_counter()
+        model.predict_on_batch(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies)), float(np.percentile(latencies, 99))
+
+
+# Function to distill the served model into the student, raising on failure (used by the background training jobs)
+def run_distillation(callbacks=None, text_featurizer=TEXT_FEATURIZER):
+    """
+    Distill retrained_balanced_model.keras into a compact student, save it (and its TFLite
+    artifact) and compare both models on the test split.
+
+    Args:
+        callbacks (list): Extra Keras callbacks for the fit (e.g. progress reporting of a training job).
+        text_featurizer (str): Text featurizer the teacher was trained with.
+
+    Returns:
+        dict: F1-score and single-product latency of the student and the teacher, and the student path.
+    """
+    logging.info(f"Loading the teacher from {MODEL_PATH}...")
+    teacher = load_model(MODEL_PATH)
+    X_text, image_features, labels, manifest = load_dataset(text_featurizer=text_featurizer)
+    splits = load_split_indices(X_text.shape[0], fingerprint=manifest['fingerprint'])
+
+    student, history = distill_student(teacher, X_text, image_features, labels, splits, callbacks=callbacks)
+    logging.info("Saving the student model...")
+    student.save(STUDENT_MODEL_PATH)
+    logging.info(f"Student model saved to {STUDENT_MODEL_PATH}")
+
+    if EXPORT_TFLITE:
+        from src.api.tflite_model import export_tflite, evaluate_export_parity
+
+        try:
+            export_tflite(student, STUDENT_TFLITE_MODEL_PATH, quantization=TFLITE_QUANTIZATION)
+            parity = evaluate_export_parity(
+                student, STUDENT_TFLITE_MODEL_PATH, X_text, image_features, labels, indices=splits['test']
+            )
+            logging.info(f"Student TFLite parity report: {parity}")
+        except Exception as e:
+            logging.error(f"Error during the student TFLite export: {e}")
+
+    report = {'student_path': STUDENT_MODEL_PATH, 'epochs': len(history.epoch)}
+    for name, model in (('student', student), ('teacher', teacher)):
+        report[f'{name}_f1_test'] = evaluate_model_on_test_data(model, X_text, image_features, labels, indices=splits['test'])
+        report[f'{name}_params'] = model.count_params()
+        report[f'{name}_p50_ms'], report[f'{name}_p99_ms'] = head_latency_ms(model, X_text, image_features, splits['test'])
+    logging.info(f"Distillation report: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    run_distillation()
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.config import DATASET_DIR
+from src.api.training_data import SPLIT_INDICES_PATH, load_dataset, dataset_fingerprint, load_split_indices
+
+
+# Function to accumulate the confusion matrix of a model batch by batch
+def streaming_confusion_matrix(model, text_features, image_features, labels, indices=None, batch_size=1024):
+    """
+    Run the model over the rows of a dataset one batch at a time and count the
+    (true class, predicted class) pairs, so neither the inputs of the whole split nor
+    its predicted probabilities are ever held in memory.
+
+    Args:
+        model: Keras model or TFLiteModel (anything with `predict_on_batch`).
+        text_features (scipy.sparse.csr_matrix): TF-IDF features.
+        image_features (np.ndarray): Pooled image features (may be memory-mapped).
+        labels (np.ndarray): Integer labels (may be memory-mapped).
+        indices (np.ndarray): Rows to evaluate (all rows when None).
+        batch_size (int): Rows per forward pass.
+
+    Returns:
+        np.ndarray: (num_classes, num_classes) int64 matrix, rows are true classes and
+        columns predicted classes.
+    """
+    if indices is not None:
+        # Ascending rows read the memory-mapped arrays sequentially; the order does not change the counts
+        indices = np.sort(np.asarray(indices, dtype=np.int64))
+    dataset = SparseFeatureDataset(text_features, image_features, labels, batch_size=batch_size, indices=indices)
+    matrix = None
+    for batch_index in range(len(dataset)):
+        inputs, y_true = dataset[batch_index]
+        probabilities = np.asarray(model.predict_on_batch(inputs))
+        num_classes = probabilities.shape[1]
+        if matrix is None:
+            matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        y_true = y_true.astype(np.int64)
+        if y_true.min() < 0 or y_true.max() >= num_classes:
+            raise ValueError(f"Labels must be in [0, {num_classes}), the model has {num_classes} outputs")
+        y_pred = np.argmax(probabilities, axis=1)
+        matrix += np.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes).reshape(matrix.shape)
+    if matrix is None:
+        raise ValueError("No rows to evaluate")
+    return matrix
+
+
+# Function to derive the metrics of classification_report from a confusion matrix
+def metrics_from_confusion_matrix(matrix):
+    """
+    Compute the per-class precision, recall, F1-score and support, the accuracy and the
+    macro and weighted averages, in the layout of `classification_report(output_dict=True)`.
+    Classes that never occur in the labels nor the predictions are left out, like
+    scikit-learn does; undefined ratios are reported as 0.
+
+    Returns:
+        dict: The report; its 'weighted avg' F1-score is the `f1_score(average='weighted')` of the rows.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    true_positives = np.diag(matrix)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.nan_to_num(true_positives / predicted)
+        recall = np.nan_to_num(true_positives / support)
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+
+    classes = np.flatnonzero((support > 0) | (predicted > 0))
+    total = support.sum()
+    report = {
+        str(label): {
+            'precision': float(precision[label]), 'recall': float(recall[label]),
+            'f1-score': float(f1[label]), 'support': float(support[label]),
+        }
+        for label in classes
+    }
+    report['accuracy'] = float(true_positives.sum() / total) if total else 0.0
+    for name, weights in (('macro avg', None), ('weighted avg', support[classes])):
+        report[name] = {
+            'precision': float(np.average(precision[classes], weights=weights)),
+            'recall': float(np.average(recall[classes], weights=weights)),
+            'f1-score': float(np.average(f1[classes], weights=weights)),
+            'support': float(total),
+        }
+    return report
+
+
+class EvaluationService:
+    """
+    Evaluates the served model on the held-out test split of the balanced dataset.
+
+    Results are cached in memory and as JSON files in `cache_dir`, keyed by the version of
+    the served model (`ModelRegistry.model_version`, recorded when it was loaded) and the
+    fingerprint of the dataset package, so repeated calls return immediately until a new
+    model is loaded or the dataset changes.
+    Concurrent calls for the same key run the evaluation only once.
+    """
+
+    def __init__(self, cache_dir=None, split='test', batch_size=1024, package_dir=DATASET_DIR, sources=None,
+                 split_path=SPLIT_INDICES_PATH):
+        """
+        Args:
+            cache_dir (str): Directory of the cached results shared by the workers (None keeps them in memory only).
+            split (str): Split of the persisted split indices to evaluate ('test' or 'val').
+            batch_size (int): Rows per forward pass.
+            package_dir (str): Directory of the dataset package.
+            sources (dict): Source arrays of the package (see `load_dataset`).
+            split_path (str): File of the persisted split indices.
+        """
+        self.cache_dir = cache_dir
+        self.split = split
+        self.batch_size = batch_size
+        self.package_dir = package_dir
+        self.sources = sources
+        self.split_path = split_path
+        self._results = {}
+        self._lock = threading.Lock()
+
+    # Function to build the cache key of a model version and the dataset package currently on disk
+    def cache_key(self, model_version, data_version=None):
+        """
+        Returns:
+            str: The key, or None when the dataset package is missing or outdated.
+        """
+        data_version = data_version or dataset_fingerprint(self.package_dir, self.sources)
+        if data_version is None:
+            return None
+        return f"{self.split}-{model_version}-{data_version}"
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _lookup(self, key):
+        result = self._results.get(key)
+        if result is None and self.cache_dir:
+            try:
+                with open(self._cache_path(key)) as f:
+                    result = json.load(f)
+                self._results[key] = result
+            except (OSError, ValueError):
+                return None
+        return result
+
+    # Function to look up the result of the current model and dataset without evaluating
+    def cached(self, model_version):
+        """
+        Returns:
+            dict: The cached result, or None when the model or the dataset changed since the last evaluation.
+        """
+        key = self.cache_key(model_version)
+        return None if key is None else self._lookup(key)
+
+    # Function to evaluate the model, reusing the cached result when nothing changed
+    def evaluate(self, model, model_version):
+        """
+        Evaluate the model on the held-out split.
+
+        Args:
+            model: Served model (anything with `predict_on_batch`).
+            model_version (str): Version the model was loaded with, part of the cache key.
+
+        Returns:
+            dict: 'f1_score' (weighted), 'classification_report', 'confusion_matrix', 'split',
+            'rows', 'dataset' (fingerprint), 'seconds', 'evaluated_at' and 'cached'.
+        """
+        result = self.cached(model_version)
+        if result is not None:
+            return {**result, 'cached': True}
+
+        with self._lock:
+            # Brings the package up to date first, so the key is taken afterwards
+            text_features, image_features, labels, manifest = load_dataset(self.package_dir, self.sources)
+            indices = load_split_indices(
+                text_features.shape[0], path=self.split_path, fingerprint=manifest['fingerprint']
+            )[self.split]
+            key = self.cache_key(model_version, manifest['fingerprint'])
+            result = self._lookup(key)
+            if result is not None:
+                return {**result, 'cached': True}
+
+            logging.info(f"Evaluating the model on the {self.split} split ({len(indices)} rows)...")
+            start = time.perf_counter()
+            matrix = streaming_confusion_matrix(
+                model, text_features, image_features, labels, indices, batch_size=self.batch_size
+            )
+            report = metrics_from_confusion_matrix(matrix)
+            result = {
+                'f1_score': report['weighted avg']['f1-score'],
+                'classification_report': report,
+                'confusion_matrix': matrix.tolist(),
+                'split': self.split,
+                'rows': int(len(indices)),
+                'dataset': manifest['fingerprint'],
+                'seconds': round(time.perf_counter() - start, 3),
+                'evaluated_at': time.time(),
+            }
+            self._results = {key: result}
+            if self.cache_dir:
+                self._write(key, result)
+            return {**result, 'cached': False}
+
+    def _write(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self._cache_path(key))
+        # Results of older models or datasets can never be requested again
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(f"{self.split}-") and name.endswith('.json') and name != f"{key}.json":
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
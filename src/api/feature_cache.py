@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from src.api.image_features import BACKBONE_VERSION
+from src.api.metrics import (
+    IMAGE_FEATURE_CACHE_HITS, IMAGE_FEATURE_CACHE_MISSES, IMAGE_FEATURE_CACHE_EVICTIONS, IMAGE_FEATURE_CACHE_SIZE,
+)
+
+
+# Function to hash the raw bytes of an uploaded image
+def image_content_hash(image_data: bytes) -> str:
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class ImageFeatureCache:
+    """
+    Content-addressed cache of pooled image feature vectors.
+
+    Entries are keyed by the hash of the uploaded bytes and the backbone version. A bounded
+    in-memory LRU tier sits in front of an optional on-disk tier: one .npy file per entry,
+    opened memory-mapped, so every uvicorn worker pointing at the same directory shares it.
+    The disk tier is bounded too: a hit refreshes the mtime of its file, and every few
+    writes the files beyond `max_disk_entries` are removed, least recently used first.
+    """
+
+    def __init__(self, max_entries=10000, disk_dir=None, backbone_version=BACKBONE_VERSION, max_disk_entries=None):
+        """
+        Args:
+            max_entries (int): Maximum number of vectors kept in memory (0 disables the memory tier).
+            disk_dir (str): Directory of the shared on-disk tier (None disables it).
+            backbone_version (str): Version of the backbone that produced the features.
+            max_disk_entries (int): Maximum number of files of the disk tier (None: unbounded).
+        """
+        self.max_entries = max_entries
+        self.backbone_version = backbone_version
+        self.disk_dir = os.path.join(disk_dir, backbone_version) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        # The directory is scanned once per 5% of the cap written, so that eviction stays cheap per write
+        self._disk_check_interval = max(1, (max_disk_entries or 0) // 20)
+        self._disk_writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to build the cache key of an uploaded image
+    def key(self, image_data: bytes) -> str:
+        return image_content_hash(image_data)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    # Function to look up the features of an image (memory first, then disk)
+    def get(self, key: str):
+        """
+        Look up the cached features of an image.
+
+        Args:
+            key (str): Key returned by `key()`.
+
+        Returns:
+            np.ndarray: The cached feature vector, or None on a miss.
+        """
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                IMAGE_FEATURE_CACHE_HITS.labels(tier="memory").inc()
+                return features
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                features = np.load(path, mmap_mode='r')
+                if self.max_disk_entries is not None:
+                    os.utime(path)  # Recently used: evicted last
+            except (FileNotFoundError, ValueError, OSError):
+                features = None
+            if features is not None:
+                IMAGE_FEATURE_CACHE_HITS.labels(tier="disk").inc()
+                self._remember(key, np.array(features))
+                return features
+
+        IMAGE_FEATURE_CACHE_MISSES.inc()
+        return None
+
+    # Function to store the features of an image in every enabled tier
+    def put(self, key: str, features):
+        features = np.asarray(features, dtype=np.float32)
+        self._remember(key, features)
+        if self.disk_dir is not None:
+            self._write_to_disk(key, features)
+
+    def _remember(self, key: str, features):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                IMAGE_FEATURE_CACHE_EVICTIONS.labels(tier="memory").inc()
+            IMAGE_FEATURE_CACHE_SIZE.set(len(self._entries))
+
+    def _write_to_disk(self, key: str, features):
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so other workers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, features)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write image features to the disk cache: {e}")
+            return
+        if self.max_disk_entries is not None:
+            with self._lock:
+                self._disk_writes += 1
+                if self._disk_writes < self._disk_check_interval:
+                    return
+                self._disk_writes = 0
+            self.evict_disk()
+
+    # Function to remove the least recently used files of the disk tier beyond `max_disk_entries`
+    def evict_disk(self) -> int:
+        """
+        Returns:
+            int: Number of files removed.
+        """
+        entries = []
+        try:
+            for directory in os.scandir(self.disk_dir):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    if entry.name.endswith('.npy'):
+                        try:
+                            entries.append((entry.stat().st_mtime_ns, entry.path))
+                        except FileNotFoundError:
+                            pass  # Evicted by another worker meanwhile
+        except FileNotFoundError:
+            return 0
+        if len(entries) <= self.max_disk_entries:
+            return 0
+        entries.sort()
+        removed = 0
+        for _, path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        IMAGE_FEATURE_CACHE_EVICTIONS.labels(tier="disk").inc(removed)
+        return removed
+
+    # Function to clear the memory tier (the disk tier is left to the operator)
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            IMAGE_FEATURE_CACHE_SIZE.set(0)
@@ -0,0 +1,390 @@
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import threading
+import time
+from uuid import uuid4
+import numpy as np
+import scipy.sparse as sp
+
+from src.api.prediction_cache import file_fingerprint
+
+# Resolution of directory mtimes: nanosecond timestamps (ext4, XFS, tmpfs) advance once per kernel tick
+DIRECTORY_MTIME_RESOLUTION_NS = 100 * 10 ** 6
+
+
+# Function to build the version of the stored features from the extractors that produce them
+def feature_store_version(backbone_version: str, vectorizer_path: str) -> str:
+    """
+    Features are only reusable with the same image backbone and the same fitted vectorizer:
+    the version combines the backbone version, the text featurizer and a fingerprint of the
+    vectorizer file.
+    """
+    featurizer = 'hashing' if vectorizer_path.endswith('.json') else 'tfidf'
+    return f"{backbone_version}-{featurizer}-{file_fingerprint([vectorizer_path])}"
+
+
+# Function to get the version of the image backbone of a serving backend
+def serving_backbone_version(serving_backend: str, tflite_model_path: str) -> str:
+    """
+    The store holds the features of the serving backbone: the API fills it at ingestion
+    with the backbone it serves, so training and the backfill batch use that one too.
+    """
+    if serving_backend == 'tflite':
+        from src.api.tflite_model import artifact_backbone_version
+
+        return artifact_backbone_version(tflite_model_path)
+    from src.api.image_features import BACKBONE_VERSION
+
+    return BACKBONE_VERSION
+
+
+# Function to build the version of the stored features of a serving backend
+def serving_feature_store_version(serving_backend: str, tflite_model_path: str, vectorizer_path: str) -> str:
+    return feature_store_version(serving_backbone_version(serving_backend, tflite_model_path), vectorizer_path)
+
+
+# Function to load the image extractor of a serving backend, to featurize the products missing from the store
+def load_serving_extractor(serving_backend: str, tflite_model_path: str, backbone_weights=None, num_threads=None):
+    """
+    Returns:
+        callable: The backbone signature of the TFLite artifact, or None for the shared
+        Keras backbone (loaded by this call).
+    """
+    if serving_backend == 'tflite':
+        from src.api.tflite_model import TFLiteModel
+
+        return TFLiteModel(tflite_model_path, num_threads=num_threads).extract_image_features
+    from src.api.image_features import load_feature_extractor
+
+    load_feature_extractor(backbone_weights)
+    return None
+
+
+class FeatureStore:
+    """
+    Precomputed model inputs of the products, keyed by product id and extractor version.
+
+    Each version is a directory of shards. A shard is one .npz file holding a column of
+    product ids, the CSR arrays of their TF-IDF rows and their pooled image features; it
+    is written once (atomically) and never modified, so several workers can add shards
+    concurrently. When a product is stored twice, the most recent shard wins.
+    `compact()` merges the shards into one; with `max_shards`, `put()` merges the recent
+    ones whenever there are more, so ingesting products one by one keeps few shards.
+    """
+
+    def __init__(self, root: str, version: str, max_shards=None):
+        """
+        Args:
+            root (str): Directory of the store.
+            version (str): Extractor version (see `feature_store_version`).
+            max_shards (int): Number of shards above which `put()` compacts the store (None: never).
+        """
+        self.version = version
+        self.directory = os.path.join(root, version)
+        self.max_shards = max_shards
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}  # Product id -> (shard path, row)
+        self._shards = []
+        self._shard_sizes = {}  # Shard path -> number of products
+        self._listing = None  # Directory mtime and time of the last listing
+
+    def _shard_paths(self):
+        # Names start with the write time, so sorting them orders the shards by age
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.npz')))
+
+    def _reset(self):
+        self._index = {}
+        self._shards = []
+        self._shard_sizes = {}
+        self._listing = None
+
+    # Function to index the shards written since the last refresh (by any worker)
+    def refresh(self):
+        with self._lock:
+            # Writing, renaming or removing a shard updates the mtime of the directory: while it is
+            # unchanged, the listing is too. A listing taken within the mtime resolution of coarse
+            # file systems may have missed a write that left the mtime as it was, so it is retaken.
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+            if self._listing is not None and self._listing[0] == mtime_ns \
+                    and self._listing[1] - mtime_ns > DIRECTORY_MTIME_RESOLUTION_NS:
+                return
+            listed_at_ns = time.time_ns()
+            paths = self._shard_paths()
+            if paths[:len(self._shards)] != self._shards:
+                # Shards were merged by compact(): rebuild the index from scratch
+                self._reset()
+            for path in paths[len(self._shards):]:
+                try:
+                    with np.load(path) as shard:
+                        product_ids = shard['product_ids']
+                except FileNotFoundError:
+                    continue
+                for row, product_id in enumerate(product_ids.tolist()):
+                    self._index[product_id] = (path, row)
+                self._shards.append(path)
+                self._shard_sizes[path] = len(product_ids)
+            self._listing = (mtime_ns, listed_at_ns)
+
+    def __contains__(self, product_id) -> bool:
+        self.refresh()
+        return int(product_id) in self._index
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index)
+
+    # Function to get the products of a list that have no stored features yet
+    def missing(self, product_ids):
+        self.refresh()
+        return [product_id for product_id in product_ids if int(product_id) not in self._index]
+
+    # Function to store the features of products in a new shard
+    def put(self, product_ids, text_features, image_features) -> str:
+        """
+        Store the features of products, then compact the store if it holds more than `max_shards` shards.
+
+        Args:
+            product_ids (list): IDs of the products.
+            text_features (sp.csr_matrix): Their TF-IDF rows.
+            image_features (np.ndarray): Their pooled image features.
+
+        Returns:
+            str: Path of the written shard (merged into another one if the store was compacted).
+        """
+        path = os.path.join(self.directory, f"part-{time.time_ns():020d}-{uuid4().hex[:8]}.npz")
+        self._write_shard(path, product_ids, text_features, image_features)
+        if self.max_shards is not None:
+            self.refresh()
+            if len(self._shards) > self.max_shards:
+                self.compact(tiered=True)
+        return path
+
+    def _write_shard(self, path, product_ids, text_features, image_features):
+        text_features = sp.csr_matrix(text_features, dtype=np.float32)
+        image_features = np.asarray(image_features, dtype=np.float32)
+        if not len(product_ids) == text_features.shape[0] == image_features.shape[0]:
+            raise ValueError("product_ids, text_features and image_features must have the same number of rows")
+        # Write to a temporary file first so readers never see a partial shard
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                product_ids=np.asarray(product_ids, dtype=np.int64),
+                text_data=text_features.data,
+                text_indices=text_features.indices,
+                text_indptr=text_features.indptr,
+                text_shape=np.array(text_features.shape, dtype=np.int64),
+                image_features=image_features,
+            )
+        os.replace(tmp_path, path)
+
+    # Function to read the stored features of products, in the order of the ids
+    def get(self, product_ids):
+        """
+        Read the stored features of products.
+
+        Args:
+            product_ids (list): IDs of the products, all present in the store.
+
+        Returns:
+            tuple: CSR TF-IDF rows and float32 image features, in the order of `product_ids`.
+
+        Raises:
+            KeyError: If a product has no stored features.
+        """
+        self.refresh()
+        try:
+            return self._read(product_ids)
+        except (FileNotFoundError, KeyError):
+            # A shard was merged away by compact() in another worker, or written too recently to
+            # change the mtime of the directory: re-index and retry
+            with self._lock:
+                self._reset()
+            self.refresh()
+            return self._read(product_ids)
+
+    def _read(self, product_ids):
+        with self._lock:
+            locations = [self._index.get(int(product_id)) for product_id in product_ids]
+        missing = [product_id for product_id, location in zip(product_ids, locations) if location is None]
+        if missing:
+            raise KeyError(f"No stored features for products {missing[:10]}")
+
+        rows_by_shard = {}
+        for position, (path, row) in enumerate(locations):
+            rows_by_shard.setdefault(path, []).append((position, row))
+
+        text_parts, image_parts, order = [], [], []
+        for path, entries in rows_by_shard.items():
+            positions, rows = zip(*entries)
+            with np.load(path) as shard:
+                text = sp.csr_matrix(
+                    (shard['text_data'], shard['text_indices'], shard['text_indptr']), shape=tuple(shard['text_shape'])
+                )
+                text_parts.append(text[list(rows)])
+                image_parts.append(shard['image_features'][list(rows)])
+            order.extend(positions)
+
+        # Put the rows back in the requested order
+        inverse = np.argsort(order)
+        text_features = sp.vstack(text_parts, format='csr')[inverse]
+        image_features = np.concatenate(image_parts)[inverse]
+        return text_features, image_features
+
+    # Function to merge shards into one, keeping the latest features of each product
+    def compact(self, tiered=False):
+        """
+        Merge every shard into one, or with `tiered` only the recent shards that hold fewer
+        products than the ones after them together, so that a large shard is rewritten only
+        once as many products were added after it (as in an LSM tree).
+
+        The merged shard sorts right before the newest shard it replaces, so the shards
+        written meanwhile by other workers still win over it.
+        """
+        self.refresh()
+        with self._lock:
+            shards = list(self._shards)
+            sizes = [self._shard_sizes[path] for path in shards]
+        if len(shards) <= 1:
+            return
+        if tiered:
+            first, total = len(shards) - 1, sizes[-1]
+            while first > 0 and sizes[first - 1] <= total:
+                first -= 1
+                total += sizes[first]
+            if first < len(shards) - 1:
+                shards = shards[first:]
+        with self._lock:
+            merged = set(shards)
+            product_ids = [product_id for product_id, (path, _) in self._index.items() if path in merged]
+        text_features, image_features = self.get(product_ids)
+        # part-<time>-<id> of the newest shard, followed by an id of its own
+        newest = '-'.join(os.path.basename(shards[-1]).split('-')[:3]).removesuffix('.npz')
+        self._write_shard(os.path.join(self.directory, f"{newest}-{uuid4().hex[:8]}.npz"),
+                          product_ids, text_features, image_features)
+        for path in shards:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Merged by another worker at the same time
+        self.refresh()
+
+
+# Function to compute and store the features of the products that are not in the store yet
+def featurize_products(store, vectorizer, products, batch_size=32, extractor=None, feature_cache=None):
+    """
+    Compute the TF-IDF rows and pooled image features of the products missing from the store.
+
+    Returns:
+        dict: Product id -> error message for the products whose image could not be read.
+    """
+    from src.api.util_model import load_product_features
+
+    missing_ids = set(store.missing([product.id for product in products]))
+    pending = [product for product in products if product.id in missing_ids]
+    if not pending:
+        return {}
+    text_features, image_features, _, product_ids, errors = load_product_features(
+        vectorizer, pending, batch_size=batch_size, extractor=extractor, feature_cache=feature_cache
+    )
+    if product_ids:
+        store.put(product_ids, text_features, image_features)
+    return errors
+
+
+# Function to get the model inputs of products from the store, computing the missing ones first
+def load_store_features(store, vectorizer, products, batch_size=32, extractor=None):
+    """
+    Same result as `util_model.load_product_features`, but images are only read and run
+    through the backbone for products that are not in the store yet.
+
+    Returns:
+        tuple: CSR TF-IDF rows, image features, labels, product ids and errors (product id -> message).
+    """
+    from src.api.util_model import load_product_features
+
+    errors = featurize_products(store, vectorizer, products, batch_size=batch_size, extractor=extractor)
+    valid_products = [product for product in products if product.id not in errors]
+    product_ids = [product.id for product in valid_products]
+    if not product_ids:
+        # Empty inputs with the right number of columns
+        text_features, image_features, y, _, _ = load_product_features(vectorizer, [])
+        return text_features, image_features, y, product_ids, errors
+    text_features, image_features = store.get(product_ids)
+    # Integer labels, as expected by the sparse categorical cross-entropy of the model
+    y = np.array([int(product.category) for product in valid_products], dtype=np.int64)
+    return text_features, image_features, y, product_ids, errors
+
+
+# Function to fill the store for the products that have no features yet, chunk by chunk
+def backfill_feature_store(session, store, vectorizer, chunk_size=1000, extractor=None, only_untrained=True):
+    """
+    Compute the features of the stored products in a background batch.
+
+    Args:
+        session (Session): SQLAlchemy session.
+        store (FeatureStore): Store to fill.
+        vectorizer: Fitted TF-IDF vectorizer.
+        chunk_size (int): Products featurized (and written as one shard) at a time.
+        extractor (callable): Image feature extractor (defaults to the shared Keras backbone).
+        only_untrained (bool): Only the products not used for training yet (state 0).
+
+    Returns:
+        dict: Number of products featurized and of products whose image could not be read.
+    """
+    from src.api.database import Product
+
+    query = session.query(Product).order_by(Product.id)
+    if only_untrained:
+        query = query.filter(Product.state == 0)
+    featurized = failed = 0
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(Product.id > last_id)
+        products = chunk_query.limit(chunk_size).all()
+        if not products:
+            break
+        last_id = products[-1].id
+        pending = len(store.missing([product.id for product in products]))
+        errors = featurize_products(store, vectorizer, products, extractor=extractor)
+        featurized += pending - len(errors)
+        failed += len(errors)
+        session.expunge_all()
+    store.compact()
+    return {'featurized': featurized, 'failed': failed}
+
+
+if __name__ == "__main__":
+    from src.api.config import (
+        BACKBONE_WEIGHTS, FEATURE_STORE_DIR, FEATURE_STORE_MAX_SHARDS, SERVING_BACKEND, TEXT_FEATURIZER, TFLITE_NUM_THREADS,
+    )
+    from src.api.hashing_vectorizer import load_text_vectorizer, text_vectorizer_path
+    from src.api.database import SessionLocal
+    from src.api.retrain_model import TFLITE_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Compute the features of the stored products in a background batch.")
+    parser.add_argument('--vectorizer', default=text_vectorizer_path(TEXT_FEATURIZER), help="Text vectorizer of the model")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Products per shard")
+    parser.add_argument('--all', action='store_true', help="Also featurize the products already used for training")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    extractor = load_serving_extractor(
+        SERVING_BACKEND, TFLITE_MODEL_PATH, None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS,
+        num_threads=TFLITE_NUM_THREADS,
+    )
+    store = FeatureStore(FEATURE_STORE_DIR, serving_feature_store_version(SERVING_BACKEND, TFLITE_MODEL_PATH, args.vectorizer),
+                         max_shards=FEATURE_STORE_MAX_SHARDS)
+    session = SessionLocal()
+    try:
+        counts = backfill_feature_store(
+            session, store, load_text_vectorizer(args.vectorizer), chunk_size=args.chunk_size, extractor=extractor,
+            only_untrained=not args.all,
+        )
+    finally:
+        session.close()
+    logging.info(f"Feature store {store.version}: {counts['featurized']} products featurized, {counts['failed']} failed")
@@ -0,0 +1,217 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# Text featurizers: the fitted TF-IDF vectorizer (joblib) or its stateless hashing counterpart
+TEXT_FEATURIZERS = ('tfidf', 'hashing')
+TFIDF_VECTORIZER_PATH = 'src/models/Tfidf_Vectorizer.joblib'
+HASHING_VECTORIZER_PATH = 'src/models/Hashing_Vectorizer.json'
+
+# Tokenization parameters copied from the TF-IDF vectorizer, so both featurizers see the same terms
+ANALYZER_PARAMETERS = ('lowercase', 'token_pattern', 'ngram_range', 'stop_words', 'strip_accents', 'analyzer', 'binary')
+
+
+class HashingTfidfVectorizer:
+    """
+    TF-IDF featurizer without a vocabulary.
+
+    Terms are mapped to one of `n_features` columns by feature hashing, and weighted by an
+    IDF array with one value per column. The array is a plain .npy file opened memory-mapped,
+    so every uvicorn worker shares the same page-cache copy instead of unpickling its own
+    vocabulary dict. Columns that no known term hashes to have a weight of 0: like the fitted
+    vectorizer, unknown terms are ignored (unless they collide with a known one).
+    """
+
+    def __init__(self, idf, lowercase=True, token_pattern=r"(?u)\b\w\w+\b", ngram_range=(1, 1), stop_words=None,
+                 strip_accents=None, analyzer='word', binary=False, sublinear_tf=False, norm='l2', source_columns=None):
+        """
+        Args:
+            idf (np.ndarray): IDF weight of every hashed column (its length is the number of columns).
+            lowercase, token_pattern, ngram_range, stop_words, strip_accents, analyzer, binary: Tokenization, as in TfidfVectorizer.
+            sublinear_tf (bool): Replace term counts with 1 + log(count).
+            norm (str): Row normalization ('l2', 'l1' or None).
+            source_columns (np.ndarray): Hashed column of every column of the TF-IDF vectorizer it was built from
+                (converts features computed with that vectorizer, see `convert_tfidf_features`).
+        """
+        self.idf = idf
+        self.n_features = len(idf)
+        self.parameters = {
+            'lowercase': lowercase, 'token_pattern': token_pattern, 'ngram_range': tuple(ngram_range),
+            'stop_words': stop_words, 'strip_accents': strip_accents, 'analyzer': analyzer, 'binary': binary,
+        }
+        self.lowercase = lowercase
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.source_columns = source_columns
+        self._hasher = HashingVectorizer(
+            n_features=self.n_features, alternate_sign=False, norm=None, dtype=np.float32, **self.parameters
+        )
+
+    # Function to vectorize texts into a float32 CSR matrix, like TfidfVectorizer.transform
+    def transform(self, texts):
+        features = self._hasher.transform(texts).tocsr()
+        if self.sublinear_tf:
+            np.log(features.data, out=features.data)
+            features.data += 1
+        features.data *= self.idf[features.indices]
+        features.eliminate_zeros()
+        if self.norm:
+            normalize(features, norm=self.norm, copy=False)
+        return features
+
+    # Function to map features computed by the source TF-IDF vectorizer onto the hashed columns
+    def convert_tfidf_features(self, text_features):
+        """
+        Convert TF-IDF rows of the source vectorizer (e.g. the training dataset) into the rows
+        `transform` produces for the same texts, without the texts: each vocabulary column is
+        moved to its hashed column. Terms sharing a column are summed and rows are normalized
+        again, so the result only differs from `transform` by the IDF averaged over collisions.
+
+        Returns:
+            sp.csr_matrix: float32 matrix with `n_features` columns.
+        """
+        if self.source_columns is None:
+            raise ValueError("This hashing vectorizer was not built from a TF-IDF vectorizer")
+        text_features = sp.csr_matrix(text_features, dtype=np.float32)
+        if text_features.shape[1] != len(self.source_columns):
+            raise ValueError(f"Expected {len(self.source_columns)} TF-IDF columns, got {text_features.shape[1]}")
+        converted = sp.csr_matrix(
+            (text_features.data, np.asarray(self.source_columns)[text_features.indices], text_features.indptr),
+            shape=(text_features.shape[0], self.n_features),
+        )
+        converted.sum_duplicates()
+        if self.norm:
+            normalize(converted, norm=self.norm, copy=False)
+        return converted
+
+    # Function to build the hashing counterpart of a fitted TfidfVectorizer
+    @classmethod
+    def from_tfidf_vectorizer(cls, vectorizer, n_features=2 ** 14):
+        """
+        Hash every term of the vocabulary and give each column the IDF of its terms (averaged
+        when several terms share a column); the other columns get 0.
+        """
+        parameters = {name: getattr(vectorizer, name) for name in ANALYZER_PARAMETERS}
+        if isinstance(parameters['stop_words'], (set, frozenset)):
+            parameters['stop_words'] = sorted(parameters['stop_words'])
+        if parameters['analyzer'] != 'word' or getattr(vectorizer, 'tokenizer', None) or getattr(vectorizer, 'preprocessor', None):
+            raise ValueError("Only vectorizers with the default word analyzer can be converted")
+        terms = vectorizer.get_feature_names_out()
+        hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+        columns = hasher.transform([[term] for term in terms]).indices.astype(np.int32)
+        counts = np.bincount(columns, minlength=n_features)
+        idf = np.bincount(columns, weights=vectorizer.idf_, minlength=n_features)
+        idf = np.divide(idf, counts, out=np.zeros(n_features), where=counts > 0).astype(np.float32)
+        return cls(idf, sublinear_tf=vectorizer.sublinear_tf, norm=vectorizer.norm, source_columns=columns, **parameters)
+
+    # Function to save the vectorizer as a JSON description and .npy arrays next to it
+    def save(self, path):
+        """
+        Args:
+            path (str): Destination of the JSON file (the arrays are written as `<path without .json>.*.npy`).
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        base = os.path.splitext(os.path.basename(path))[0]
+        config = {
+            'n_features': self.n_features, 'sublinear_tf': self.sublinear_tf, 'norm': self.norm,
+            'idf_file': f"{base}.idf.npy", **self.parameters,
+        }
+        arrays = {'idf_file': self.idf}
+        if self.source_columns is not None:
+            config['source_columns_file'] = f"{base}.source_columns.npy"
+            arrays['source_columns_file'] = self.source_columns
+        for key, array in arrays.items():
+            _write_atomic(os.path.join(directory, config[key]), lambda f, array=array: np.save(f, np.asarray(array)))
+        # Written last: readers never see a description whose arrays are missing
+        _write_atomic(path, lambda f: f.write(json.dumps(config, indent=2).encode()))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Args:
+            path (str): JSON file written by `save`.
+            mmap (bool): Open the arrays memory-mapped (shared between the processes that load them).
+        """
+        with open(path) as f:
+            config = json.load(f)
+        directory = os.path.dirname(os.path.abspath(path))
+        mmap_mode = 'r' if mmap else None
+        idf = np.load(os.path.join(directory, config.pop('idf_file')), mmap_mode=mmap_mode)
+        source_columns_file = config.pop('source_columns_file', None)
+        source_columns = None
+        if source_columns_file:
+            source_columns = np.load(os.path.join(directory, source_columns_file), mmap_mode=mmap_mode)
+        if len(idf) != config.pop('n_features'):
+            raise ValueError(f"The IDF array of {path} does not match its description")
+        return cls(idf, source_columns=source_columns, **config)
+
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Function to get the path of the vectorizer of a text featurizer
+def text_vectorizer_path(featurizer):
+    if featurizer not in TEXT_FEATURIZERS:
+        raise ValueError(f"Unknown text featurizer '{featurizer}', expected one of {TEXT_FEATURIZERS}")
+    return HASHING_VECTORIZER_PATH if featurizer == 'hashing' else TFIDF_VECTORIZER_PATH
+
+
+# Function to load the text vectorizer saved at a path (hashing .json or TF-IDF joblib)
+def load_text_vectorizer(path):
+    if path.endswith('.json'):
+        return HashingTfidfVectorizer.load(path)
+    from joblib import load as joblib_load
+
+    return joblib_load(path)
+
+
+# Function to create (or update) the hashing vectorizer from the fitted TF-IDF vectorizer
+def build_hashing_vectorizer(tfidf_path=TFIDF_VECTORIZER_PATH, path=HASHING_VECTORIZER_PATH, n_features=2 ** 14):
+    """
+    Build the hashing vectorizer when it is missing or was built with another number of columns.
+
+    Returns:
+        HashingTfidfVectorizer: The vectorizer saved at `path`.
+    """
+    if os.path.exists(path):
+        vectorizer = HashingTfidfVectorizer.load(path)
+        if vectorizer.n_features == n_features:
+            return vectorizer
+    from joblib import load as joblib_load
+
+    logging.info(f"Building the hashing vectorizer ({n_features} columns) from {tfidf_path}...")
+    vectorizer = HashingTfidfVectorizer.from_tfidf_vectorizer(joblib_load(tfidf_path), n_features)
+    vectorizer.save(path)
+    shared = len(vectorizer.source_columns) - np.count_nonzero(np.bincount(vectorizer.source_columns))
+    logging.info(f"Hashing vectorizer saved to {path} ({shared} of {len(vectorizer.source_columns)} terms share a column)")
+    return vectorizer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the stateless hashing vectorizer from the fitted TF-IDF vectorizer.")
+    parser.add_argument('--tfidf', default=TFIDF_VECTORIZER_PATH, help="Fitted TF-IDF vectorizer (joblib)")
+    parser.add_argument('--output', default=HASHING_VECTORIZER_PATH, help="JSON description of the hashing vectorizer")
+    parser.add_argument('--n-features', type=int, default=2 ** 14, help="Number of hashed columns")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    build_hashing_vectorizer(args.tfidf, args.output, args.n_features)
@@ -0,0 +1,99 @@
+import threading
+import numpy as np
+
+# TensorFlow is imported inside the functions below, so that modules which only need the
+# constants (e.g. the feature cache) can be imported without paying for it
+
+# Identifier of the image backbone and its preprocessing. Bump it whenever either changes
+# so that features produced by different pipelines are never mixed up.
+BACKBONE_VERSION = "efficientnetb0-imagenet-gap-v2"
+
+# Size of the pooled feature vector produced by EfficientNetB0
+IMAGE_FEATURE_DIM = 1280
+
+# Process-wide extractor, built lazily and shared by every request
+_extractor = None
+_forward = None
+_extractor_lock = threading.Lock()
+
+
+# Function to build the EfficientNetB0 + GlobalAveragePooling2D feature extractor
+def build_feature_extractor(weights='imagenet'):
+    """
+    Build the image feature extractor used by the classification model.
+
+    Args:
+        weights (str): Weights passed to EfficientNetB0 ('imagenet' or None).
+
+    Returns:
+        Model: Keras model mapping a batch of preprocessed images to pooled features.
+    """
+    from tensorflow.keras.applications import EfficientNetB0
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+
+    backbone = EfficientNetB0(weights=weights, include_top=False)
+    pooled = GlobalAveragePooling2D()(backbone.output)
+    return Model(inputs=backbone.input, outputs=pooled, name='image_feature_extractor')
+
+
+# Function to load the shared feature extractor (only built on the first call)
+def load_feature_extractor(weights='imagenet'):
+    """
+    Load the process-wide image feature extractor.
+
+    The backbone is built and its weights are loaded only once; every later call
+    returns the same instance.
+
+    Args:
+        weights (str): Weights passed to EfficientNetB0 on the first call.
+
+    Returns:
+        Model: The shared feature extractor.
+    """
+    global _extractor, _forward
+    if _extractor is None:
+        import tensorflow as tf
+
+        with _extractor_lock:
+            if _extractor is None:
+                extractor = build_feature_extractor(weights)
+                # A single traced graph for any batch size avoids the Python overhead of model.predict
+                _forward = tf.function(
+                    lambda batch: extractor(batch, training=False),
+                    input_signature=[tf.TensorSpec(shape=(None, None, None, 3), dtype=tf.float32)],
+                )
+                _extractor = extractor
+    return _extractor
+
+
+# Function to run the extractor once on a dummy batch so the first request does not pay for tracing
+def warmup_feature_extractor(batch_size=1, image_size=(224, 224)):
+    dummy_batch = np.zeros((batch_size, image_size[0], image_size[1], 3), dtype=np.float32)
+    extract_image_features(dummy_batch)
+
+
+# Function to extract pooled image features for a batch of preprocessed images
+def extract_image_features(batch, batch_size=32):
+    """
+    Extract pooled EfficientNetB0 features for a batch of preprocessed images.
+
+    Args:
+        batch: Array or tensor of shape (n, height, width, 3).
+        batch_size (int): Maximum number of images sent through the backbone at once.
+
+    Returns:
+        np.ndarray: Array of shape (n, 1280) with float32 features.
+    """
+    import tensorflow as tf
+
+    load_feature_extractor()
+    batch = tf.convert_to_tensor(batch, dtype=tf.float32)
+    if batch.shape[0] == 0:
+        return np.zeros((0, IMAGE_FEATURE_DIM), dtype=np.float32)
+
+    features = [
+        _forward(batch[start:start + batch_size]).numpy()
+        for start in range(0, batch.shape[0], batch_size)
+    ]
+    return np.concatenate(features, axis=0)
@@ -0,0 +1,171 @@
+import logging
+import time
+import numpy as np
+import scipy.sparse as sp
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.models import load_model
+from tensorflow.keras.optimizers import Nadam
+
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.training_data import load_dataset, load_split_indices
+from src.api.hashing_vectorizer import load_text_vectorizer, text_vectorizer_path
+from src.api.retrain_model import MODEL_PATH, TFLITE_MODEL_PATH, evaluate_model_on_test_data, export_optimized_model
+from src.api.config import (
+    BACKBONE_WEIGHTS, EXPORT_TFLITE, INCREMENTAL_REPLAY_RATIO, INCREMENTAL_EPOCHS, INCREMENTAL_LEARNING_RATE,
+    INCREMENTAL_VALIDATION_ROWS, FEATURE_STORE_DIR, FEATURE_STORE_MAX_SHARDS, SERVING_BACKEND, TEXT_FEATURIZER,
+    TFLITE_NUM_THREADS,
+)
+
+# Text vectorizer of the model, used to featurize the new products
+VECTORIZER_PATH = text_vectorizer_path(TEXT_FEATURIZER)
+
+
+# Function to draw the rows of the training split replayed next to the new products
+def sample_replay_indices(train_indices, size, seed=42):
+    """
+    Draw `size` rows of the training split without replacement (all of them if it is smaller).
+
+    Returns:
+        np.ndarray: Sorted row indices, so the memory-mapped arrays are read sequentially.
+    """
+    size = min(int(size), len(train_indices))
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(train_indices, size=size, replace=False))
+
+
+# Function to fine-tune a trained model on new products plus a replay sample of the training data
+def fine_tune_model(model, new_text, new_images, new_labels, X_text, image_features, labels, train_indices,
+                    val_indices, replay_ratio=INCREMENTAL_REPLAY_RATIO, epochs=INCREMENTAL_EPOCHS,
+                    learning_rate=INCREMENTAL_LEARNING_RATE, validation_rows=INCREMENTAL_VALIDATION_ROWS,
+                    callbacks=None, batch_size=64, seed=42):
+    """
+    Continue training `model` from its current weights.
+
+    The new products are mixed with `replay_ratio` rows of the training split per new product,
+    so the model keeps seeing the old classes and does not forget them. Early stopping watches
+    a sample of the validation split, i.e. the accuracy on the data the model already knew.
+
+    Args:
+        model: Trained Keras model (e.g. loaded from retrained_balanced_model.keras).
+        new_text (csr_matrix): TF-IDF rows of the new products.
+        new_images (np.ndarray): Pooled image features of the new products.
+        new_labels (np.ndarray): Integer labels of the new products.
+        X_text, image_features, labels: Balanced training dataset (see `load_dataset`).
+        train_indices, val_indices (np.ndarray): Rows of its training and validation splits.
+        replay_ratio (float): Rows replayed from the training split per new product.
+        epochs (int): Maximum number of epochs.
+        learning_rate (float): Learning rate of the fine-tuning optimizer.
+        validation_rows (int): Maximum number of validation rows used for early stopping.
+        callbacks (list): Extra Keras callbacks.
+
+    Returns:
+        tuple: Keras History of the fit and number of replayed rows.
+    """
+    new_labels = np.asarray(new_labels)
+    num_classes = model.output_shape[-1]
+    if new_labels.size and (new_labels.min() < 0 or new_labels.max() >= num_classes):
+        raise ValueError(f"Labels of the new products must be class indices in [0, {num_classes})")
+
+    replay_indices = sample_replay_indices(train_indices, round(replay_ratio * len(new_labels)), seed)
+    fit_text = sp.vstack([new_text, X_text[replay_indices]], format='csr')
+    fit_images = np.concatenate([np.asarray(new_images, dtype=np.float32), np.asarray(image_features[replay_indices])])
+    fit_labels = np.concatenate([new_labels, np.asarray(labels[replay_indices])])
+    logging.info(f"Fine-tuning on {len(new_labels)} new products and {len(replay_indices)} replayed rows...")
+
+    validation_indices = sample_replay_indices(val_indices, validation_rows, seed)
+
+    # A fresh optimizer: the replayed rows and early stopping on the old validation data guard against forgetting
+    model.compile(optimizer=Nadam(learning_rate=learning_rate), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    early_stopping = EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)
+    history = model.fit(
+        SparseFeatureDataset(fit_text, fit_images, fit_labels, batch_size=batch_size, shuffle=True),
+        epochs=epochs,
+        validation_data=SparseFeatureDataset(X_text, image_features, labels, batch_size=256, indices=validation_indices),
+        callbacks=[early_stopping] + list(callbacks or []),
+    )
+    return history, len(replay_indices)
+
+
+# Function to fine-tune the served model on the products added since the last training (run as a training job)
+def run_incremental_training(callbacks=None, session=None):
+    """
+    Load the current model, fine-tune it on the untrained products (state 0) plus a replay
+    sample, save it, evaluate it on the test split and mark the products as trained.
+
+    Args:
+        callbacks (list): Extra Keras callbacks for the fit (e.g. progress reporting of a training job).
+        session (Session): Database session (a new one is opened if None).
+
+    Returns:
+        dict: Number of new and replayed rows, F1-score on the test set, epochs run and duration.
+    """
+    from src.api.database import SessionLocal, iter_untrained_products, mark_products_trained
+    from src.api.util_model import concatenate_inputs
+    from src.api.feature_store import FeatureStore, load_serving_extractor, load_store_features, serving_feature_store_version
+
+    start = time.perf_counter()
+    own_session = session is None
+    session = session or SessionLocal()
+    try:
+        chunks = iter_untrained_products(session)
+        products = next(chunks, None)
+        if products is None:
+            logging.info("No new products to train on.")
+            return {'new_products': 0, 'skipped_products': 0, 'replay_rows': 0, 'f1_test': None, 'epochs': 0, 'seconds': 0.0}
+
+        # Features computed at ingestion are read from the store; only the missing ones need the backbone.
+        # The new products are featurized chunk by chunk as they are read.
+        # The store holds the features of the serving backbone, which also computes the missing ones.
+        store = FeatureStore(FEATURE_STORE_DIR, serving_feature_store_version(SERVING_BACKEND, TFLITE_MODEL_PATH, VECTORIZER_PATH),
+                             max_shards=FEATURE_STORE_MAX_SHARDS)
+        vectorizer = load_text_vectorizer(VECTORIZER_PATH)
+        parts = []
+        extractor, extractor_loaded = None, False
+        while products is not None:
+            missing = store.missing([product.id for product in products])
+            if missing:
+                logging.info(f"Computing features of {len(missing)} of {len(products)} new products...")
+                if not extractor_loaded:
+                    extractor = load_serving_extractor(
+                        SERVING_BACKEND, TFLITE_MODEL_PATH, None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS,
+                        num_threads=TFLITE_NUM_THREADS,
+                    )
+                    extractor_loaded = True
+            parts.append(load_store_features(store, vectorizer, products, extractor=extractor))
+            products = next(chunks, None)
+        new_text, new_images, new_labels, product_ids, errors = concatenate_inputs(parts)
+        for product_id, message in errors.items():
+            logging.warning(f"Product {product_id} skipped: {message}")
+        if not product_ids:
+            raise ValueError("None of the new products could be featurized")
+
+        X_text, image_features, labels, manifest = load_dataset()
+        splits = load_split_indices(X_text.shape[0], fingerprint=manifest['fingerprint'])
+
+        logging.info(f"Loading the current model from {MODEL_PATH}...")
+        model = load_model(MODEL_PATH)
+        history, replay_rows = fine_tune_model(
+            model, new_text, new_images, new_labels, X_text, image_features, labels,
+            splits['train'], splits['val'], callbacks=callbacks,
+        )
+
+        logging.info("Saving model...")
+        model.save(MODEL_PATH)
+        logging.info("Model saved successfully.")
+        if EXPORT_TFLITE:
+            export_optimized_model(model, X_text, image_features, labels, indices=splits['test'])
+        f1_test = evaluate_model_on_test_data(model, X_text, image_features, labels, indices=splits['test'])
+
+        # The model now includes these products
+        mark_products_trained(session, product_ids)
+        return {
+            'new_products': len(product_ids),
+            'skipped_products': len(errors),
+            'replay_rows': replay_rows,
+            'f1_test': f1_test,
+            'epochs': len(history.epoch),
+            'seconds': round(time.perf_counter() - start, 1),
+        }
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from src.api.metrics import INFERENCE_PENDING, INFERENCE_REJECTED
+
+
+class InferenceQueueFull(Exception):
+    """Raised when model work is rejected because the inference queue is full."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Inference queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor(Executor):
+    """
+    Dedicated pool of threads running all model work off the asyncio event loop.
+
+    TensorFlow and NumPy release the GIL in their kernels, so a thread pool sharing the
+    preloaded model, vectorizer and backbone is enough to keep the loop responsive
+    without duplicating the models in worker processes. At most `max_pending` tasks
+    (running or queued) are accepted; further submissions raise InferenceQueueFull.
+    """
+
+    def __init__(self, max_workers=2, max_pending=64, retry_after=1):
+        """
+        Args:
+            max_workers (int): Number of inference threads.
+            max_pending (int): Maximum number of running plus queued tasks.
+            retry_after (int): Seconds suggested to rejected clients.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                INFERENCE_REJECTED.inc()
+                raise InferenceQueueFull(self.retry_after)
+            self._pending += 1
+            INFERENCE_PENDING.set(self._pending)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            INFERENCE_PENDING.set(self._pending)
+
+    # Function to run a callable on the pool and await its result from the event loop
+    async def run(self, fn, /, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -1,52 +1,272 @@
-import time
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Request, status
+import asyncio
+import json
+import math
+from datetime import datetime
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from joblib import load as joblib_load
-from tensorflow.keras.models import load_model
-from PIL import Image
-from io import BytesIO
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 import numpy as np
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import uuid4
 import requests 
-from sklearn.metrics import f1_score, classification_report
 
-from src.api.retrain_model import retrain_model  # Import the retrain_model function
-from src.api.util_model import predict_classification, train_model_on_new_data, evaluate_model_on_untrained_data
+# TensorFlow, Keras and scikit-learn are only imported by the warmup phase and the model
+# endpoints, so importing this module (e.g. in tests) stays fast
+from src.api.batching import MicroBatcher
+from src.api.metrics import export_metrics
+from src.api.feature_cache import ImageFeatureCache
+from src.api.inference_executor import InferenceExecutor, InferenceQueueFull
+from src.api.prediction_cache import create_prediction_cache
+from src.api.feature_store import FeatureStore, featurize_products, serving_feature_store_version
+from src.api.startup import ModelRegistry, wait_for_database
+from src.api.training_jobs import TrainingJobManager, TrainingJobRunning
+from src.api.config import (
+    PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT_MS, PREDICT_MAX_QUEUE, PREDICT_BATCH_MAX_ITEMS, PREDICT_BATCH_MAX_IMAGE_BYTES,
+    PREDICT_BATCH_MAX_ARCHIVE_BYTES, IMAGE_FEATURE_CACHE_SIZE, IMAGE_FEATURE_CACHE_DIR, IMAGE_FEATURE_CACHE_DISK_ENTRIES,
+    INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_RETRY_AFTER,
+    SERVING_BACKEND, TFLITE_NUM_THREADS, PREDICTION_CACHE_BACKEND, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL,
+    PREDICTION_CACHE_PATH, WARMUP_BLOCKING, BACKBONE_WEIGHTS, DATABASE_WAIT_INITIAL_DELAY, DATABASE_WAIT_MAX_DELAY,
+    TRAINING_JOBS_DIR, TRAINING_CPU_THREADS, TRAINING_NICE, TRAINING_CANCEL_GRACE, FEATURE_STORE_DIR, FEATURE_STORE_MAX_SHARDS,
+    EVALUATION_CACHE_DIR, EVALUATION_BATCH_SIZE, TEXT_FEATURIZER,
+    AUDIT_LOG_BATCH_SIZE, AUDIT_LOG_FLUSH_INTERVAL_MS, AUDIT_LOG_MAX_QUEUE, AUDIT_LOG_SHUTDOWN_TIMEOUT, AUDIT_LOG_SPILL_PATH,
+    AUDIT_LOG_FLUSH_TIMEOUT, LOGS_PAGE_SIZE, LOGS_MAX_PAGE_SIZE, LOGS_EXPORT_CHUNK_SIZE,
+)
+from src.api.util_batch import build_multipart_items, read_archive_items
 from src.api.util_auth import create_access_token, verify_password, get_password_hash, verify_access_token, admin_required
-from src.api.database import create_user, get_user, add_product, SessionLocal, User, create_tables, delete_user, log_event, get_all_logs, is_database_available
-
-# Load vectorizer and model globally when the app starts
-vectorizer_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'Tfidf_Vectorizer.joblib')
+from src.api.database import create_tables, is_database_available
+from src.api.async_database import (
+    AsyncSessionLocal, async_engine, create_user, get_user, count_users, add_product, delete_user, decode_log_cursor,
+    get_logs_page, stream_logs,
+)
+from src.api.audit_log import AuditLogWriter
+
+# Paths of the vectorizer and models, loaded by the warmup phase when the app starts
+# (the hashing vectorizer has no vocabulary: forked workers share its memory-mapped IDF array)
+vectorizer_file = 'Hashing_Vectorizer.json' if TEXT_FEATURIZER == 'hashing' else 'Tfidf_Vectorizer.joblib'
+vectorizer_path = os.path.join(os.path.dirname(__file__), '..', 'models', vectorizer_file)
 model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'retrained_balanced_model.keras')
 
-vectorizer = joblib_load(vectorizer_path)
-model = load_model(model_path)
+tflite_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'retrained_balanced_model.tflite')
+
+# Vectorizer, model and backbone of the configured serving backend
+registry = ModelRegistry(
+    vectorizer_path,
+    model_path,
+    tflite_model_path,
+    serving_backend=SERVING_BACKEND,
+    backbone_weights=None if BACKBONE_WEIGHTS.lower() == 'none' else BACKBONE_WEIGHTS,
+    tflite_num_threads=TFLITE_NUM_THREADS,
+)
+
+# Caches built once the warmup knows the backbone and model versions
+image_feature_cache = None
+prediction_cache = None
+feature_store = None
+evaluation_service = None
+
+# Load the models concurrently, then build the caches that depend on them
+def warm_up():
+    global image_feature_cache, prediction_cache, feature_store, evaluation_service
+    if not registry.warmup():
+        return False
+
+    # Pooled image features of already seen uploads, keyed by content hash and backbone version
+    image_feature_cache = ImageFeatureCache(
+        max_entries=IMAGE_FEATURE_CACHE_SIZE, disk_dir=IMAGE_FEATURE_CACHE_DIR, backbone_version=registry.backbone_version,
+        max_disk_entries=IMAGE_FEATURE_CACHE_DISK_ENTRIES,
+    )
+
+    # Results of /predict, invalidated whenever a new model is loaded (e.g. after /train)
+    prediction_cache = create_prediction_cache(
+        PREDICTION_CACHE_BACKEND,
+        lambda: registry.version,
+        max_entries=PREDICTION_CACHE_SIZE,
+        ttl_seconds=PREDICTION_CACHE_TTL,
+        path=PREDICTION_CACHE_PATH,
+        lowercase=getattr(registry.vectorizer, 'lowercase', True),
+    )
+
+    # Model inputs of the stored products, computed once at ingestion for training and evaluation
+    feature_store = FeatureStore(
+        FEATURE_STORE_DIR, serving_feature_store_version(registry.serving_backend, registry.tflite_model_path, vectorizer_path),
+        max_shards=FEATURE_STORE_MAX_SHARDS,
+    )
+
+    # Evaluation of the served model on the held-out test split, cached until the model or the dataset changes
+    from src.api.evaluation import EvaluationService
+
+    evaluation_service = EvaluationService(cache_dir=EVALUATION_CACHE_DIR, batch_size=EVALUATION_BATCH_SIZE)
+    return True
+
+# Answer 503 while the models are still loading
+def require_models_ready():
+    if not registry.models_ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Models are warming up, retry later",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+        )
+
+# Run one forward pass for a batch of (designation, description, image bytes) items
+def predict_batch(items):
+    from src.api.util_model import predict_classification_batch
+
+    designations, descriptions, images_data = zip(*items)
+    predicted_result = predict_classification_batch(
+        registry.model, registry.vectorizer, designations, descriptions, images_data,
+        feature_cache=image_feature_cache, extractor=registry.image_extractor,
+    )
+    return [
+        {"predicted_class": int(predicted_class), "confidence": float(confidence)}
+        for predicted_class, confidence in zip(predicted_result['predicted_class'], predicted_result['confidence'])
+    ]
+
+# Classify bulk items, serving the products already in the prediction cache without running the model
+def predict_items(items):
+    from src.api.util_model import predict_classification_bulk
+
+    results = [None] * len(items)
+    keys = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        if prediction_cache is not None and 'error' not in item:
+            keys[index] = prediction_cache.key(item['designation'], item['description'], item['image'])
+            cached = prediction_cache.get(keys[index])
+            if cached is not None:
+                results[index] = {**cached, "cached": True}
+                continue
+        pending.append(index)
+
+    computed = predict_classification_bulk(
+        registry.model, registry.vectorizer, [items[index] for index in pending],
+        feature_cache=image_feature_cache, extractor=registry.image_extractor,
+    )
+    for index, result in zip(pending, computed):
+        if 'error' in result:
+            results[index] = result
+            continue
+        if keys[index] is not None:
+            prediction_cache.put(keys[index], result)
+        results[index] = {**result, "cached": False}
+    return results
+
+# All model work (decoding, vectorizing, backbone and head) runs on this pool, never on the event loop
+inference_executor = InferenceExecutor(
+    max_workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING, retry_after=INFERENCE_RETRY_AFTER
+)
+
+# Concurrent /predict requests are grouped into micro-batches
+predict_batcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=PREDICT_MAX_WAIT_MS,
+    executor=inference_executor,
+    max_queue_size=PREDICT_MAX_QUEUE,
+    retry_after=INFERENCE_RETRY_AFTER,
+)
+
+# Serve the model written by a training job once the job succeeded
+def reload_trained_model(job_status):
+    # A distillation job only writes the offline student model, which is not served
+    if registry.models_ready and job_status.get('kind') != 'distill':
+        registry.load_model()
+
+# Training runs in a separate, CPU-limited process; its progress is read back from status files
+training_jobs = TrainingJobManager(
+    TRAINING_JOBS_DIR,
+    cpu_threads=TRAINING_CPU_THREADS,
+    nice=TRAINING_NICE,
+    cancel_grace=TRAINING_CANCEL_GRACE,
+    on_success=reload_trained_model,
+)
+
+# Signup, login and deletion events, written to the logs table in batches
+audit_log = AuditLogWriter(
+    AsyncSessionLocal,
+    max_batch_size=AUDIT_LOG_BATCH_SIZE,
+    flush_interval_ms=AUDIT_LOG_FLUSH_INTERVAL_MS,
+    max_queue_size=AUDIT_LOG_MAX_QUEUE,
+    shutdown_timeout=AUDIT_LOG_SHUTDOWN_TIMEOUT,
+    spill_path=AUDIT_LOG_SPILL_PATH,
+)
 
 # Define the upload directory for images
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'Img')  # Путь к папке для изображений
 
-# Dependency to get a session from the database
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependency to get an async session from the database (SQL does not block the event loop)
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Initialize OAuth2PasswordBearer to extract access token from the Authorization header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 app = FastAPI()
 
-# Initialize database when the app starts
+# Wait for the database (with exponential backoff) and create the tables
+async def prepare_database():
+    await wait_for_database(
+        is_database_available, initial_delay=DATABASE_WAIT_INITIAL_DELAY, max_delay=DATABASE_WAIT_MAX_DELAY
+    )
+    await asyncio.get_running_loop().run_in_executor(None, create_tables)
+    registry.database_ready = True
+
+# Warm up the models while waiting for the database
+async def start_serving():
+    await asyncio.gather(prepare_database(), asyncio.get_running_loop().run_in_executor(None, warm_up))
+
+# Initialize database and models when the app starts. Unless WARMUP_BLOCKING is set, the server
+# accepts connections right away and /health/ready reports the warmup progress
 @app.on_event("startup")
-def on_startup():
-    while not is_database_available():
-        print("Waiting for the database to become available...")
-        time.sleep(5)  # Wait for 5 seconds before retrying
-    create_tables()
+async def on_startup():
+    app.state.startup_task = asyncio.ensure_future(start_serving())
+    if WARMUP_BLOCKING:
+        await app.state.startup_task
+
+# Start the /predict micro-batching task
+@app.on_event("startup")
+async def start_predict_batcher():
+    predict_batcher.start()
+
+# Start the audit log writer (and write the events spilled by the previous shutdown)
+@app.on_event("startup")
+async def start_audit_log():
+    audit_log.start()
+
+# Stop the /predict micro-batching task and the inference threads
+@app.on_event("shutdown")
+async def stop_predict_batcher():
+    await predict_batcher.stop()
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+
+# Write the buffered audit events, then close the connections of the async database engine
+@app.on_event("shutdown")
+async def close_database():
+    await audit_log.stop()
+    await async_engine.dispose()
+
+# Backpressure: answer 503 with Retry-After when the inference queue is full
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFull):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Liveness probe: the process is up and its event loop responds
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+# Readiness probe: database reachable and every model component loaded
+@app.get("/health/ready")
+async def readiness():
+    report = registry.status()
+    status_code = status.HTTP_200_OK if report['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=report)
 
 # Endpoint to retrieve metrics from Prometheus
 @app.get("/metrics")
@@ -64,31 +284,40 @@ async def get_prometheus_metrics(request: Request):
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve metrics: {e}")
 
+# Endpoint exposing the metrics of this process to the Prometheus scraper
+@app.get("/metrics/export")
+async def export_prometheus_metrics():
+    payload, content_type = export_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # Updated signup function to assign admin role to the first user
 @app.post("/signup")
-async def signup(username: str, password: str, db: Session = Depends(get_db)):
-    existing_user = get_user(db, username)
+async def signup(username: str, password: str, db: AsyncSession = Depends(get_db)):
+    existing_user = await get_user(db, username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    users_exist = db.query(User).count() > 0
+    users_exist = await count_users(db) > 0
     role = 'admin' if not users_exist else 'user'
 
-    hashed_password = get_password_hash(password)
-    new_user = create_user(db, username, hashed_password, role)
-    log_event(db, new_user.id, f"User {username} signed up ")
+    # bcrypt takes a few hundred milliseconds of CPU: hash off the event loop
+    hashed_password = await asyncio.get_running_loop().run_in_executor(None, get_password_hash, password)
+    new_user = await create_user(db, username, hashed_password, role)
+    await audit_log.log(new_user.id, f"User {username} signed up ")
 
     return {"message": f"User created successfully with role: {role}"}
 
 # User authentication and token generation
 @app.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await get_user(db, form_data.username)
+    if not user or not await asyncio.get_running_loop().run_in_executor(
+        None, verify_password, form_data.password, user.password_hash
+    ):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     token = create_access_token({"sub": user.username})
-    log_event(db, user.id, f"User {user.username} logged in")
+    await audit_log.log(user.id, f"User {user.username} logged in")
     return {"access_token": token, "token_type": "bearer"}
 
 # Product category prediction endpoint
@@ -102,25 +331,78 @@ async def predict_category(
     user_info = verify_access_token(token)
     if not user_info:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token or user not authenticated")
+    require_models_ready()
     
     image_data = await file.read()
-    image = Image.open(BytesIO(image_data))
 
-    predicted_result = predict_classification(model, vectorizer, designation, description, image)
-    predicted_class = int(predicted_result['predicted_class'][0])
-    confidence = float(predicted_result['confidence'][0])
+    # Listings re-scored without changes skip decoding and inference entirely
+    cache_key = None
+    if prediction_cache is not None:
+        cache_key = prediction_cache.key(designation, description, image_data)
+        cached_result = prediction_cache.get(cache_key)
+        if cached_result is not None:
+            return {**cached_result, "cached": True}
 
-    return {
-        "predicted_class": predicted_class,
-        "confidence": confidence
+    try:
+        predicted_result = await predict_batcher.submit((designation, description, image_data))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    result = {
+        "predicted_class": predicted_result['predicted_class'],
+        "confidence": predicted_result['confidence']
     }
+    if prediction_cache is not None:
+        prediction_cache.put(cache_key, result)
+    return {**result, "cached": False}
+
+# Bulk product category prediction endpoint
+@app.post("/predict-batch", operation_id="predict_batch")
+async def predict_category_batch(
+    token: str = Depends(oauth2_scheme),
+    designations: List[str] = Form(None),
+    descriptions: List[str] = Form(None),
+    files: List[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+):
+    """
+    Predict the categories of many products in one call.
+
+    Products are sent either as parallel multipart lists (`designations`, `descriptions`, `files`)
+    or as a zip `archive` of images plus a `manifest.json`. Results come back in input order;
+    a product that cannot be processed gets an `error` instead of failing the whole batch,
+    and `cached` tells whether a result was served from the prediction cache.
+    """
+    user_info = verify_access_token(token)
+    if not user_info:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token or user not authenticated")
+    require_models_ready()
+
+    try:
+        if archive is not None:
+            # Read from the spooled upload file, in a thread: decompressing the members would block the event loop
+            items = await asyncio.get_running_loop().run_in_executor(
+                None, read_archive_items, archive.file, PREDICT_BATCH_MAX_ITEMS, PREDICT_BATCH_MAX_IMAGE_BYTES,
+                PREDICT_BATCH_MAX_ARCHIVE_BYTES,
+            )
+        else:
+            images = [await file.read() for file in files or []]
+            items = build_multipart_items(
+                designations or [], descriptions or [], images, PREDICT_BATCH_MAX_ITEMS, PREDICT_BATCH_MAX_IMAGE_BYTES
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    results = await inference_executor.run(predict_items, items)
+
+    return {"results": [{"index": index, **result} for index, result in enumerate(results)]}
 
 # Admin-only route
 @app.get("/admin-only")
 @admin_required()
 async def admin_route(
     request: Request,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ):
     return {"message": "Welcome, admin!"}
@@ -130,7 +412,7 @@ async def admin_route(
 @admin_required()
 async def add_product_api(
     request: Request,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
     image: UploadFile = File(...),
     designation: str = Form(...),
     description: str = Form(...),
@@ -143,82 +425,155 @@ async def add_product_api(
 
     try:
         os.makedirs(UPLOAD_DIR, exist_ok=True)
+        image_data = await image.read()
         with open(image_path, "wb") as f:
-            f.write(await image.read())
+            f.write(image_data)
         
-        add_product(session, image_path, designation, description, category)
+        product = await add_product(session, image_path, designation, description, category)
+
+        # Compute the model inputs now so training and evaluation read them from the feature store
+        if registry.models_ready:
+            try:
+                errors = await inference_executor.run(
+                    featurize_products, feature_store, registry.vectorizer, [product],
+                    extractor=registry.image_extractor, feature_cache=image_feature_cache,
+                )
+                if errors:
+                    print(f"Could not extract features for '{designation}': {errors[product.id]}")
+            except InferenceQueueFull:
+                print(f"Inference queue full, features for '{designation}' will be computed on first use")
 
         return {"message": "Product added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving product: {str(e)}")
     
-# Endpoint to evaluate the model on untrained data
+# Endpoint to evaluate the model on the held-out test split
 @app.get("/evaluate", operation_id="evaluate_model")
 @admin_required()  # Check if the user is an admin
 async def evaluate_model_endpoint(
     request: Request,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ):
+    require_models_ready()
+    # A cached result is answered directly, without a slot of the inference executor
+    cached = evaluation_service.cached(registry.model_version)
+    if cached is not None:
+        return {**cached, "cached": True}
     try:
-        # Load test data for both inputs (e.g., text and images)
-        X_test_text = np.load('src/data/X_train_tfidf_balanced.npy')
-        X_test_images = np.load('src/data/train_image_features_balanced.npy')  # Load image data
-
-        # Load true labels (Y_test)
-        y_true = np.load('src/data/Y_train_balanced.npy')  # Load the true labels for test data
-
-        # Predict using both inputs
-        y_pred = model.predict([X_test_text, X_test_images])
-        y_pred_classes = np.argmax(y_pred, axis=1)  # Convert predicted probabilities to class labels
-
-        # Calculate F1 score
-        f1 = f1_score(y_true, y_pred_classes, average='weighted')
-
-        # Generate classification report
-        report = classification_report(y_true, y_pred_classes, output_dict=True)
-
-        return {"f1_score": f1, "classification_report": report}
+        return await inference_executor.run(evaluate_balanced_data)
+    except InferenceQueueFull:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Evaluation failed: {str(e)}")
 
-# Endpoint to train the model on new data
-@app.get("/train", operation_id="train_model")
+# Evaluate the served model on the test split of the balanced dataset (runs on the inference executor)
+def evaluate_balanced_data():
+    model, model_version = registry.versioned_model()
+    return evaluation_service.evaluate(model, model_version)
+
+# Check the access token of the training endpoints
+def require_user(token: str):
+    user_info = verify_access_token(token)
+    if not user_info:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token or user not authenticated")
+    return user_info
+
+# Endpoint to train the model on new data: starts a background job and returns its id right away
+# (mode=incremental fine-tunes the current model on the products added since the last training)
+@app.get("/train", operation_id="train_model", status_code=status.HTTP_202_ACCEPTED)
 async def train_model_endpoint(
+    mode: str = 'full',
     token: str = Depends(oauth2_scheme)  # Проверка токена через зависимость oauth2_scheme
 ):
     # Проверка валидности токена
-    user_info = verify_access_token(token)
-    if not user_info:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token or user not authenticated")
-    
+    require_user(token)
+    if mode not in training_jobs.targets:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Unknown training mode '{mode}', expected one of {sorted(training_jobs.targets)}")
+
     try:
-        # Запуск модуля RetrainModule (retrain_model функция)
-        retrain_model()  # Call the retrain_model function from the retrain_model.py file
-        return {"message": "Model retraining started and completed successfully."}
+        job = training_jobs.start(mode)
+    except TrainingJobRunning as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Training failed to start: {str(e)}")
+    return {"job_id": job['id'], "state": job['state'], "status_url": f"/train/jobs/{job['id']}"}
+
+# Endpoint to list the most recent training jobs
+@app.get("/train/jobs", operation_id="list_training_jobs")
+async def list_training_jobs(limit: int = 20, token: str = Depends(oauth2_scheme)):
+    require_user(token)
+    return {"jobs": training_jobs.list_jobs(limit=limit)}
+
+# Endpoint to poll a training job: state, phase, per-epoch metrics and ETA
+@app.get("/train/jobs/{job_id}", operation_id="get_training_job")
+async def get_training_job(job_id: str, token: str = Depends(oauth2_scheme)):
+    require_user(token)
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training job not found")
+    return job
+
+# Endpoint to cancel a queued or running training job
+@app.post("/train/jobs/{job_id}/cancel", operation_id="cancel_training_job")
+async def cancel_training_job(job_id: str, token: str = Depends(oauth2_scheme)):
+    require_user(token)
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training job not found")
+    return job
+
+# Function to convert a log to its JSON representation
+def log_to_dict(log) -> dict:
+    return {
+        "id": log.id,
+        "timestamp": log.timestamp.isoformat(),
+        "user_id": log.user_id,
+        "event": log.event
+    }
 
-# Admin-only route to return all logs
+# NDJSON export of the logs, read from the database cursor one chunk at a time
+async def export_logs(filters: dict):
+    # Own session: the one of the request is closed before the body is streamed
+    async with AsyncSessionLocal() as session:
+        async for chunk in stream_logs(session, chunk_size=LOGS_EXPORT_CHUNK_SIZE, **filters):
+            yield "".join(json.dumps(log_to_dict(log)) + "\n" for log in chunk)
+
+# Admin-only route to return the logs, one page at a time or as an NDJSON export
 @app.get("/admin/logs", operation_id="admin_get_logs")
 @admin_required()
 async def get_logs(
     request: Request,
-    session: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
+    session: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    limit: int = Query(LOGS_PAGE_SIZE, ge=1, le=LOGS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
 ):
-    logs = get_all_logs(session)
-    
-    log_list = [
-        {
-            "id": log.id,
-            "timestamp": log.timestamp,
-            "user_id": log.user_id,
-            "event": log.event
-        } for log in logs
-    ]
-    
-    return {"logs": log_list}
+    """
+    Returns the logs in (timestamp, id) order, optionally those of one user and of a time
+    range. A page holds `limit` logs and the `next_cursor` to pass as `cursor` for the next
+    one (null on the last page). `format=ndjson` streams every matching log after `cursor`,
+    one JSON object per line.
+    """
+    try:
+        after = decode_log_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {"after": after, "user_id": user_id, "since": since, "until": until, "descending": order == "desc"}
+
+    # Include the events still buffered, unless the database is too slow to take them: answer with the logs written
+    await audit_log.flush(AUDIT_LOG_FLUSH_TIMEOUT)
+    if format == "ndjson":
+        return StreamingResponse(export_logs(filters), media_type="application/x-ndjson")
+
+    logs, next_cursor = await get_logs_page(session, limit, **filters)
+    return {"logs": [log_to_dict(log) for log in logs], "next_cursor": next_cursor}
 
 # Admin-only route to delete a user by username
 @app.delete("/delete-user/{username}", operation_id="delete_user")
@@ -226,11 +581,21 @@ async def get_logs(
 async def delete_user_by_admin(
     request: Request,
     username: str,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ):
-    result = delete_user(session, username)
-    if result:
-        return {"message": f"User '{username}' deleted successfully."}
-    else:
-        raise HTTPException(status_code=404, detail="User not found")
\ No newline at end of file
+    # Write the buffered events first, so those of the user are deleted with it
+    if not await audit_log.flush(AUDIT_LOG_FLUSH_TIMEOUT):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The audit log cannot be written at the moment, try again later",
+            headers={"Retry-After": str(math.ceil(AUDIT_LOG_FLUSH_TIMEOUT))},
+        )
+    user_id = await delete_user(session, username)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Recorded under the admin: the deleted user's own logs are gone
+    admin = await get_user(session, verify_access_token(token)["username"])
+    await audit_log.log(admin.id, f"User '{username}' with ID {user_id} was deleted")
+    return {"message": f"User '{username}' deleted successfully."}
\ No newline at end of file
@@ -0,0 +1,107 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Prometheus metrics exported by the API process (scraped from /metrics/export)
+
+# Startup warmup of the serving components
+STARTUP_COMPONENT_SECONDS = Gauge(
+    "startup_component_load_seconds",
+    "Time spent loading one serving component during warmup",
+    ["component"],
+)
+
+# Micro-batching of /predict requests
+PREDICT_QUEUE_DEPTH = Gauge(
+    "predict_batch_queue_depth",
+    "Number of /predict requests waiting to be batched",
+)
+PREDICT_BATCH_SIZE = Histogram(
+    "predict_batch_size",
+    "Number of requests served by one forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+PREDICT_BATCH_LATENCY = Histogram(
+    "predict_batch_latency_seconds",
+    "Time spent running the model on one batch",
+)
+
+# Content-addressed image feature cache
+IMAGE_FEATURE_CACHE_HITS = Counter(
+    "image_feature_cache_hits_total",
+    "Image feature lookups served from the cache",
+    ["tier"],
+)
+IMAGE_FEATURE_CACHE_MISSES = Counter(
+    "image_feature_cache_misses_total",
+    "Image feature lookups that required running the backbone",
+)
+IMAGE_FEATURE_CACHE_EVICTIONS = Counter(
+    "image_feature_cache_evictions_total",
+    "Entries evicted from the image feature cache",
+    ["tier"],
+)
+IMAGE_FEATURE_CACHE_SIZE = Gauge(
+    "image_feature_cache_entries",
+    "Number of image feature vectors held in memory",
+)
+
+# Cache of /predict results
+PREDICTION_CACHE_HITS = Counter(
+    "prediction_cache_hits_total",
+    "Predictions served from the cache without decoding or inference",
+)
+PREDICTION_CACHE_MISSES = Counter(
+    "prediction_cache_misses_total",
+    "Prediction lookups that required running the model",
+)
+PREDICTION_CACHE_EVICTIONS = Counter(
+    "prediction_cache_evictions_total",
+    "Cached predictions evicted to stay within the size limit",
+)
+
+# Dedicated inference executor
+INFERENCE_PENDING = Gauge(
+    "inference_executor_pending",
+    "Model tasks running or queued on the inference executor",
+)
+INFERENCE_REJECTED = Counter(
+    "inference_executor_rejected_total",
+    "Model tasks rejected because the inference queue was full",
+)
+
+# Buffered audit log writer
+AUDIT_LOG_QUEUE_DEPTH = Gauge(
+    "audit_log_queue_depth",
+    "Audit events waiting to be written to the logs table",
+)
+AUDIT_LOG_BATCH_SIZE = Histogram(
+    "audit_log_batch_size",
+    "Number of audit events written by one INSERT",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000),
+)
+AUDIT_LOG_FLUSH_LATENCY = Histogram(
+    "audit_log_flush_latency_seconds",
+    "Time spent writing one batch of audit events, retries included",
+)
+AUDIT_LOG_WRITE_ERRORS = Counter(
+    "audit_log_write_errors_total",
+    "Failed writes of a batch of audit events (the batch is retried)",
+)
+AUDIT_LOG_REJECTED = Counter(
+    "audit_log_rejected_events_total",
+    "Audit events refused by the database (e.g. unknown user)",
+)
+AUDIT_LOG_SPILLED = Counter(
+    "audit_log_spilled_events_total",
+    "Audit events saved to the spill file at shutdown, written by the next start",
+)
+
+
+# Function to render all metrics in the Prometheus text exposition format
+def export_metrics():
+    """
+    Render the metrics of this process for a Prometheus scrape.
+
+    Returns:
+        tuple: Payload bytes and the matching content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
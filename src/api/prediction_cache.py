@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.api.feature_cache import image_content_hash
+from src.api.metrics import PREDICTION_CACHE_HITS, PREDICTION_CACHE_MISSES, PREDICTION_CACHE_EVICTIONS
+
+# Supported storage backends of the prediction cache
+PREDICTION_CACHE_BACKENDS = ('memory', 'disk', 'none')
+
+
+# Function to normalize the product text the same way for every lookup
+def normalize_text(text: str, lowercase: bool = True) -> str:
+    """
+    Collapse whitespace (and case, when the vectorizer ignores it) so that edits that
+    do not change the TF-IDF features of a listing do not change its cache key.
+    """
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.lower() if lowercase else text
+
+
+# Function to fingerprint model and vectorizer files
+def file_fingerprint(paths) -> str:
+    """
+    Hash the path, size and modification time of every file, so that writing a new
+    model (or vectorizer) changes the fingerprint. Missing files are part of the hash too.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        except FileNotFoundError:
+            digest.update(f"{os.path.abspath(path)}:missing;".encode())
+    return digest.hexdigest()[:16]
+
+
+class MemoryPredictionBackend:
+    """In-process LRU store of prediction results with per-entry expiry."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: dict, now: float, expires_at: float, version: str):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                PREDICTION_CACHE_EVICTIONS.inc()
+
+    # Function to drop every entry computed by another model version
+    def invalidate(self, version: str):
+        # Keys start with the version, so every entry of an older version is unreachable anyway
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqlitePredictionBackend:
+    """
+    On-disk store of prediction results in a local SQLite file.
+
+    The file survives restarts and is shared by all uvicorn workers of the host. Entries
+    carry their expiry time and last access time; the least recently used ones are
+    deleted once the table holds more than `max_entries` rows.
+    """
+
+    def __init__(self, path: str, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS ix_predictions_accessed_at ON predictions (accessed_at)")
+
+    def get(self, key: str, now: float):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._connection.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE predictions SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict, now: float, expires_at: float, version: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO predictions (key, version, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, version, json.dumps(value), expires_at, now),
+            )
+            excess = self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+                PREDICTION_CACHE_EVICTIONS.inc(excess)
+
+    # Function to drop every entry computed by another model version
+    def invalidate(self, version: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM predictions WHERE version != ?", (version,))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM predictions")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+
+class PredictionCache:
+    """
+    Cache of /predict results keyed on the product content and the served model version.
+
+    The key combines the normalized designation and description, the hash of the image
+    bytes and the version of the models in memory (`ModelRegistry.version`, recorded when
+    they were loaded). When it changes (e.g. the model written by /train was loaded) the
+    entries of the previous version are invalidated. Files written but not loaded yet do
+    not change it, so the previous model's results are never cached under their version.
+    """
+
+    def __init__(self, backend, version, ttl_seconds=86400, lowercase=True, clock=time.time):
+        """
+        Args:
+            backend: MemoryPredictionBackend or SqlitePredictionBackend storing the results.
+            version (callable): Returns the version of the served models, e.g. `lambda: registry.version`.
+            ttl_seconds (float): Time after which a cached result expires.
+            lowercase (bool): Whether the text is case-folded (match the vectorizer's `lowercase`).
+            clock (callable): Source of the current time, in seconds.
+        """
+        self.backend = backend
+        self.get_version = version
+        self.ttl_seconds = ttl_seconds
+        self.lowercase = lowercase
+        self.clock = clock
+        self._version = version()
+        self._lock = threading.Lock()
+
+    # Function to get the version of the models currently served
+    @property
+    def version(self) -> str:
+        version = self.get_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    logging.info(f"Served models changed (version {self._version} -> {version}), invalidating cached predictions")
+                    self._version = version
+                    self.backend.invalidate(version)
+        return version
+
+    # Function to build the cache key of one product
+    def key(self, designation: str, description: str, image_data: bytes) -> str:
+        text = normalize_text(designation + ' ' + description, self.lowercase)
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{self.version}:{text_hash}:{image_content_hash(image_data)}"
+
+    # Function to look up the cached result of a product
+    def get(self, key: str):
+        """
+        Look up a cached prediction.
+
+        Args:
+            key (str): Key returned by `key()`.
+
+        Returns:
+            dict: The cached result, or None on a miss or an expired entry.
+        """
+        value = self.backend.get(key, self.clock())
+        if value is None:
+            PREDICTION_CACHE_MISSES.inc()
+            return None
+        PREDICTION_CACHE_HITS.inc()
+        return value
+
+    # Function to store the result of a product
+    def put(self, key: str, value: dict):
+        # Results computed while a new model was loaded belong to a version nobody looks up
+        version = self.version
+        if not key.startswith(version + ':'):
+            return
+        now = self.clock()
+        self.backend.put(key, value, now, now + self.ttl_seconds, version)
+
+    def clear(self):
+        self.backend.clear()
+
+
+# Function to build the prediction cache configured for this process
+def create_prediction_cache(backend: str, version, max_entries=100000, ttl_seconds=86400, path=None, lowercase=True):
+    """
+    Build a prediction cache with the requested backend.
+
+    Args:
+        backend (str): 'memory', 'disk' (SQLite file at `path`) or 'none'.
+        version (callable): Returns the version of the served models, versioning the entries.
+        max_entries (int): Maximum number of cached results.
+        ttl_seconds (float): Time after which a cached result expires.
+        path (str): SQLite file of the 'disk' backend.
+        lowercase (bool): Whether the text is case-folded.
+
+    Returns:
+        PredictionCache: The cache, or None when caching is disabled.
+    """
+    if backend not in PREDICTION_CACHE_BACKENDS:
+        raise ValueError(f"Unknown prediction cache backend '{backend}', expected one of {PREDICTION_CACHE_BACKENDS}")
+    if backend == 'none':
+        return None
+    if backend == 'disk':
+        store = SqlitePredictionBackend(path, max_entries=max_entries)
+    else:
+        store = MemoryPredictionBackend(max_entries=max_entries)
+    return PredictionCache(store, version, ttl_seconds=ttl_seconds, lowercase=lowercase)
@@ -5,11 +5,16 @@ from tensorflow.keras.layers import Dense, Dropout, BatchNormalization, Input, c
 from tensorflow.keras.models import Model
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.optimizers import Nadam
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import f1_score
 import logging
 import gc
 
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.training_data import load_dataset, load_split_indices
+from src.api.text_reduction import fit_text_projection
+from src.api.hashing_vectorizer import text_vectorizer_path
+from src.api.config import EXPORT_TFLITE, TFLITE_QUANTIZATION, TEXT_REDUCTION_DIM, TEXT_REDUCTION_METHOD, TEXT_FEATURIZER
+
 # Logging setup
 log_file_path = "logs/retrain_model.log"
 os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
@@ -22,6 +27,10 @@ logging.basicConfig(
     handlers=[file_handler, console_handler]
 )
 
+# Output paths of the trained model and its optimized inference artifact
+MODEL_PATH = 'src/models/retrained_balanced_model.keras'
+TFLITE_MODEL_PATH = 'src/models/retrained_balanced_model.tflite'
+
 # Set seed for reproducibility
 seed = 42
 np.random.seed(seed)
@@ -33,10 +42,16 @@ def free_memory():
     logging.debug("Memory freed using garbage collector.")
 
 # Function to build the model
-def build_model(input_shape_text, input_shape_image, num_classes):
+def build_model(input_shape_text, input_shape_image, num_classes, sparse_text=True, text_projection=None):
     logging.info("Building model architecture...")
-    text_input = Input(shape=(input_shape_text,), name='text_input')
-    x1 = Dense(512, activation='relu')(text_input)
+    # The TF-IDF input is sparse: the first Dense layer then runs a sparse-dense matmul
+    text_input = Input(shape=(input_shape_text,), sparse=sparse_text, name='text_input')
+    x1 = text_input
+    if text_projection is not None:
+        # Frozen projection of the vocabulary (see text_reduction.py), so the trained layers see a few dense dimensions
+        projection_layer = Dense(text_projection.shape[1], use_bias=False, trainable=False, name='text_projection')
+        x1 = projection_layer(x1)
+    x1 = Dense(512, activation='relu')(x1)
     x1 = BatchNormalization()(x1)
     x1 = Dropout(0.5)(x1)
     x1 = Dense(256, activation='relu')(x1)
@@ -58,16 +73,22 @@ def build_model(input_shape_text, input_shape_image, num_classes):
     output = Dense(num_classes, activation='softmax')(x)
 
     model = Model(inputs=[text_input, image_input], outputs=output)
+    if text_projection is not None:
+        projection_layer.set_weights([text_projection])
     model.compile(optimizer=Nadam(learning_rate=0.0001), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
     logging.info("Model built successfully.")
     return model
 
-# Function to evaluate the model on test data
-def evaluate_model_on_test_data(model, X_test_text, test_image_features, y_test):
+# Function to evaluate the model on test data (optionally only the rows given by `indices`)
+def evaluate_model_on_test_data(model, X_test_text, test_image_features, y_test, indices=None):
     try:
         logging.info("Evaluating model on test data...")
-        predictions = model.predict([X_test_text, test_image_features])
+        predictions = model.predict(
+            SparseFeatureDataset(X_test_text, test_image_features, batch_size=256, indices=indices), verbose=0
+        )
         predicted_classes = np.argmax(predictions, axis=1)
+        if indices is not None:
+            y_test = np.asarray(y_test[indices])
 
         # Calculate F1-Score
         f1 = f1_score(y_test, predicted_classes, average='weighted')
@@ -85,50 +106,82 @@ def evaluate_model_on_test_data(model, X_test_text, test_image_features, y_test)
         logging.error(f"Error during F1-score evaluation: {e}")
         return None
 
-# Main function for retraining the model
-def retrain_model():
-    try:
-        logging.info("Loading balanced data...")
-        X_train_text = np.load('src/data/X_train_tfidf_balanced.npy')
-        train_image_features = np.load('src/data/train_image_features_balanced.npy')
-        y_train = np.load('src/data/Y_train_balanced.npy')
-
-        logging.info("Splitting 10% of the data for the test set...")
-        X_train_text, X_test_text, y_train, y_test = train_test_split(X_train_text, y_train, test_size=0.10, random_state=42)
-        train_image_features, test_image_features = train_test_split(train_image_features, test_size=0.10, random_state=42)
-
-        free_memory()
-
-        logging.info("Splitting 80% of the remaining training data into train and validation sets...")
-        X_train_text, X_val_text, y_train, y_val = train_test_split(X_train_text, y_train, test_size=0.20, random_state=42)
-        train_image_features, val_image_features = train_test_split(train_image_features, test_size=0.20, random_state=42)
-
-        logging.debug(f"Training set size: {len(X_train_text)}, Validation set size: {len(X_val_text)}")
+# Function to export the optimized TFLite artifact and check its accuracy against the Keras model
+def export_optimized_model(model, X_test_text, test_image_features, y_test, indices=None):
+    # Imported here so that training does not load the TFLite converter unless it is needed
+    from src.api.tflite_model import export_tflite, evaluate_export_parity
 
-        logging.info("Building model...")
-        model = build_model(X_train_text.shape[1], train_image_features.shape[1], len(np.unique(y_train)))
-
-        early_stopping = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
-        reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-6)
-
-        free_memory()
-
-        logging.info("Starting model training on balanced data...")
-        history = model.fit(
-            [X_train_text, train_image_features], y_train,
-            epochs=30, batch_size=64,
-            validation_data=([X_val_text, val_image_features], y_val),
-            callbacks=[early_stopping, reduce_lr]
+    try:
+        logging.info(f"Exporting TFLite artifact ({TFLITE_QUANTIZATION})...")
+        export_tflite(model, TFLITE_MODEL_PATH, quantization=TFLITE_QUANTIZATION)
+        parity = evaluate_export_parity(
+            model, TFLITE_MODEL_PATH, X_test_text, test_image_features, y_test, indices=indices
         )
+        logging.info(f"TFLite parity report: {parity}")
+        return parity
+    except Exception as e:
+        logging.error(f"Error during TFLite export: {e}")
+        return None
 
-        logging.info("Saving model...")
-        model.save('src/models/retrained_balanced_model.keras')
-        logging.info("Model saved successfully.")
-
-        # Evaluate the model on the test set
-        f1_test = evaluate_model_on_test_data(model, X_test_text, test_image_features, y_test)
-        logging.info(f"F1-score on test set: {f1_test}")
+# Function to retrain the model, raising on failure (used by the background training jobs)
+def run_retraining(callbacks=None, text_featurizer=TEXT_FEATURIZER):
+    """
+    Retrain the model on the balanced dataset, save it and evaluate it on the test split.
+
+    Args:
+        callbacks (list): Extra Keras callbacks for the fit (e.g. progress reporting of a training job).
+        text_featurizer (str): 'tfidf' or 'hashing'; the API must serve with the same featurizer.
+
+    Returns:
+        dict: F1-score on the test set, number of epochs run, path of the saved model and its text vectorizer.
+    """
+    vectorizer_path = text_vectorizer_path(text_featurizer)
+    logging.info(f"Opening the balanced dataset package (memory-mapped), text featurizer: {text_featurizer}...")
+    X_text, image_features, labels, manifest = load_dataset(text_featurizer=text_featurizer)
+
+    # Row indices of the 10% test split and the 20% validation split of the rest, computed once per dataset
+    splits = load_split_indices(X_text.shape[0], fingerprint=manifest['fingerprint'])
+    logging.debug(f"Training set size: {len(splits['train'])}, Validation set size: {len(splits['val'])}, "
+                  f"Test set size: {len(splits['test'])}")
+
+    # Optional projection of the TF-IDF vocabulary, fitted on the training split only
+    text_projection = None
+    if TEXT_REDUCTION_DIM:
+        text_projection = fit_text_projection(X_text, TEXT_REDUCTION_DIM, TEXT_REDUCTION_METHOD, indices=splits['train'])
+
+    logging.info("Building model...")
+    model = build_model(X_text.shape[1], image_features.shape[1], manifest['num_classes'], text_projection=text_projection)
+
+    early_stopping = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+    reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-6)
+
+    free_memory()
+
+    logging.info("Starting model training on balanced data...")
+    # Batches are gathered from the memory-mapped arrays, so memory scales with the batch size
+    history = model.fit(
+        SparseFeatureDataset(X_text, image_features, labels, batch_size=64, shuffle=True, indices=splits['train']),
+        epochs=30,
+        validation_data=SparseFeatureDataset(X_text, image_features, labels, batch_size=64, indices=splits['val']),
+        callbacks=[early_stopping, reduce_lr] + list(callbacks or [])
+    )
+
+    logging.info("Saving model...")
+    model.save(MODEL_PATH)
+    logging.info("Model saved successfully.")
+
+    if EXPORT_TFLITE:
+        export_optimized_model(model, X_text, image_features, labels, indices=splits['test'])
+
+    # Evaluate the model on the test set
+    f1_test = evaluate_model_on_test_data(model, X_text, image_features, labels, indices=splits['test'])
+    logging.info(f"F1-score on test set: {f1_test}")
+    return {'f1_test': f1_test, 'epochs': len(history.epoch), 'model_path': MODEL_PATH, 'vectorizer_path': vectorizer_path}
 
+# Main function for retraining the model
+def retrain_model():
+    try:
+        return run_retraining()
     except Exception as e:
         logging.error(f"An error occurred during model retraining: {e}")
 
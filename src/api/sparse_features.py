@@ -0,0 +1,115 @@
+import math
+import os
+import numpy as np
+import scipy.sparse as sp
+import tensorflow as tf
+from tensorflow.keras.utils import PyDataset
+
+
+# Function to vectorize texts into a float32 CSR matrix (never densified)
+def transform_text(vectorizer, texts):
+    """
+    Vectorize texts with the TF-IDF vectorizer and keep the result sparse.
+
+    Args:
+        vectorizer: Fitted TF-IDF vectorizer.
+        texts (list): Texts to vectorize.
+
+    Returns:
+        sp.csr_matrix: Matrix of shape (len(texts), vocabulary size) with float32 values.
+    """
+    if len(texts) == 0:
+        # TF-IDF refuses an empty batch: build the empty matrix with the width of one vectorized text
+        return sp.csr_matrix((0, vectorizer.transform([""]).shape[1]), dtype=np.float32)
+    return vectorizer.transform(texts).astype(np.float32).tocsr()
+
+
+# Function to convert a scipy sparse matrix into a tf.SparseTensor accepted by the model
+def to_sparse_tensor(matrix):
+    """
+    Convert a scipy sparse matrix into a canonically ordered tf.SparseTensor.
+
+    Args:
+        matrix: Any scipy sparse matrix.
+
+    Returns:
+        tf.SparseTensor: Sparse float32 tensor with the same shape and values.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    matrix.sort_indices()
+    rows = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr))
+    indices = np.stack([rows, matrix.indices.astype(np.int64)], axis=1)
+    return tf.SparseTensor(indices=indices, values=matrix.data, dense_shape=matrix.shape)
+
+
+# Function to save TF-IDF features as a CSR .npz file
+def save_text_features(path: str, matrix):
+    sp.save_npz(path, sp.csr_matrix(matrix, dtype=np.float32))
+
+
+# Function to load TF-IDF features stored as CSR .npz (falls back to a legacy dense .npy file)
+def load_text_features(path: str):
+    """
+    Load TF-IDF features as a float32 CSR matrix.
+
+    Args:
+        path (str): Path of the .npz file. When it does not exist yet, the legacy dense
+            .npy file with the same name is converted once and saved as .npz.
+
+    Returns:
+        sp.csr_matrix: The TF-IDF features.
+    """
+    if os.path.exists(path):
+        return sp.load_npz(path).astype(np.float32).tocsr()
+
+    legacy_path = os.path.splitext(path)[0] + '.npy'
+    matrix = sp.csr_matrix(np.load(legacy_path, mmap_mode='r'), dtype=np.float32)
+    save_text_features(path, matrix)
+    return matrix
+
+
+class SparseFeatureDataset(PyDataset):
+    """
+    Keras dataset yielding (sparse TF-IDF batch, image feature batch) inputs.
+
+    Only the rows of the current batch are converted to a tf.SparseTensor, so the
+    dense vocabulary-wide matrix is never materialized. With `indices`, the dataset
+    covers only those rows of the arrays (e.g. one split of a memory-mapped dataset)
+    and gathers each batch directly from them, without copying the split first.
+    """
+
+    def __init__(self, text_features, image_features, labels=None, batch_size=64, shuffle=False, seed=42,
+                 indices=None, **kwargs):
+        super().__init__(**kwargs)
+        self.text_features = sp.csr_matrix(text_features, dtype=np.float32)
+        self.image_features = image_features
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        if indices is None:
+            self._order = np.arange(self.text_features.shape[0])
+        else:
+            self._order = np.array(indices, dtype=np.int64)
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+    def __len__(self):
+        return math.ceil(len(self._order) / self.batch_size)
+
+    def __getitem__(self, index):
+        rows = self._order[index * self.batch_size:(index + 1) * self.batch_size]
+        if self.shuffle:
+            # Order inside a training batch does not matter; ascending rows read memory-mapped arrays sequentially
+            rows = np.sort(rows)
+        inputs = (
+            to_sparse_tensor(self.text_features[rows]),
+            np.asarray(self.image_features[rows], dtype=np.float32),
+        )
+        if self.labels is None:
+            return inputs,
+        return inputs, np.asarray(self.labels[rows])
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._order)
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.api.metrics import STARTUP_COMPONENT_SECONDS
+
+# Warmup states of a serving component
+COMPONENT_PENDING = 'pending'
+COMPONENT_LOADING = 'loading'
+COMPONENT_READY = 'ready'
+COMPONENT_FAILED = 'failed'
+
+# Function to wait for the database, retrying with exponential backoff
+async def wait_for_database(is_available, initial_delay=0.5, max_delay=30.0, max_wait=None):
+    """
+    Poll the database until it accepts connections, doubling the delay between attempts.
+
+    Args:
+        is_available (callable): Blocking check returning True once the database is reachable.
+        initial_delay (float): Seconds before the second attempt.
+        max_delay (float): Upper bound of the delay between two attempts.
+        max_wait (float): Give up after this many seconds (None waits forever).
+
+    Returns:
+        bool: True once the database is available, False if `max_wait` elapsed first.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    delay = initial_delay
+    attempt = 1
+    while not await loop.run_in_executor(None, is_available):
+        if max_wait is not None and time.monotonic() - start + delay > max_wait:
+            logging.error(f"Database still unavailable after {attempt} attempts, giving up")
+            return False
+        logging.info(f"Waiting for the database to become available (attempt {attempt}, retrying in {delay:.1f}s)...")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        attempt += 1
+    return True
+
+
+class ModelRegistry:
+    """
+    Serving state of the API: vectorizer, classification model and image backbone.
+
+    Nothing heavy is imported or loaded when the registry is created. `warmup()` loads
+    the components concurrently (TensorFlow, NumPy and joblib release the GIL for most
+    of the work) and records the state and load time of each one for the health checks.
+
+    Each load records the fingerprint of the files it read, so `version` identifies the
+    models in memory: a training job writing new files does not change it until they are
+    actually loaded.
+    """
+
+    def __init__(self, vectorizer_path, model_path, tflite_model_path, serving_backend='keras',
+                 backbone_weights='imagenet', tflite_num_threads=None):
+        """
+        Args:
+            vectorizer_path (str): Path of the text vectorizer (TF-IDF joblib or hashing .json).
+            model_path (str): Path of the Keras classification model.
+            tflite_model_path (str): Path of the exported TFLite artifact.
+            serving_backend (str): 'keras' or 'tflite'.
+            backbone_weights (str): Weights of the shared EfficientNetB0 ('imagenet' or None).
+            tflite_num_threads (int): Threads per TFLite interpreter.
+        """
+        self.vectorizer_path = vectorizer_path
+        self.model_path = model_path
+        self.tflite_model_path = tflite_model_path
+        self.serving_backend = serving_backend
+        self.backbone_weights = backbone_weights
+        self.tflite_num_threads = tflite_num_threads
+
+        self.vectorizer = None
+        self.vectorizer_version = None
+        self.model = None
+        self.model_version = None
+        self.image_extractor = None  # None means the shared Keras backbone
+        self.backbone_version = None
+        self.served_model_paths = []
+        self.database_ready = False
+        self.started_at = time.time()
+
+        self._lock = threading.Lock()
+        self._components = {
+            name: {'status': COMPONENT_PENDING, 'seconds': None, 'error': None} for name in self.component_names
+        }
+
+    @property
+    def component_names(self):
+        # The TFLite artifact embeds its own backbone
+        if self.serving_backend == 'tflite':
+            return ('vectorizer', 'model')
+        return ('vectorizer', 'model', 'backbone')
+
+    # Function to load the text vectorizer (the hashing one only memory-maps its IDF array)
+    def load_vectorizer(self):
+        from src.api.hashing_vectorizer import load_text_vectorizer
+
+        paths = [self.vectorizer_path]
+        version = self._fingerprint(paths)
+        self.vectorizer = load_text_vectorizer(self.vectorizer_path)
+        self.vectorizer_version = self._loaded_version(paths, version)
+
+    # Function to fingerprint the files a component is about to be loaded from
+    def _fingerprint(self, paths) -> str:
+        from src.api.prediction_cache import file_fingerprint
+
+        return file_fingerprint(paths)
+
+    # Function to get the version of a component once loaded from files fingerprinted beforehand
+    def _loaded_version(self, paths, version) -> str:
+        # A file rewritten while it was read matches neither fingerprint: give it a version of its own
+        if self._fingerprint(paths) != version:
+            return uuid.uuid4().hex[:16]
+        return version
+
+    # Function to get the files a classification model is loaded from with the serving backend
+    def _servable_paths(self, model_path, tflite_model_path):
+        return [tflite_model_path] if self.serving_backend == 'tflite' else [model_path]
+
+    # Function to load a classification model with the serving backend
+    def _load_servable(self, model_path, tflite_model_path):
+        """
+        Returns:
+            tuple: The model, its image extractor (None for the shared Keras backbone), the
+            backbone version and the files it was loaded from.
+        """
+        paths = self._servable_paths(model_path, tflite_model_path)
+        if self.serving_backend == 'tflite':
+            from src.api.tflite_model import TFLiteModel
+
+            # Optimized artifact exported after retraining: backbone and head both run in TFLite
+            model = TFLiteModel(tflite_model_path, num_threads=self.tflite_num_threads)
+            return model, model.extract_image_features, model.backbone_version, paths
+        from tensorflow.keras.models import load_model
+        from src.api.image_features import BACKBONE_VERSION
+
+        return load_model(model_path), None, BACKBONE_VERSION, paths
+
+    # Function to load (or reload, e.g. after /train) the classification model of the serving backend
+    def load_model(self):
+        paths = self._servable_paths(self.model_path, self.tflite_model_path)
+        version = self._fingerprint(paths)
+        model, self.image_extractor, self.backbone_version, self.served_model_paths = self._load_servable(
+            self.model_path, self.tflite_model_path
+        )
+        # Swapped last, so requests never see a half-loaded model. In between, the version is one of
+        # its own, so that neither model is paired with the other's version (see `versioned_model`)
+        self.model_version = uuid.uuid4().hex[:16]
+        self.model = model
+        self.model_version = self._loaded_version(paths, version)
+
+    # Function to get the classification model together with the version it was loaded with
+    def versioned_model(self):
+        # A version unchanged around the read of the model is the one of that model
+        while True:
+            version = self.model_version
+            model = self.model
+            if self.model_version == version:
+                return model, version
+
+    # Function to get the version of the served model and vectorizer, as they were when loaded
+    @property
+    def version(self) -> str:
+        loaded = f"{self.vectorizer_version}:{self.model_version}"
+        return hashlib.sha256(loaded.encode()).hexdigest()[:16]
+
+    # Function to build the shared EfficientNetB0 extractor and trace it on a dummy batch
+    def load_backbone(self):
+        from src.api.image_features import load_feature_extractor, warmup_feature_extractor
+
+        load_feature_extractor(self.backbone_weights)
+        warmup_feature_extractor()
+
+    def _load_component(self, name, loader):
+        self._set_component(name, status=COMPONENT_LOADING)
+        start = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            self._set_component(name, status=COMPONENT_FAILED, error=str(e))
+            logging.error(f"Warmup of the {name} failed: {e}")
+            raise
+        seconds = time.perf_counter() - start
+        self._set_component(name, status=COMPONENT_READY, seconds=round(seconds, 3))
+        STARTUP_COMPONENT_SECONDS.labels(component=name).set(seconds)
+        logging.info(f"Warmup of the {name} done in {seconds:.2f}s")
+
+    def _set_component(self, name, **values):
+        with self._lock:
+            self._components[name].update(values)
+
+    # Function to load every serving component concurrently
+    def warmup(self, max_workers=None):
+        """
+        Load the vectorizer, the model and the backbone in parallel threads.
+
+        Args:
+            max_workers (int): Number of loading threads (defaults to one per component, at most one per CPU).
+
+        Returns:
+            bool: True if every component loaded, False if at least one failed.
+        """
+        loaders = {'vectorizer': self.load_vectorizer, 'model': self.load_model, 'backbone': self.load_backbone}
+        names = self.component_names
+        # Loading threads only overlap usefully on separate cores
+        max_workers = max_workers or min(len(names), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup") as pool:
+            futures = [pool.submit(self._load_component, name, loaders[name]) for name in names]
+        return all(future.exception() is None for future in futures)
+
+    @property
+    def models_ready(self) -> bool:
+        with self._lock:
+            return all(component['status'] == COMPONENT_READY for component in self._components.values())
+
+    @property
+    def ready(self) -> bool:
+        return self.models_ready and self.database_ready
+
+    # Function to report the warmup progress for the health checks
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(component) for name, component in self._components.items()}
+        return {
+            'ready': self.ready,
+            'database': COMPONENT_READY if self.database_ready else COMPONENT_PENDING,
+            'components': components,
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+        }
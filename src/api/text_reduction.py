@@ -0,0 +1,51 @@
+import logging
+import numpy as np
+
+# Supported projections of the TF-IDF features
+TEXT_REDUCTION_METHODS = ('svd', 'hashing')
+
+
+# Function to fit the linear projection of the TF-IDF vocabulary onto a few dense dimensions
+def fit_text_projection(text_features, dim, method='svd', indices=None, max_rows=50000, seed=42):
+    """
+    Fit a (vocabulary size, dim) projection of the TF-IDF features.
+
+    'svd' keeps the `dim` leading components of a truncated SVD of the training rows (at most
+    `max_rows` of them, sampled). 'hashing' needs no fitting: every vocabulary column is added,
+    with a random sign, to one of `dim` buckets. The projection becomes the frozen first layer
+    of the text branch (see `build_model`), so it is saved with the model and applied by every
+    consumer of the model (serving, TFLite export, evaluation, fine-tuning).
+
+    Args:
+        text_features (scipy.sparse.csr_matrix): TF-IDF features of the dataset.
+        dim (int): Number of dimensions kept, smaller than the vocabulary.
+        method (str): 'svd' or 'hashing'.
+        indices (np.ndarray): Rows to fit on (e.g. the training split; all rows when None).
+        max_rows (int): Maximum number of rows used by the SVD.
+        seed (int): Random state.
+
+    Returns:
+        np.ndarray: float32 projection matrix.
+    """
+    vocabulary_size = text_features.shape[1]
+    if method not in TEXT_REDUCTION_METHODS:
+        raise ValueError(f"Unknown text reduction '{method}', expected one of {TEXT_REDUCTION_METHODS}")
+    if not 0 < dim < vocabulary_size:
+        raise ValueError(f"The reduced dimension must be between 1 and {vocabulary_size - 1}, got {dim}")
+    rng = np.random.default_rng(seed)
+
+    if method == 'hashing':
+        projection = np.zeros((vocabulary_size, dim), dtype=np.float32)
+        projection[np.arange(vocabulary_size), rng.integers(0, dim, vocabulary_size)] = rng.choice([-1.0, 1.0], vocabulary_size)
+        return projection
+
+    from sklearn.decomposition import TruncatedSVD
+
+    rows = np.arange(text_features.shape[0]) if indices is None else np.asarray(indices)
+    if len(rows) > max_rows:
+        rows = np.sort(rng.choice(rows, max_rows, replace=False))
+    logging.info(f"Fitting a {dim}-component truncated SVD of the TF-IDF features on {len(rows)} rows...")
+    svd = TruncatedSVD(n_components=dim, algorithm='randomized', random_state=seed)
+    svd.fit(text_features[rows])
+    logging.info(f"Explained variance of the text projection: {svd.explained_variance_ratio_.sum():.3f}")
+    return svd.components_.T.astype(np.float32)
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+import numpy as np
+import scipy.sparse as sp
+import tensorflow as tf
+from tensorflow import keras
+from sklearn.metrics import f1_score
+
+from src.api.image_features import BACKBONE_VERSION, load_feature_extractor
+
+# Supported weight quantization modes of the exported artifact
+TFLITE_QUANTIZATIONS = ('dynamic', 'float16', 'none')
+
+
+# Function to get the path of the metadata file written next to an artifact
+def metadata_path(tflite_path: str) -> str:
+    return tflite_path + '.json'
+
+
+# Function to get the version of the backbone embedded in an artifact, from its metadata file
+def artifact_backbone_version(tflite_path: str) -> str:
+    if os.path.exists(metadata_path(tflite_path)):
+        with open(metadata_path(tflite_path)) as f:
+            return json.load(f).get('backbone_version', f"{BACKBONE_VERSION}-tflite")
+    return f"{BACKBONE_VERSION}-tflite"
+
+
+# Function to export the fused backbone + classification head as a TFLite artifact
+def export_tflite(model, tflite_path: str, quantization='dynamic', feature_extractor=None, image_size=(224, 224)):
+    """
+    Export the classification head and the image backbone as one TFLite artifact.
+
+    The artifact has three signatures: 'classify' (text + images -> probabilities),
+    'backbone' (images -> pooled features) and 'head' (text + pooled features ->
+    probabilities). Its input signature is recorded in a JSON file next to it.
+
+    Args:
+        model: Trained Keras classification model.
+        tflite_path (str): Destination of the .tflite file.
+        quantization (str): 'dynamic' (int8 weights), 'float16' or 'none'.
+        feature_extractor: Keras image feature extractor (defaults to the shared one).
+        image_size (tuple): Height and width of the images of the 'classify' and 'backbone' signatures.
+
+    Returns:
+        dict: The metadata written next to the artifact.
+    """
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {TFLITE_QUANTIZATIONS}")
+    feature_extractor = feature_extractor or load_feature_extractor()
+
+    text_dim = int(model.inputs[0].shape[1])
+    image_dim = int(model.inputs[1].shape[1])
+    text_spec = tf.TensorSpec([None, text_dim], tf.float32, name='text_input')
+    features_spec = tf.TensorSpec([None, image_dim], tf.float32, name='image_features')
+    images_spec = tf.TensorSpec([None, image_size[0], image_size[1], 3], tf.float32, name='images')
+
+    # Keras 3 models are converted through an ExportArchive SavedModel
+    archive = keras.export.ExportArchive()
+    archive.track(model)
+    archive.track(feature_extractor)
+    archive.add_endpoint(
+        name='classify',
+        fn=lambda text_input, images: {
+            'probabilities': model([text_input, feature_extractor(images, training=False)], training=False)
+        },
+        input_signature=[text_spec, images_spec],
+    )
+    archive.add_endpoint(
+        name='backbone',
+        fn=lambda images: {'image_features': feature_extractor(images, training=False)},
+        input_signature=[images_spec],
+    )
+    archive.add_endpoint(
+        name='head',
+        fn=lambda text_input, image_features: {'probabilities': model([text_input, image_features], training=False)},
+        input_signature=[text_spec, features_spec],
+    )
+
+    saved_model_dir = tflite_path + '.savedmodel'
+    archive.write_out(saved_model_dir)
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir, signature_keys=['classify', 'backbone', 'head'])
+    if quantization in ('dynamic', 'float16'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    tflite_content = converter.convert()
+    tf.io.gfile.rmtree(saved_model_dir)
+
+    with open(tflite_path, 'wb') as f:
+        f.write(tflite_content)
+
+    interpreter = tf.lite.Interpreter(model_content=tflite_content)
+    signatures = {}
+    for name in interpreter.get_signature_list():
+        runner = interpreter.get_signature_runner(name)
+        signatures[name] = {
+            'inputs': {key: _describe_tensor(value) for key, value in runner.get_input_details().items()},
+            'outputs': {key: _describe_tensor(value) for key, value in runner.get_output_details().items()},
+        }
+
+    metadata = {
+        'quantization': quantization,
+        'backbone_version': f"{BACKBONE_VERSION}-tflite-{quantization}",
+        'text_dim': text_dim,
+        'image_feature_dim': image_dim,
+        'image_size': list(image_size),
+        'signatures': signatures,
+        'size_bytes': len(tflite_content),
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    _write_metadata(tflite_path, metadata)
+    logging.info(f"TFLite artifact ({quantization}) exported to {tflite_path}: {len(tflite_content)} bytes")
+    return metadata
+
+
+def _describe_tensor(details):
+    return {'shape': [int(dim) for dim in details['shape_signature']], 'dtype': np.dtype(details['dtype']).name}
+
+
+def _write_metadata(tflite_path: str, metadata: dict):
+    with open(metadata_path(tflite_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+# Function to compare the exported artifact with the Keras model on a held-out split
+def evaluate_export_parity(model, tflite_path: str, X_text, image_features, y_true, batch_size=256, indices=None):
+    """
+    Compare the F1-score of the TFLite artifact with the Keras model and store the report.
+
+    Args:
+        model: Keras classification model the artifact was exported from.
+        tflite_path (str): Path of the exported artifact.
+        X_text: Sparse TF-IDF features of the held-out split.
+        image_features: Pooled image features of the held-out split.
+        y_true: True labels of the held-out split.
+        batch_size (int): Number of rows per forward pass.
+        indices: Rows of the arrays forming the held-out split (None uses every row).
+
+    Returns:
+        dict: F1-scores, their delta, prediction agreement and max probability difference.
+    """
+    tflite_model = TFLiteModel(tflite_path)
+    keras_predictions = []
+    tflite_predictions = []
+    X_text = sp.csr_matrix(X_text, dtype=np.float32)
+    indices = np.arange(X_text.shape[0]) if indices is None else np.asarray(indices)
+    y_true = np.asarray(y_true[indices])
+    for start in range(0, len(indices), batch_size):
+        rows = indices[start:start + batch_size]
+        text_batch = X_text[rows].toarray()
+        image_batch = np.asarray(image_features[rows], dtype=np.float32)
+        keras_predictions.append(np.asarray(model.predict_on_batch([text_batch, image_batch])))
+        tflite_predictions.append(tflite_model.predict_on_batch([text_batch, image_batch]))
+    keras_predictions = np.concatenate(keras_predictions)
+    tflite_predictions = np.concatenate(tflite_predictions)
+
+    f1_keras = f1_score(y_true, np.argmax(keras_predictions, axis=1), average='weighted')
+    f1_tflite = f1_score(y_true, np.argmax(tflite_predictions, axis=1), average='weighted')
+    report = {
+        'samples': int(len(y_true)),
+        'f1_keras': float(f1_keras),
+        'f1_tflite': float(f1_tflite),
+        'f1_delta': float(f1_tflite - f1_keras),
+        'prediction_agreement': float(np.mean(np.argmax(keras_predictions, axis=1) == np.argmax(tflite_predictions, axis=1))),
+        'max_probability_difference': float(np.max(np.abs(keras_predictions - tflite_predictions))),
+    }
+
+    metadata = dict(tflite_model.metadata)
+    metadata['parity'] = report
+    _write_metadata(tflite_path, metadata)
+    logging.info(f"TFLite parity on {report['samples']} held-out samples: F1 delta {report['f1_delta']:+.5f}")
+    return report
+
+
+class TFLiteModel:
+    """
+    Serving backend running the exported TFLite artifact.
+
+    Exposes `predict_on_batch` and `predict` like a Keras model (using the 'head'
+    signature) and `extract_image_features` like the shared Keras backbone (using the
+    'backbone' signature). Each thread gets its own interpreter over the same model bytes.
+    """
+
+    def __init__(self, tflite_path: str, num_threads=None):
+        with open(tflite_path, 'rb') as f:
+            self._content = f.read()
+        self.num_threads = num_threads
+        self.metadata = {}
+        if os.path.exists(metadata_path(tflite_path)):
+            with open(metadata_path(tflite_path)) as f:
+                self.metadata = json.load(f)
+        self.backbone_version = artifact_backbone_version(tflite_path)
+        self._local = threading.local()
+
+    def _runner(self, name):
+        runners = getattr(self._local, 'runners', None)
+        if runners is None:
+            interpreter = tf.lite.Interpreter(model_content=self._content, num_threads=self.num_threads)
+            runners = {signature: interpreter.get_signature_runner(signature) for signature in interpreter.get_signature_list()}
+            self._local.runners = runners
+        return runners[name]
+
+    def predict_on_batch(self, inputs):
+        text_input, image_features = inputs
+        if isinstance(text_input, tf.SparseTensor):
+            text_input = tf.sparse.to_dense(text_input).numpy()
+        elif sp.issparse(text_input):
+            text_input = text_input.toarray()
+        outputs = self._runner('head')(
+            text_input=np.asarray(text_input, dtype=np.float32),
+            image_features=np.asarray(image_features, dtype=np.float32),
+        )
+        return outputs['probabilities']
+
+    def predict(self, dataset, verbose=0):
+        predictions = [self.predict_on_batch(dataset[index][0]) for index in range(len(dataset))]
+        return np.concatenate(predictions, axis=0)
+
+    def extract_image_features(self, batch, batch_size=32):
+        batch = np.asarray(batch, dtype=np.float32)
+        runner = self._runner('backbone')
+        features = [runner(images=batch[start:start + batch_size])['image_features'] for start in range(0, len(batch), batch_size)]
+        if not features:
+            return np.zeros((0, self.metadata.get('image_feature_dim', 1280)), dtype=np.float32)
+        return np.concatenate(features, axis=0)
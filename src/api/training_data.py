@@ -0,0 +1,152 @@
+import logging
+import os
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from src.api.sparse_features import load_text_features
+from src.api.dataset_package import build_dataset_package, load_dataset_package, read_manifest
+from src.api.config import DATASET_DIR, DATASET_IMAGE_DTYPE, TEXT_FEATURIZER, HASHING_N_FEATURES
+
+# Balanced training dataset and the split of its rows into train, validation and test sets
+TEXT_FEATURES_PATH = 'src/data/X_train_tfidf_balanced.npz'
+IMAGE_FEATURES_PATH = 'src/data/train_image_features_balanced.npy'
+LABELS_PATH = 'src/data/Y_train_balanced.npy'
+SPLIT_INDICES_PATH = 'src/data/split_indices.npz'
+
+# Source arrays of the dataset package
+DATASET_SOURCES = {'text': TEXT_FEATURES_PATH, 'image_features': IMAGE_FEATURES_PATH, 'labels': LABELS_PATH}
+
+
+# Function to open the balanced dataset without reading the dense arrays into memory
+def load_training_data(text_path=TEXT_FEATURES_PATH, image_path=IMAGE_FEATURES_PATH, labels_path=LABELS_PATH):
+    """
+    Open the training dataset for streaming.
+
+    The image features and labels are memory-mapped, so only the rows of the batches
+    being read are paged in. The TF-IDF features are sparse and small enough to load.
+
+    Args:
+        text_path (str): CSR .npz file of the TF-IDF features.
+        image_path (str): .npy file of the pooled image features.
+        labels_path (str): .npy file of the labels.
+
+    Returns:
+        tuple: CSR text features, memory-mapped image features and memory-mapped labels.
+    """
+    text_features = load_text_features(text_path)
+    image_features = np.load(image_path, mmap_mode='r')
+    labels = np.load(labels_path, mmap_mode='r')
+    if not text_features.shape[0] == image_features.shape[0] == labels.shape[0]:
+        raise ValueError(
+            f"Row counts differ: {text_features.shape[0]} texts, {image_features.shape[0]} images, {labels.shape[0]} labels"
+        )
+    return text_features, image_features, labels
+
+
+def _sources_available(sources):
+    text_path = sources['text']
+    return (os.path.exists(text_path) or os.path.exists(os.path.splitext(text_path)[0] + '.npy')) and all(
+        os.path.exists(sources[name]) for name in ('image_features', 'labels')
+    )
+
+
+# Function to open the packaged dataset, updating the package first when its source arrays changed
+def load_dataset(package_dir=DATASET_DIR, sources=None, image_dtype=DATASET_IMAGE_DTYPE, text_featurizer=TEXT_FEATURIZER):
+    """
+    Open the dataset package used by retraining and evaluation.
+
+    When the source arrays are present (e.g. on the machine that prepares the data), the
+    package is brought up to date first: unchanged artifacts are detected from the manifest
+    and reused. Deployments that ship only the package read it directly.
+
+    The package stores the TF-IDF features. With the 'hashing' text featurizer they are
+    moved to the hashed columns of the hashing vectorizer (built on first use).
+
+    Args:
+        package_dir (str): Directory of the package.
+        sources (dict): Source arrays (DATASET_SOURCES by default).
+        image_dtype (str): Storage type of the image features when they have to be packaged.
+        text_featurizer (str): 'tfidf' or 'hashing'.
+
+    Returns:
+        tuple: CSR text features, memory-mapped image features and labels, and the manifest
+        (its 'fingerprint' identifies the content of the dataset).
+    """
+    sources = sources or DATASET_SOURCES
+    if _sources_available(sources):
+        _, rebuilt = build_dataset_package(package_dir, sources, image_dtype=image_dtype)
+        if rebuilt:
+            logging.info(f"Dataset package updated: {', '.join(rebuilt)}")
+    text_features, image_features, labels, manifest = load_dataset_package(package_dir)
+    if text_featurizer == 'hashing':
+        from src.api.hashing_vectorizer import build_hashing_vectorizer
+
+        text_features = build_hashing_vectorizer(n_features=HASHING_N_FEATURES).convert_tfidf_features(text_features)
+    return text_features, image_features, labels, manifest
+
+
+# Function to get the fingerprint of the packaged dataset without opening it
+def dataset_fingerprint(package_dir=DATASET_DIR, sources=None):
+    """
+    Returns:
+        str: Fingerprint from the manifest, or None when there is no package or a source
+        array was modified since it was packaged (the next `load_dataset` will update it).
+    """
+    manifest = read_manifest(package_dir)
+    if manifest is None:
+        return None
+    for name, path in (sources or DATASET_SOURCES).items():
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        if manifest['artifacts'][name]['source']['state'] != {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}:
+            return None
+    return manifest['fingerprint']
+
+
+# Function to split the row indices of the dataset into train, validation and test sets
+def compute_split_indices(n_samples, test_size=0.10, val_size=0.20, seed=42):
+    """
+    Split row indices the way retraining always has: `test_size` of the rows for the test
+    set, then `val_size` of the remaining rows for the validation set.
+
+    Returns:
+        dict: 'train', 'val' and 'test' arrays of row indices.
+    """
+    indices = np.arange(n_samples)
+    train_indices, test_indices = train_test_split(indices, test_size=test_size, random_state=seed)
+    train_indices, val_indices = train_test_split(train_indices, test_size=val_size, random_state=seed)
+    return {'train': train_indices, 'val': val_indices, 'test': test_indices}
+
+
+# Function to load the persisted split of the dataset (computed and saved on first use)
+def load_split_indices(n_samples, path=SPLIT_INDICES_PATH, test_size=0.10, val_size=0.20, seed=42, fingerprint=None):
+    """
+    Load the train/validation/test row indices, computing them once per dataset.
+
+    The split is recomputed when the file is missing or was made for a dataset with
+    another number of rows, another fingerprint or other split parameters.
+
+    Args:
+        n_samples (int): Number of rows of the dataset.
+        path (str): .npz file holding the split.
+        test_size (float): Fraction of the rows held out for the test set.
+        val_size (float): Fraction of the remaining rows held out for validation.
+        seed (int): Random state of the split.
+        fingerprint (str): Fingerprint of the dataset package the split is made for.
+
+    Returns:
+        dict: 'train', 'val' and 'test' arrays of row indices.
+    """
+    parameters = np.array([n_samples, test_size, val_size, seed], dtype=np.float64)
+    fingerprint = np.array(fingerprint or '')
+    if os.path.exists(path):
+        with np.load(path) as stored:
+            if np.array_equal(stored['parameters'], parameters) and str(stored.get('fingerprint', '')) == str(fingerprint):
+                return {name: stored[name] for name in ('train', 'val', 'test')}
+        logging.info("Dataset or split parameters changed, recomputing the split indices")
+
+    splits = compute_split_indices(n_samples, test_size, val_size, seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path, parameters=parameters, fingerprint=fingerprint, **splits)
+    return splits
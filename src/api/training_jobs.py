@@ -0,0 +1,329 @@
+import fcntl
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+# States of a training job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# Training functions started by the job runner, by kind of job. Each takes a `callbacks`
+# list of extra Keras callbacks and returns a JSON-serializable summary
+TRAINING_TARGETS = {
+    'full': 'src.api.retrain_model:run_retraining',
+    'incremental': 'src.api.incremental_training:run_incremental_training',
+    'distill': 'src.api.distillation:run_distillation',
+}
+
+LOCK_FILE = 'training.lock'
+
+
+class TrainingJobRunning(Exception):
+    """Raised when a training job is requested while another one is running."""
+
+    def __init__(self, job_id=None):
+        super().__init__(f"Training job {job_id or ''} is already running".replace('  ', ' '))
+        self.job_id = job_id
+
+
+class TrainingCancelled(Exception):
+    """Raised inside the training process when its job was cancelled."""
+
+
+def _job_dir(jobs_dir: str, job_id: str) -> str:
+    return os.path.join(jobs_dir, job_id)
+
+
+def _status_path(job_dir: str) -> str:
+    return os.path.join(job_dir, 'status.json')
+
+
+def _cancel_path(job_dir: str) -> str:
+    return os.path.join(job_dir, 'cancel')
+
+
+# Function to write a JSON file atomically, so readers never see a partial status
+def _write_json(path: str, data: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# Function to merge fields into the status file of a job
+def update_job_status(job_dir: str, **fields):
+    status = _read_json(_status_path(job_dir)) or {}
+    status.update(fields)
+    _write_json(_status_path(job_dir), status)
+    return status
+
+
+# Function to build the Keras callback reporting the progress of a job (imports TensorFlow)
+def make_progress_callback(job_dir: str, update_interval=1.0):
+    """
+    Build a Keras callback that records per-epoch metrics and an ETA in the job status,
+    and stops the fit by raising TrainingCancelled once the job is cancelled.
+
+    Args:
+        job_dir (str): Directory of the job.
+        update_interval (float): Minimum number of seconds between two in-epoch status updates.
+
+    Returns:
+        keras.callbacks.Callback: The progress callback.
+    """
+    from tensorflow import keras
+
+    class TrainingProgressCallback(keras.callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.started = time.time()
+            self.last_update = 0.0
+            self.epoch = 0
+            self.history = []
+            update_job_status(job_dir, phase='fitting', epoch=0, epochs=self.params.get('epochs'))
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch = epoch
+
+        def on_train_batch_end(self, batch, logs=None):
+            if os.path.exists(_cancel_path(job_dir)):
+                raise TrainingCancelled("Training job cancelled")
+            now = time.time()
+            if now - self.last_update >= update_interval:
+                self.last_update = now
+                steps = self.params.get('steps') or 1
+                self._report(self.epoch + (batch + 1) / steps, batch=batch + 1)
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.history.append({'epoch': epoch + 1, **{key: float(value) for key, value in (logs or {}).items()}})
+            self._report(epoch + 1, batch=None, metrics=self.history)
+
+        def _report(self, epochs_done, **fields):
+            epochs = self.params.get('epochs') or 1
+            elapsed = time.time() - self.started
+            # Upper bound: early stopping may end the fit before the last epoch
+            eta = elapsed * (epochs - epochs_done) / epochs_done if epochs_done > 0 else None
+            update_job_status(
+                job_dir, epoch=int(epochs_done), progress=round(epochs_done / epochs, 4),
+                elapsed_seconds=round(elapsed, 1), eta_seconds=None if eta is None else round(eta, 1), **fields,
+            )
+
+    return TrainingProgressCallback()
+
+
+# Function to keep the training process from starving the API workers of CPU
+def limit_resources(cpu_threads: int, nice: int):
+    """
+    Limit the training process to `cpu_threads` cores and lower its scheduling priority.
+    Must run before TensorFlow is imported for the thread limits to apply.
+    """
+    for variable in ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(cpu_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    if nice:
+        os.nice(nice)
+    if hasattr(os, 'sched_setaffinity'):
+        # Pin to the last cores, leaving the first ones to the API workers
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, cpus[-cpu_threads:])
+
+
+# Function run in the training process: take the lock, train and record the outcome
+def run_training_job(job_dir: str, lock_path: str, target: str, cpu_threads: int, nice: int):
+    limit_resources(cpu_threads, nice)
+    lock_file = open(lock_path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        update_job_status(job_dir, state=JOB_FAILED, error="Another training job is running on this host",
+                          finished_at=datetime.utcnow().isoformat())
+        return
+
+    update_job_status(job_dir, state=JOB_RUNNING, phase='loading', pid=os.getpid(), cpu_threads=cpu_threads,
+                      started_at=datetime.utcnow().isoformat())
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(cpu_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+        module_name, function_name = target.split(':')
+        train = getattr(importlib.import_module(module_name), function_name)
+        result = train(callbacks=[make_progress_callback(job_dir)])
+        update_job_status(job_dir, state=JOB_SUCCEEDED, phase='done', result=result, progress=1.0, eta_seconds=0,
+                          finished_at=datetime.utcnow().isoformat())
+    except TrainingCancelled:
+        update_job_status(job_dir, state=JOB_CANCELLED, phase='cancelled', eta_seconds=None,
+                          finished_at=datetime.utcnow().isoformat())
+    except Exception as e:
+        logging.error(f"Training job failed: {e}")
+        update_job_status(job_dir, state=JOB_FAILED, phase='failed', error=str(e), eta_seconds=None,
+                          finished_at=datetime.utcnow().isoformat())
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+class TrainingJobManager:
+    """
+    Starts training in a separate process and tracks it through a status file per job.
+
+    Only one job runs at a time on a host: the training process holds an exclusive file
+    lock in `jobs_dir` while it runs. Jobs are cancelled cooperatively (the progress
+    callback stops the fit at the next batch) and killed if they do not stop within
+    `cancel_grace` seconds.
+    """
+
+    def __init__(self, jobs_dir, cpu_threads=1, nice=10, cancel_grace=10.0, on_success=None, targets=None):
+        """
+        Args:
+            jobs_dir (str): Directory holding one sub-directory per job and the lock file.
+            cpu_threads (int): Cores (and TensorFlow threads) given to the training process.
+            nice (int): Niceness increment of the training process.
+            cancel_grace (float): Seconds a cancelled job gets to stop before being killed.
+            on_success (callable): Called with the final status after a job succeeded (e.g. to reload the model).
+            targets (dict): Training function ('module:function') per kind of job.
+        """
+        self.jobs_dir = jobs_dir
+        self.cpu_threads = max(1, int(cpu_threads))
+        self.nice = nice
+        self.cancel_grace = cancel_grace
+        self.on_success = on_success
+        self.targets = dict(targets or TRAINING_TARGETS)
+        self._lock = threading.Lock()
+        self._processes = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.jobs_dir, LOCK_FILE)
+
+    # Function to check whether a training process of any API worker holds the lock
+    def _lock_is_held(self) -> bool:
+        with open(self.lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+    # Function to get the job currently queued or running, if any
+    def active_job(self):
+        for job in self.list_jobs():
+            if job.get('state') not in FINISHED_STATES:
+                return job
+        return None
+
+    # Function to start a training job in a separate process
+    def start(self, kind='full') -> dict:
+        """
+        Start a training job and return immediately.
+
+        Args:
+            kind (str): Kind of training (a key of `targets`).
+
+        Returns:
+            dict: The initial status of the job, with its `id`.
+
+        Raises:
+            TrainingJobRunning: If a job is already running on this host.
+        """
+        if kind not in self.targets:
+            raise ValueError(f"Unknown training kind '{kind}', expected one of {sorted(self.targets)}")
+        with self._lock:
+            if any(process.is_alive() for process in self._processes.values()) or self._lock_is_held():
+                active = self.active_job()
+                raise TrainingJobRunning(active['id'] if active else None)
+
+            job_id = uuid4().hex
+            job_dir = _job_dir(self.jobs_dir, job_id)
+            os.makedirs(job_dir)
+            status = update_job_status(job_dir, id=job_id, kind=kind, state=JOB_QUEUED,
+                                       created_at=datetime.utcnow().isoformat())
+
+            # A fresh interpreter: the training process shares no TensorFlow state with the API
+            process = multiprocessing.get_context('spawn').Process(
+                target=run_training_job,
+                args=(job_dir, self.lock_path, self.targets[kind], self.cpu_threads, self.nice),
+                name=f"training-{job_id}",
+                daemon=True,
+            )
+            process.start()
+            self._processes[job_id] = process
+        threading.Thread(target=self._watch, args=(job_id, process), daemon=True).start()
+        return status
+
+    def _watch(self, job_id, process):
+        process.join()
+        with self._lock:
+            self._processes.pop(job_id, None)
+        job_dir = _job_dir(self.jobs_dir, job_id)
+        status = _read_json(_status_path(job_dir)) or {}
+        if status.get('state') not in FINISHED_STATES:
+            # The process died without recording its outcome (killed, out of memory...)
+            state = JOB_CANCELLED if os.path.exists(_cancel_path(job_dir)) else JOB_FAILED
+            status = update_job_status(job_dir, state=state, eta_seconds=None, exit_code=process.exitcode,
+                                       finished_at=datetime.utcnow().isoformat())
+        if status.get('state') == JOB_SUCCEEDED and self.on_success is not None:
+            try:
+                self.on_success(status)
+            except Exception as e:
+                logging.error(f"Post-training hook failed: {e}")
+
+    # Function to get the status of a job
+    def get(self, job_id: str):
+        if not job_id.isalnum():
+            return None
+        return _read_json(_status_path(_job_dir(self.jobs_dir, job_id)))
+
+    # Function to list the most recent jobs first
+    def list_jobs(self, limit=20):
+        jobs = []
+        for job_id in os.listdir(self.jobs_dir):
+            status = self.get(job_id) if os.path.isdir(_job_dir(self.jobs_dir, job_id)) else None
+            if status is not None:
+                jobs.append(status)
+        jobs.sort(key=lambda job: job.get('created_at', ''), reverse=True)
+        return jobs[:limit]
+
+    # Function to cancel a queued or running job
+    def cancel(self, job_id: str):
+        """
+        Ask a job to stop at its next training batch, killing it after `cancel_grace` seconds.
+
+        Returns:
+            dict: The status of the job, or None if it does not exist.
+        """
+        status = self.get(job_id)
+        if status is None or status.get('state') in FINISHED_STATES:
+            return status
+        job_dir = _job_dir(self.jobs_dir, job_id)
+        open(_cancel_path(job_dir), 'w').close()
+        process = self._processes.get(job_id)
+        if process is not None:
+            threading.Thread(target=self._kill_after_grace, args=(process,), daemon=True).start()
+        return update_job_status(job_dir, cancel_requested=True)
+
+    def _kill_after_grace(self, process):
+        process.join(self.cancel_grace)
+        if process.is_alive():
+            logging.warning(f"Training process {process.pid} did not stop after cancellation, killing it")
+            process.kill()
@@ -1,10 +1,10 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from functools import wraps
 
-from src.api.database import get_user, SessionLocal
+from src.api.async_database import get_user, AsyncSessionLocal
 
 # Password hashing context using bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -74,18 +74,15 @@ def verify_access_token(token: str) -> dict:
         return None
 
 # Dependency function to get a database session
-def get_db():
+async def get_db():
     """
-    Provide a database session dependency for FastAPI routes.
+    Provide an async database session dependency for FastAPI routes.
 
     Yields:
-        Session: SQLAlchemy session connected to the database.
+        AsyncSession: SQLAlchemy async session connected to the database.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Decorator to require admin privileges
 def admin_required():
@@ -97,7 +94,7 @@ def admin_required():
     """
     def decorator(func):
         @wraps(func)
-        async def wrapper(request: Request, session: Session = Depends(get_db), *args, **kwargs):
+        async def wrapper(request: Request, session: AsyncSession = Depends(get_db), *args, **kwargs):
             # Get the Authorization header and extract the Bearer token
             token = request.headers.get("Authorization")
             if not token or not token.startswith("Bearer "):
@@ -114,7 +111,7 @@ def admin_required():
                     raise HTTPException(status_code=403, detail="Invalid token")
 
                 # Get the user from the database
-                user = get_user(session, username)
+                user = await get_user(session, username)
                 if not user:
                     raise HTTPException(status_code=403, detail="User not found")
 
@@ -122,6 +119,9 @@ def admin_required():
                 if user.role != "admin":
                     raise HTTPException(status_code=403, detail="Not authorized")
 
+                # End the read transaction: its connection goes back to the pool while the route runs
+                await session.commit()
+
             except JWTError as e:
                 raise HTTPException(status_code=403, detail=f"Authentication error: {str(e)}")
 
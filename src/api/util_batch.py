@@ -0,0 +1,159 @@
+import json
+import zipfile
+import zlib
+from io import BytesIO
+
+# Name of the manifest describing the products of a /predict-batch archive
+MANIFEST_NAME = "manifest.json"
+# Largest manifest read from an archive (a few hundred bytes per product)
+MAX_MANIFEST_BYTES = 1024 * 1024
+
+
+# Function to build prediction items from parallel multipart lists
+def build_multipart_items(designations, descriptions, images, max_items: int, max_image_bytes: int):
+    """
+    Build /predict-batch items from the multipart form lists.
+
+    Args:
+        designations (list): Designations of the products.
+        descriptions (list): Descriptions of the products.
+        images (list): Raw bytes of the product images, in the same order.
+        max_items (int): Maximum number of products accepted in one request.
+        max_image_bytes (int): Maximum size of a single image.
+
+    Returns:
+        list: One dict per product with 'designation', 'description' and 'image', or 'error'.
+
+    Raises:
+        ValueError: If the lists have different lengths, are empty or are too long.
+    """
+    if not (len(designations) == len(descriptions) == len(images)):
+        raise ValueError(
+            f"designations, descriptions and files must have the same length "
+            f"(got {len(designations)}, {len(descriptions)} and {len(images)})"
+        )
+    _check_item_count(len(images), max_items)
+
+    items = []
+    for designation, description, image in zip(designations, descriptions, images):
+        if len(image) > max_image_bytes:
+            items.append({'error': f"Image is larger than {max_image_bytes} bytes"})
+        else:
+            items.append({'designation': designation, 'description': description, 'image': image})
+    return items
+
+
+# Function to read prediction items from a zip of images plus a JSON manifest
+def read_archive_items(archive_data, max_items: int, max_image_bytes: int, max_total_bytes: int = None):
+    """
+    Read /predict-batch items from a zip archive.
+
+    The archive contains the images and a `manifest.json` file holding a list of
+    {"designation": ..., "description": ..., "image": <path inside the archive>} objects
+    (or an object with such a list under "items"). Members are decompressed through a
+    bounded read, whatever size their header claims, so a zip bomb cannot inflate past
+    the limits: neither one image past `max_image_bytes`, nor all of them together past
+    `max_total_bytes`.
+
+    Args:
+        archive_data (bytes or file): Raw bytes of the uploaded zip archive, or a seekable file holding them.
+        max_items (int): Maximum number of products accepted in one request.
+        max_image_bytes (int): Maximum size of a single image.
+        max_total_bytes (int): Maximum size of all the images together (None: no limit).
+
+    Returns:
+        list: One dict per manifest entry with 'designation', 'description' and 'image', or 'error'.
+
+    Raises:
+        ValueError: If the archive or its manifest cannot be read, or the images are too large together.
+    """
+    try:
+        archive = zipfile.ZipFile(BytesIO(archive_data) if isinstance(archive_data, (bytes, bytearray)) else archive_data)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid zip archive: {e}")
+
+    with archive:
+        try:
+            manifest = json.loads(_read_member(archive, archive.getinfo(MANIFEST_NAME), MAX_MANIFEST_BYTES))
+        except KeyError:
+            raise ValueError(f"The archive does not contain {MANIFEST_NAME}")
+        except _MemberTooLarge:
+            raise ValueError(f"{MANIFEST_NAME} is larger than {MAX_MANIFEST_BYTES} bytes")
+        except (zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+            raise ValueError(f"Invalid {MANIFEST_NAME}: {e}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid {MANIFEST_NAME}: {e}")
+
+        entries = manifest.get("items") if isinstance(manifest, dict) else manifest
+        if not isinstance(entries, list):
+            raise ValueError(f"{MANIFEST_NAME} must contain a list of products")
+        _check_item_count(len(entries), max_items)
+
+        items = []
+        remaining = max_total_bytes
+        for entry in entries:
+            try:
+                item = _read_archive_entry(archive, entry, max_image_bytes, remaining)
+            except _ArchiveTooLarge:
+                raise ValueError(f"The images of the archive are larger than {max_total_bytes} bytes in total")
+            if remaining is not None and 'image' in item:
+                remaining -= len(item['image'])
+            items.append(item)
+        return items
+
+
+def _read_archive_entry(archive: zipfile.ZipFile, entry, max_image_bytes: int, remaining: int = None):
+    if not isinstance(entry, dict):
+        return {'error': "Manifest entry must be an object"}
+    missing = [key for key in ("designation", "description", "image") if not isinstance(entry.get(key), str)]
+    if missing:
+        return {'error': f"Manifest entry is missing: {', '.join(missing)}"}
+
+    try:
+        info = archive.getinfo(entry["image"])
+    except KeyError:
+        return {'error': f"Image '{entry['image']}' not found in the archive"}
+    # The header size is only a first check: the member is read through a bounded stream below
+    if info.file_size > max_image_bytes:
+        return {'error': f"Image is larger than {max_image_bytes} bytes"}
+    limit = max_image_bytes if remaining is None else min(max_image_bytes, remaining)
+    try:
+        if info.file_size > limit:
+            raise _MemberTooLarge()
+        image = _read_member(archive, info, limit)
+    except _MemberTooLarge:
+        if limit < max_image_bytes:
+            raise _ArchiveTooLarge()
+        return {'error': f"Image is larger than {max_image_bytes} bytes"}
+    except (zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+        return {'error': f"Image '{entry['image']}' could not be extracted: {e}"}
+
+    return {
+        'designation': entry["designation"],
+        'description': entry["description"],
+        'image': image,
+    }
+
+
+class _MemberTooLarge(Exception):
+    pass
+
+
+class _ArchiveTooLarge(Exception):
+    pass
+
+
+# Function to decompress an archive member, never more than `limit` + 1 bytes
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, limit: int) -> bytes:
+    with archive.open(info) as member:
+        data = member.read(limit + 1)
+    if len(data) > limit:
+        raise _MemberTooLarge()
+    return data
+
+
+def _check_item_count(count: int, max_items: int):
+    if count == 0:
+        raise ValueError("No products to predict")
+    if count > max_items:
+        raise ValueError(f"Too many products in one request ({count} > {max_items})")
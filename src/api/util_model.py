@@ -1,37 +1,56 @@
-from tensorflow.keras.applications import EfficientNetB0
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow import expand_dims, convert_to_tensor, float32
+import logging
+import math
 from tensorflow.keras.applications.efficientnet import preprocess_input
 from PIL import Image, ImageOps
 from sklearn.metrics import classification_report, f1_score
-from tensorflow.keras.utils import to_categorical
 import numpy as np
-from src.api.database import get_untrained_products, Session, update_product_state
+import scipy.sparse as sp
+from src.api.database import iter_untrained_products, Session, mark_products_trained
+from src.api.image_features import extract_image_features, IMAGE_FEATURE_DIM
+from src.api.sparse_features import transform_text, to_sparse_tensor, SparseFeatureDataset
+from src.api.image_loader import ParallelImageLoader, read_image_file
+from src.api.config import IMAGE_LOADER_WORKERS, IMAGE_LOADER_PREFETCH
 
 
 # Function to preprocess image
-def preprocess_image(image, target_size=(224, 224)):
-    image = ImageOps.fit(image, target_size, Image.LANCZOS)
-    image = np.array(image) / 255.0
-    image = convert_to_tensor(image, dtype=float32)
+def preprocess_image(image, target_size=(224, 224), resample=Image.BICUBIC):
+    """
+    Function to turn a PIL image into a (1, height, width, 3) float32 batch for the backbone.
+
+    Images opened from a JPEG and not loaded yet are decoded directly at a reduced
+    resolution (DCT scaling in draft mode), just large enough to cover the center crop
+    at `target_size`, so the full-size pixels of phone photos are never materialized.
+    """
+    # Smallest decoded size whose center crop still covers target_size
+    scale = max(target_size[0] / image.size[0], target_size[1] / image.size[1])
+    image.draft('RGB', (math.ceil(image.size[0] * scale), math.ceil(image.size[1] * scale)))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = ImageOps.fit(image, target_size, resample)
+    # Scale to [0, 1] in float32 directly, without a float64 intermediate
+    image = np.asarray(image, dtype=np.float32)
+    image *= 1 / 255.0
     image = preprocess_input(image)
-    return expand_dims(image, axis=0)
+    return image[np.newaxis]
 
 
 def predict_classification(model, vectorizer, designation: str, description: str, image: Image.Image):
-    # Preprocess text data
-    text_data = designation + ' ' + description
-    processed_text = vectorizer.transform([text_data]).toarray()
+    # Extract image features with the shared EfficientNetB0 extractor
+    image_features = extract_image_features(preprocess_image(image))
+    return predict_from_features(model, vectorizer, [designation], [description], image_features)
 
-    # Preprocess image data (no need to re-open the image)
-    processed_image = preprocess_image(image)
 
-    # Extract image features using EfficientNetB0
-    image_features = EfficientNetB0(weights='imagenet', include_top=False)(processed_image)
-    image_features = GlobalAveragePooling2D()(image_features).numpy()
+def predict_from_features(model, vectorizer, designations, descriptions, image_features):
+    """
+    Function to run the classification head on texts and already extracted image features.
+    """
+    # Preprocess text data in one vectorizer call, keeping the TF-IDF rows sparse
+    text_data = [designation + ' ' + description for designation, description in zip(designations, descriptions)]
+    processed_text = to_sparse_tensor(transform_text(vectorizer, text_data))
 
     # Perform prediction
-    prediction = model.predict([processed_text, image_features])
+    prediction = model.predict_on_batch([processed_text, image_features])
+    prediction = np.asarray(prediction)
     predicted_class = np.argmax(prediction, axis=1)
 
     # Get confidence score (maximum probability)
@@ -40,72 +59,204 @@ def predict_classification(model, vectorizer, designation: str, description: str
     return {'predicted_class': predicted_class, 'confidence': confidence}
 
 
-def train_model_on_new_data(model, vectorizer, session: Session):
+def compute_image_features(images_data, feature_cache=None, batch_size=32, extractor=None, loader=None):
+    """
+    Function to get pooled image features for raw uploaded images (or image file paths).
+
+    Images already in the feature cache skip decoding and the backbone. `extractor` replaces
+    the shared Keras backbone (e.g. with the TFLite one). `loader` decodes the images on a
+    thread pool while the backbone runs (by default they are decoded in the calling thread).
+    Returns the (n, 1280) feature array and a dict mapping the index of every image that
+    could not be read or decoded to its error message.
+    """
+    extractor = extractor or extract_image_features
+    loader = loader or ParallelImageLoader(workers=0)
+    features = np.zeros((len(images_data), IMAGE_FEATURE_DIM), dtype=np.float32)
+    errors = {}
+    keys = [None] * len(images_data)
+    missing = []
+
+    for index, image_data in enumerate(images_data):
+        # Only raw bytes can be looked up in the content-addressed cache
+        if feature_cache is not None and isinstance(image_data, bytes):
+            keys[index] = feature_cache.key(image_data)
+            cached = feature_cache.get(keys[index])
+            if cached is not None:
+                features[index] = cached
+                continue
+        missing.append(index)
+
+    # Decode and preprocess the misses batch by batch so memory does not grow with the number of images
+    for positions, batch, batch_errors in loader.iter_batches(
+        (images_data[index] for index in missing), preprocess_image, batch_size
+    ):
+        errors.update({missing[position]: message for position, message in batch_errors.items()})
+        if positions:
+            indices = [missing[position] for position in positions]
+            features[indices] = extractor(batch)
+            for index in indices:
+                if keys[index] is not None:
+                    feature_cache.put(keys[index], features[index])
+
+    return features, errors
+
+
+def predict_classification_batch(model, vectorizer, designations, descriptions, images_data, feature_cache=None, extractor=None):
+    """
+    Function to classify several products (raw image bytes) with a single forward pass of the backbone and the model.
+    """
+    image_features, errors = compute_image_features(images_data, feature_cache, extractor=extractor)
+    if errors:
+        raise ValueError(next(iter(errors.values())))
+    return predict_from_features(model, vectorizer, designations, descriptions, image_features)
+
+
+def predict_classification_bulk(model, vectorizer, items, batch_size=32, feature_cache=None, extractor=None):
+    """
+    Function to classify many products at once, returning one result per item in input order.
+
+    Each item is a dict with 'designation', 'description' and 'image' (raw uploaded bytes),
+    or with an 'error' already found while reading the request. Items that cannot be processed
+    get an 'error' entry instead of failing the whole batch.
+    """
+    results = [{'error': item['error']} if 'error' in item else None for item in items]
+    candidates = [index for index, item in enumerate(items) if 'error' not in item]
+
+    image_features, errors = compute_image_features(
+        [items[index]['image'] for index in candidates], feature_cache, batch_size, extractor
+    )
+    for position, message in errors.items():
+        results[candidates[position]] = {'error': message}
+
+    valid_positions = [position for position in range(len(candidates)) if position not in errors]
+    if valid_positions:
+        # Vectorize every text in one call and run a single forward pass of the model
+        valid_items = [items[candidates[position]] for position in valid_positions]
+        predicted_result = predict_from_features(
+            model, vectorizer,
+            [item['designation'] for item in valid_items],
+            [item['description'] for item in valid_items],
+            image_features[valid_positions],
+        )
+        for position, predicted_class, confidence in zip(
+            valid_positions, predicted_result['predicted_class'], predicted_result['confidence']
+        ):
+            results[candidates[position]] = {'predicted_class': int(predicted_class), 'confidence': float(confidence)}
+
+    return results
+
+
+def load_product_features(vectorizer, products, batch_size=32, extractor=None, feature_cache=None, loader=None):
+    """
+    Function to get the model inputs of stored products: TF-IDF rows, pooled image features and labels.
+
+    Images are read from `image_path` and decoded by a ParallelImageLoader (IMAGE_LOADER_WORKERS
+    threads) while the backbone runs on the previous batch. Products whose image cannot be read
+    are left out and reported in the returned errors dict (product id -> error message).
+    """
+    # Image files are read by the loader threads; raw bytes are only needed to fill the feature cache
+    if loader is None:
+        loader = ParallelImageLoader(IMAGE_LOADER_WORKERS, IMAGE_LOADER_PREFETCH)
+    images = []
+    for product in products:
+        if feature_cache is None:
+            images.append(product.image_path)
+            continue
+        image_data, error = read_image_file(product.image_path)
+        images.append(image_data if error is None else product.image_path)
+
+    image_features, image_errors = compute_image_features(images, feature_cache, batch_size, extractor, loader)
+    errors = {products[position].id: message for position, message in image_errors.items()}
+    valid_positions = [position for position in range(len(products)) if position not in image_errors]
+    valid_products = [products[position] for position in valid_positions]
+
+    X_text = transform_text(vectorizer, [product.designation + ' ' + product.description for product in valid_products])
+    # Integer labels, as expected by the sparse categorical cross-entropy of the model
+    y = np.array([int(product.category) for product in valid_products], dtype=np.int64)
+    product_ids = [product.id for product in valid_products]
+    return X_text, image_features[valid_positions], y, product_ids, errors
+
+
+def load_training_inputs(vectorizer, products, feature_store=None):
+    """
+    Function to get the model inputs of products, from the feature store when one is given
+    (only products missing from it have their image read) or computed from the images.
+    """
+    if feature_store is not None:
+        from src.api.feature_store import load_store_features
+
+        return load_store_features(feature_store, vectorizer, products)
+    return load_product_features(vectorizer, products)
+
+
+def concatenate_inputs(parts):
+    """
+    Function to join the model inputs of several chunks of products (see `load_training_inputs`).
+    """
+    X_text = sp.vstack([part[0] for part in parts], format='csr')
+    X_image = np.concatenate([part[1] for part in parts])
+    y = np.concatenate([part[2] for part in parts])
+    product_ids = [product_id for part in parts for product_id in part[3]]
+    errors = {product_id: message for part in parts for product_id, message in part[4].items()}
+    return X_text, X_image, y, product_ids, errors
+
+
+def load_untrained_inputs(vectorizer, session: Session, feature_store=None):
+    """
+    Function to get the model inputs of the untrained products, featurized chunk by chunk as they
+    are read, so only their features (not every Product object) are held at once.
+    Returns None when no product is waiting for training.
+    """
+    parts = [load_training_inputs(vectorizer, products, feature_store) for products in iter_untrained_products(session)]
+    return concatenate_inputs(parts) if parts else None
+
+
+def train_model_on_new_data(model, vectorizer, session: Session, feature_store=None):
     """
     Function to train a pre-trained model using untrained products and return F1-score and classification report.
     """
-    products = get_untrained_products(session)
-    if not products:
+    inputs = load_untrained_inputs(vectorizer, session, feature_store)
+    if inputs is None:
         return "No new data available for training."
 
-    X_text = []
-    X_image = []
-    y = []
-    product_ids = []
+    X_text, X_image, y, product_ids, errors = inputs
+    for product_id, message in errors.items():
+        logging.warning(f"Product {product_id} skipped: {message}")
+    if not product_ids:
+        raise ValueError("None of the new products could be featurized")
 
-    for product in products:
-        product_ids.append(product.id)
-        text_data = product.designation + ' ' + product.description
-        processed_text = vectorizer.transform([text_data]).toarray()[0]
-        image = Image.open(product.image_path)
-        processed_image = preprocess_image(image).reshape(-1)
-        X_text.append(processed_text)
-        X_image.append(processed_image)
-        y.append(product.category)
-
-    X_text = np.array(X_text)
-    X_image = np.array(X_image)
-    y = np.array(y)
-    num_classes = len(np.unique(y))
-    y = to_categorical([int(label) for label in y], num_classes=num_classes)
-
-    model.fit([X_text, X_image], y, epochs=5, batch_size=32, validation_split=0.2)
-    y_pred = np.argmax(model.predict([X_text, X_image]), axis=1)
-    y_true = np.argmax(y, axis=1)
+    # Hold out the last 20% for validation, like validation_split does for dense arrays
+    split = int(len(y) * 0.8)
+    model.fit(
+        SparseFeatureDataset(X_text[:split], X_image[:split], y[:split], batch_size=32, shuffle=True),
+        epochs=5,
+        validation_data=SparseFeatureDataset(X_text[split:], X_image[split:], y[split:], batch_size=32) if split < len(y) else None,
+    )
+    y_pred = np.argmax(model.predict(SparseFeatureDataset(X_text, X_image, batch_size=256), verbose=0), axis=1)
+    y_true = y
 
     f1 = f1_score(y_true, y_pred, average='weighted')
     report = classification_report(y_true, y_pred)
-    update_product_state(session, product_ids)
+    mark_products_trained(session, product_ids)
 
     return f1, report
 
 
-def evaluate_model_on_untrained_data(model, vectorizer, session: Session):
+def evaluate_model_on_untrained_data(model, vectorizer, session: Session, feature_store=None):
     """
     Function to evaluate a pre-trained model on untrained data.
     """
-    products = get_untrained_products(session)
-    if not products:
+    inputs = load_untrained_inputs(vectorizer, session, feature_store)
+    if inputs is None:
         return "No new data available for evaluation."
 
-    X_text = []
-    X_image = []
-    y_true = []
+    X_text, X_image, y_true, product_ids, errors = inputs
+    for product_id, message in errors.items():
+        logging.warning(f"Product {product_id} skipped: {message}")
+    if not product_ids:
+        raise ValueError("None of the new products could be featurized")
 
-    for product in products:
-        text_data = product.designation + ' ' + product.description
-        processed_text = vectorizer.transform([text_data]).toarray()[0]
-        image = Image.open(product.image_path)
-        processed_image = preprocess_image(image).reshape(-1)
-        X_text.append(processed_text)
-        X_image.append(processed_image)
-        y_true.append(product.category)
-
-    X_text = np.array(X_text)
-    X_image = np.array(X_image)
-    y_true = np.array([int(label) for label in y_true])
-
-    y_pred = np.argmax(model.predict([X_text, X_image]), axis=1)
+    y_pred = np.argmax(model.predict(SparseFeatureDataset(X_text, X_image, batch_size=256), verbose=0), axis=1)
 
     f1 = f1_score(y_true, y_pred, average='weighted')
     report = classification_report(y_true, y_pred)
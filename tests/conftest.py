@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Run the tests against a temporary database: the sample src/data/test.db tracked in the repository
+# would otherwise be switched to WAL mode (the journal mode is stored in the file)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.api.database import Base, Log, async_database_url, create_database_engine
+from src.api.async_database import (
+    create_user, get_user, count_users, delete_user, add_product, get_all_logs, get_all_users,
+    select_logs, get_logs_page, stream_logs, encode_log_cursor, decode_log_cursor,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestAsyncDatabase(unittest.TestCase):
+
+    def test_async_database_url(self):
+        logging.info("Testing the async driver of each backend.")
+        self.assertEqual(async_database_url("sqlite:///./src/data/test.db"), "sqlite+aiosqlite:///./src/data/test.db")
+        self.assertEqual(async_database_url("postgresql+psycopg2://user:secret@db:5432/products"),
+                         "postgresql+asyncpg://user:secret@db:5432/products")
+        with self.assertRaises(ValueError):
+            async_database_url("mysql://user@db/products")
+        logging.debug("Async URL test passed.")
+
+    def test_async_helpers(self):
+        logging.info("Testing the async database helpers.")
+
+        async def scenario():
+            engine = create_database_engine("sqlite://", asynchronous=True)
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            async with session_factory() as session:
+                self.assertEqual(await count_users(session), 0)
+                admin = await create_user(session, 'admin', 'hash', 'admin')
+                bob = await create_user(session, 'bob', 'hash', 'user')
+                session.add(Log(user_id=bob.id, event="User bob logged in"))
+                await session.commit()
+                product = await add_product(session, 'img.jpg', 'Lamp', 'A lamp', '10')
+                self.assertIsNotNone(product.id)
+                self.assertEqual(product.state, 0)
+                self.assertEqual((await get_user(session, 'bob')).role, 'user')
+                self.assertIsNone(await get_user(session, 'alice'))
+                self.assertEqual(await count_users(session), 2)
+
+                # The user and their logs are removed together
+                session.add(Log(user_id=admin.id, event="User admin logged in"))
+                await session.commit()
+                self.assertEqual(await delete_user(session, 'bob'), bob.id)
+                self.assertIsNone(await delete_user(session, 'bob'))
+                self.assertEqual([user.username for user in await get_all_users(session)], ['admin'])
+                self.assertEqual([log.event for log in await get_all_logs(session)], ["User admin logged in"])
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Async helpers test passed.")
+
+    def test_logs_keyset_pagination(self):
+        logging.info("Testing the keyset pages, filters and export of the logs.")
+
+        async def scenario():
+            engine = create_database_engine("sqlite://", asynchronous=True)
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            start = datetime(2024, 1, 1)
+            async with session_factory() as session:
+                admin = await create_user(session, 'admin', 'hash', 'admin')
+                bob = await create_user(session, 'bob', 'hash', 'user')
+                # Pairs of logs share a timestamp: the id orders them
+                session.add_all([Log(user_id=(admin.id, bob.id)[index % 2], event=f"event {index}",
+                                     timestamp=start + timedelta(minutes=index // 2)) for index in range(10)])
+                await session.commit()
+
+                async def walk(limit, **filters):
+                    events, cursor = [], None
+                    while True:
+                        after = decode_log_cursor(cursor) if cursor else None
+                        logs, cursor = await get_logs_page(session, limit, after=after, **filters)
+                        events.extend(log.event for log in logs)
+                        if cursor is None:
+                            return events
+
+                self.assertEqual(await walk(3), [f"event {index}" for index in range(10)])
+                self.assertEqual(await walk(4, descending=True), [f"event {index}" for index in reversed(range(10))])
+                self.assertEqual(await walk(2, user_id=bob.id), [f"event {index}" for index in (1, 3, 5, 7, 9)])
+                self.assertEqual(await walk(10, since=start + timedelta(minutes=1), until=start + timedelta(minutes=3)),
+                                 [f"event {index}" for index in (2, 3, 4, 5)])
+                logs, cursor = await get_logs_page(session, 10)
+                self.assertIsNone(cursor)
+
+                # The export resumes after a cursor, one chunk at a time
+                after = decode_log_cursor(encode_log_cursor(logs[3]))
+                chunks = [[log.event for log in chunk] async for chunk in stream_logs(session, chunk_size=4, after=after)]
+                self.assertEqual(chunks, [["event 4", "event 5", "event 6", "event 7"], ["event 8", "event 9"]])
+                with self.assertRaises(ValueError):
+                    decode_log_cursor("not a cursor")
+
+                # Both kinds of pages are range scans of the composite indexes
+                for filters, index in (({}, 'ix_logs_timestamp_id'), ({'user_id': bob.id}, 'ix_logs_user_id_timestamp_id')):
+                    query = select_logs(after=(start, 1), **filters).limit(3)
+                    compiled = query.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+                    plan = (await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+                    self.assertIn(index, str(plan))
+                    self.assertNotIn('TEMP B-TREE', str(plan))
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Keyset pagination test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+import logging
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.api.database import Base, Log, create_database_engine
+from src.api.audit_log import AuditLogWriter
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class FailingSessions:
+    """Session factory failing its first `failures` calls, like a database that is briefly unreachable."""
+
+    def __init__(self, session_factory, failures):
+        self.session_factory = session_factory
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OperationalError("INSERT INTO logs", {}, Exception("database is locked"))
+        return self.session_factory()
+
+class TestAuditLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spill_path = os.path.join(self.directory, 'spill.jsonl')
+
+    async def create_database(self):
+        engine = create_database_engine(f"sqlite:///{os.path.join(self.directory, 'test.db')}", asynchronous=True)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        self.inserts = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.inserts.append(statement)
+                     if statement.startswith("INSERT") else None)
+        return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+    async def read_events(self, sessions):
+        async with sessions() as session:
+            return [log.event for log in (await session.execute(select(Log).order_by(Log.id))).scalars()]
+
+    def test_batches_by_size_and_time(self):
+        logging.info("Testing the size and time thresholds of the audit log writer.")
+
+        async def scenario():
+            engine, sessions = await self.create_database()
+            writer = AuditLogWriter(sessions, max_batch_size=3, flush_interval_ms=50)
+            for index in range(7):
+                await writer.log(1, f"event {index}")
+            await writer.flush()
+            self.assertEqual(await self.read_events(sessions), [f"event {index}" for index in range(7)])
+            self.assertEqual(len(self.inserts), 3)  # 3 + 3 + 1 events, one multi-row INSERT each
+
+            # A lone event is written once the flush interval has passed
+            await writer.log(1, "late event")
+            await asyncio.sleep(0.3)
+            self.assertEqual((await self.read_events(sessions))[-1], "late event")
+            await writer.stop()
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Thresholds test passed.")
+
+    def test_bounded_queue_keeps_events_while_database_fails(self):
+        logging.info("Testing the bounded buffer and the retries of the audit log writer.")
+
+        async def scenario():
+            engine, sessions = await self.create_database()
+            failing = FailingSessions(sessions, failures=3)
+            writer = AuditLogWriter(failing, max_batch_size=2, flush_interval_ms=10, max_queue_size=2, retry_delay=0.01)
+            start = time.perf_counter()
+            await asyncio.gather(*[writer.log(1, f"event {index}") for index in range(10)])
+            await writer.flush()
+            self.assertLessEqual(writer._queue.qsize(), 2)
+            self.assertGreater(time.perf_counter() - start, 0.06)  # Waited for the retries (0.01 + 0.02 + 0.04)
+            self.assertEqual(sorted(await self.read_events(sessions)), sorted(f"event {index}" for index in range(10)))
+
+            # A row the database refuses is skipped, the rest of its batch is written
+            await writer.log(None, "no user")
+            await writer.log(1, "valid")
+            await writer.stop()
+            self.assertEqual((await self.read_events(sessions))[-1], "valid")
+            self.assertNotIn("no user", await self.read_events(sessions))
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Bounded buffer test passed.")
+
+    def test_flush_gives_up_after_its_timeout(self):
+        logging.info("Testing a flush while the database is down.")
+
+        async def scenario():
+            engine, sessions = await self.create_database()
+            writer = AuditLogWriter(FailingSessions(sessions, failures=10 ** 6), flush_interval_ms=10, retry_delay=0.01,
+                                    shutdown_timeout=0.1, spill_path=self.spill_path)
+            await writer.log(1, "while down")
+            start = time.perf_counter()
+            self.assertFalse(await writer.flush(timeout=0.1))
+            self.assertLess(time.perf_counter() - start, 1)
+
+            # The event stays buffered and is written once the database is back
+            writer.session_factory = sessions
+            self.assertTrue(await writer.flush(timeout=5))
+            self.assertEqual(await self.read_events(sessions), ["while down"])
+            await writer.stop()
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Flush timeout test passed.")
+
+    def test_unwritten_events_are_spilled_and_replayed(self):
+        logging.info("Testing the spill file of the audit log writer.")
+
+        async def scenario():
+            engine, sessions = await self.create_database()
+            writer = AuditLogWriter(FailingSessions(sessions, failures=10 ** 6), flush_interval_ms=10, retry_delay=0.01,
+                                    shutdown_timeout=0.2, spill_path=self.spill_path)
+            for index in range(5):
+                await writer.log(1, f"event {index}")
+            await writer.stop()
+            with open(self.spill_path) as f:
+                self.assertEqual(len(f.readlines()), 5)
+
+            # The next start writes them before anything else
+            writer = AuditLogWriter(sessions, flush_interval_ms=10, spill_path=self.spill_path)
+            await writer.log(1, "after restart")
+            await writer.flush()
+            self.assertEqual(await self.read_events(sessions), [f"event {index}" for index in range(5)] + ["after restart"])
+            self.assertFalse(os.path.exists(self.spill_path))
+            await writer.stop()
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        logging.debug("Spill test passed.")
+
+    def test_events_survive_a_closed_event_loop(self):
+        logging.info("Testing the audit events left by a task whose event loop was closed.")
+        writer = AuditLogWriter(None, flush_interval_ms=60000)
+
+        async def first_loop():
+            engine, writer.session_factory = await self.create_database()
+            await writer.log(1, "before")
+            await asyncio.sleep(0.05)  # The task holds the event while it waits for a full batch
+            await engine.dispose()
+
+        async def second_loop():
+            engine, writer.session_factory = await self.create_database()
+            await writer.log(1, "after")
+            await writer.flush()
+            self.assertEqual(await self.read_events(writer.session_factory), ["before", "after"])
+            await writer.stop()
+            await engine.dispose()
+
+        asyncio.run(first_loop())  # Cancels the writing task when the loop closes
+        asyncio.run(second_loop())
+        logging.debug("Closed loop test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+import logging
+from src.api.batching import MicroBatcher
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_share_a_batch(self):
+        logging.info("Testing that concurrent submissions are batched together.")
+        batch_sizes = []
+
+        def process_batch(items):
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        async def scenario():
+            batcher = MicroBatcher(process_batch, max_batch_size=8, max_wait_ms=50)
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, [0, 2, 4, 6, 8])
+        self.assertEqual(batch_sizes, [5])
+        logging.debug("Batching test passed.")
+
+    def test_max_batch_size_is_respected(self):
+        logging.info("Testing that batches never exceed max_batch_size.")
+        batch_sizes = []
+
+        def process_batch(items):
+            batch_sizes.append(len(items))
+            return items
+
+        async def scenario():
+            batcher = MicroBatcher(process_batch, max_batch_size=3, max_wait_ms=50)
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, list(range(7)))
+        self.assertTrue(all(size <= 3 for size in batch_sizes))
+        self.assertEqual(sum(batch_sizes), 7)
+        logging.debug("Max batch size test passed.")
+
+    def test_failing_item_only_fails_its_own_request(self):
+        logging.info("Testing per-item error isolation.")
+
+        def process_batch(items):
+            if "bad" in items:
+                raise ValueError("cannot process item")
+            return [item.upper() for item in items]
+
+        async def scenario():
+            batcher = MicroBatcher(process_batch, max_batch_size=8, max_wait_ms=50)
+            results = await asyncio.gather(
+                batcher.submit("a"), batcher.submit("bad"), batcher.submit("b"), return_exceptions=True
+            )
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results[0], "A")
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], "B")
+        logging.debug("Error isolation test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from src.api.sparse_features import save_text_features
+from src.api.dataset_package import build_dataset_package, load_dataset_package, compact_label_dtype, MANIFEST_NAME
+from src.api.training_data import load_dataset, dataset_fingerprint, load_split_indices
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestDatasetPackage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.sources = {name: os.path.join(self.tmp_dir.name, file_name) for name, file_name in (
+            ('text', 'text.npz'), ('image_features', 'images.npy'), ('labels', 'labels.npy'),
+        )}
+        self.package_dir = os.path.join(self.tmp_dir.name, 'dataset')
+        self.text = sp.random(60, 30, density=0.1, format='csr', dtype=np.float32, random_state=0)
+        self.images = rng.normal(size=(60, 8)).astype(np.float32)
+        self.labels = rng.integers(0, 27, 60)
+        save_text_features(self.sources['text'], self.text)
+        np.save(self.sources['image_features'], self.images)
+        np.save(self.sources['labels'], self.labels)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_package_round_trip(self):
+        logging.info("Testing the content of a dataset package.")
+        manifest, rebuilt = build_dataset_package(self.package_dir, self.sources)
+        self.assertEqual(rebuilt, ['text', 'image_features', 'labels'])
+        self.assertEqual((manifest['rows'], manifest['num_classes']), (60, 27))
+
+        text, images, labels, loaded = load_dataset_package(self.package_dir, verify=True)
+        self.assertEqual(loaded['fingerprint'], manifest['fingerprint'])
+        np.testing.assert_array_equal(text.toarray(), self.text.toarray())
+        self.assertEqual(images.dtype, np.float16)
+        self.assertIsInstance(images, np.memmap)
+        np.testing.assert_allclose(images, self.images, rtol=1e-3, atol=1e-3)
+        self.assertEqual(labels.dtype, np.uint8)
+        np.testing.assert_array_equal(labels, self.labels)
+        self.assertEqual(compact_label_dtype(300), np.uint16)
+
+        # A corrupted artifact is caught by the hashes of the manifest
+        with open(os.path.join(self.package_dir, 'labels.npy'), 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'\xff')
+        with self.assertRaises(ValueError):
+            load_dataset_package(self.package_dir, verify=True)
+        logging.debug("Dataset package round trip test passed.")
+
+    def test_unchanged_artifacts_are_reused(self):
+        logging.info("Testing that only changed artifacts are rebuilt.")
+        manifest, _ = build_dataset_package(self.package_dir, self.sources)
+        self.assertEqual(build_dataset_package(self.package_dir, self.sources)[1], [])
+
+        # Same content written again (e.g. copied into a container): detected by hash
+        np.save(self.sources['image_features'], self.images)
+        again, rebuilt = build_dataset_package(self.package_dir, self.sources)
+        self.assertEqual(rebuilt, [])
+        self.assertEqual(again['fingerprint'], manifest['fingerprint'])
+
+        np.save(self.sources['labels'], (self.labels + 1) % 27)
+        changed, rebuilt = build_dataset_package(self.package_dir, self.sources)
+        self.assertEqual(rebuilt, ['labels'])
+        self.assertNotEqual(changed['fingerprint'], manifest['fingerprint'])
+
+        # Another storage type of the image features is another artifact
+        self.assertEqual(build_dataset_package(self.package_dir, self.sources, image_dtype='float32')[1], ['image_features'])
+        with self.assertRaises(ValueError):
+            build_dataset_package(self.package_dir, self.sources, image_dtype='int8')
+        logging.debug("Artifact reuse test passed.")
+
+    def test_training_data_reads_the_package(self):
+        logging.info("Testing the dataset loader and the split of a package.")
+        self.assertIsNone(dataset_fingerprint(self.package_dir, self.sources))
+        text, images, labels, manifest = load_dataset(self.package_dir, self.sources)
+        self.assertEqual(dataset_fingerprint(self.package_dir, self.sources), manifest['fingerprint'])
+        self.assertEqual(text.shape, (60, 30))
+
+        # A modified source makes the fingerprint unknown until the package is updated
+        np.save(self.sources['labels'], self.labels[::-1])
+        self.assertIsNone(dataset_fingerprint(self.package_dir, self.sources))
+
+        # Deployments may ship the package alone
+        for path in self.sources.values():
+            os.remove(path)
+        _, _, labels, shipped = load_dataset(self.package_dir, self.sources)
+        self.assertEqual(shipped['fingerprint'], manifest['fingerprint'])
+        np.testing.assert_array_equal(labels, self.labels)
+        with open(os.path.join(self.package_dir, MANIFEST_NAME)) as f:
+            self.assertEqual(json.load(f)['artifacts']['labels']['dtype'], 'uint8')
+
+        # The persisted split is made again for another dataset
+        split_path = os.path.join(self.tmp_dir.name, 'split.npz')
+        load_split_indices(60, path=split_path, fingerprint=manifest['fingerprint'])
+        mtime = os.stat(split_path).st_mtime_ns
+        load_split_indices(60, path=split_path, fingerprint=manifest['fingerprint'])
+        self.assertEqual(os.stat(split_path).st_mtime_ns, mtime)
+        load_split_indices(60, path=split_path, fingerprint='other')
+        with np.load(split_path) as stored:
+            self.assertEqual(str(stored['fingerprint']), 'other')
+        logging.debug("Dataset loader test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
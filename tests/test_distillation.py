@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from tensorflow.keras.models import load_model
+from src.api.retrain_model import build_model
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.distillation import build_student_model, soften_probabilities, distillation_targets, distill_student
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestDistillation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.labels = rng.integers(0, 3, 300)
+        self.text = sp.random(300, 60, density=0.1, format='csr', dtype=np.float32, random_state=0)
+        self.images = (rng.normal(size=(300, 16)) + self.labels[:, None]).astype(np.float32)
+        self.splits = {'train': np.arange(200), 'val': np.arange(200, 250), 'test': np.arange(250, 300)}
+
+    def test_soft_targets(self):
+        logging.info("Testing the softened teacher targets.")
+        probabilities = np.array([[0.7, 0.2, 0.1], [0.1, 0.1, 0.8]], dtype=np.float32)
+        softened = soften_probabilities(probabilities, 4.0)
+        np.testing.assert_allclose(softened.sum(axis=1), np.ones(2), rtol=1e-6)
+        # Same ranking, flatter distribution; a temperature of 1 changes nothing
+        np.testing.assert_array_equal(np.argsort(softened, axis=1), np.argsort(probabilities, axis=1))
+        self.assertLess(softened.max(), probabilities.max())
+        np.testing.assert_allclose(soften_probabilities(probabilities, 1.0), probabilities, rtol=1e-5)
+
+        teacher = build_model(60, 16, 3)
+        targets = distillation_targets(teacher, self.text, self.images, self.labels, np.array([5, 2, 7]), 2.0, batch_size=2)
+        self.assertEqual(targets.shape, (300, 4))
+        np.testing.assert_allclose(targets[[2, 5, 7], :3].sum(axis=1), np.ones(3), rtol=1e-5)
+        np.testing.assert_array_equal(targets[[2, 5, 7], 3], self.labels[[2, 5, 7]])
+        self.assertFalse(targets[0].any())
+        logging.debug("Soft targets test passed.")
+
+    def test_distilled_student_is_smaller(self):
+        logging.info("Testing the distillation of a student model.")
+        teacher = build_model(60, 16, 3)
+        student, history = distill_student(teacher, self.text, self.images, self.labels, self.splits,
+                                           text_dim=8, epochs=2, batch_size=32)
+        self.assertGreaterEqual(len(history.epoch), 1)
+        self.assertLess(student.count_params(), teacher.count_params() / 10)
+        self.assertEqual(student.output_shape, teacher.output_shape)
+        self.assertFalse(student.get_layer('text_projection').trainable)
+
+        # Saved and reloaded like the teacher
+        student_path = os.path.join(tempfile.mkdtemp(), 'student.keras')
+        student.save(student_path)
+        inputs = SparseFeatureDataset(self.text, self.images, batch_size=4)[0][0]
+        probabilities = np.asarray(load_model(student_path).predict_on_batch(inputs))
+        np.testing.assert_allclose(probabilities.sum(axis=1), np.ones(4), rtol=1e-5)
+        np.testing.assert_allclose(probabilities, student.predict_on_batch(inputs), atol=1e-5)
+        logging.debug("Student model test passed.")
+
+    def test_student_architecture(self):
+        logging.info("Testing the student architecture.")
+        student = build_student_model(60, 16, 3, text_units=8, image_units=4)
+        self.assertEqual(student.get_layer('logits').output.shape[-1], 3)
+        # Text 60*8+8, images 16*4+4, logits (8+4)*3+3
+        self.assertEqual(student.count_params(), 488 + 68 + 39)
+        logging.debug("Student architecture test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from sklearn.metrics import classification_report, confusion_matrix, f1_score
+from src.api.evaluation import streaming_confusion_matrix, metrics_from_confusion_matrix, EvaluationService
+from src.api.sparse_features import save_text_features
+from src.api.training_data import load_split_indices
+from src.api.startup import ModelRegistry
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+NUM_CLASSES = 4
+
+class FakeModel:
+    """Predicts the class stored in the first image feature, counting the rows it sees."""
+
+    def __init__(self):
+        self.rows = 0
+
+    def predict_on_batch(self, inputs):
+        _, image_features = inputs
+        self.rows += len(image_features)
+        return np.eye(NUM_CLASSES, dtype=np.float32)[image_features[:, 0].astype(int)]
+
+class FakeRegistry(ModelRegistry):
+    """Registry serving a FakeModel, versioned by the file it is loaded from."""
+
+    def _load_servable(self, model_path, tflite_model_path):
+        return FakeModel(), None, 'backbone', [model_path]
+
+# Dataset whose predictions are right about 70% of the time
+def make_dataset(n_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, NUM_CLASSES, n_samples)
+    predictions = np.where(rng.random(n_samples) < 0.7, labels, rng.integers(0, NUM_CLASSES, n_samples))
+    image_features = np.zeros((n_samples, 3), dtype=np.float32)
+    image_features[:, 0] = predictions
+    text = sp.random(n_samples, 10, density=0.2, format='csr', dtype=np.float32, random_state=seed)
+    return text, image_features, labels, predictions
+
+class TestEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_metrics_match_scikit_learn(self):
+        logging.info("Testing the metrics derived from the confusion matrix.")
+        _, _, labels, predictions = make_dataset(500)
+        # A class that is never predicted, and one that never occurs
+        predictions[predictions == 3] = 2
+        labels[labels == 0] = 1
+        report = metrics_from_confusion_matrix(confusion_matrix(labels, predictions, labels=range(NUM_CLASSES)))
+        expected = classification_report(labels, predictions, output_dict=True, zero_division=0)
+        self.assertEqual(report.keys(), expected.keys())
+        for name, values in expected.items():
+            if name == 'accuracy':
+                self.assertAlmostEqual(report[name], values)
+                continue
+            for metric, value in values.items():
+                self.assertAlmostEqual(report[name][metric], value, msg=f"{name} {metric}")
+        self.assertAlmostEqual(report['weighted avg']['f1-score'], f1_score(labels, predictions, average='weighted'))
+        logging.debug("Metrics test passed.")
+
+    def test_streaming_confusion_matrix(self):
+        logging.info("Testing the batched confusion matrix on a subset of rows.")
+        text, image_features, labels, predictions = make_dataset(300)
+        indices = np.random.default_rng(1).permutation(300)[:77]
+        model = FakeModel()
+        matrix = streaming_confusion_matrix(model, text, image_features, labels, indices, batch_size=10)
+        np.testing.assert_array_equal(
+            matrix, confusion_matrix(labels[indices], predictions[indices], labels=range(NUM_CLASSES))
+        )
+        self.assertEqual(model.rows, 77)
+        with self.assertRaises(ValueError):
+            streaming_confusion_matrix(model, text, image_features, labels + NUM_CLASSES)
+        logging.debug("Streaming confusion matrix test passed.")
+
+    def test_results_are_cached_per_model_and_dataset(self):
+        logging.info("Testing the cached evaluation of the test split.")
+        text, image_features, labels, predictions = make_dataset(400)
+        sources = {name: os.path.join(self.tmp_dir.name, file_name) for name, file_name in (
+            ('text', 'text.npz'), ('image_features', 'images.npy'), ('labels', 'labels.npy'),
+        )}
+        save_text_features(sources['text'], text)
+        np.save(sources['image_features'], image_features)
+        np.save(sources['labels'], labels)
+        package_dir = os.path.join(self.tmp_dir.name, 'dataset')
+        split_path = os.path.join(self.tmp_dir.name, 'split.npz')
+        model_path = os.path.join(self.tmp_dir.name, 'model.keras')
+        with open(model_path, 'wb') as f:
+            f.write(b"model v1")
+        cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+        registry = FakeRegistry('vectorizer.joblib', model_path, 'model.tflite')
+        registry.load_model()
+        model, version = registry.versioned_model()
+        self.assertIs(model, registry.model)
+        service = EvaluationService(cache_dir=cache_dir, batch_size=16, package_dir=package_dir, sources=sources,
+                                    split_path=split_path)
+        self.assertIsNone(service.cached(version))
+        result = service.evaluate(model, version)
+        test_indices = load_split_indices(400, path=split_path, fingerprint=result['dataset'])['test']
+        self.assertFalse(result['cached'])
+        self.assertEqual(result['rows'], len(test_indices))
+        self.assertEqual(model.rows, len(test_indices))
+        self.assertAlmostEqual(result['f1_score'], f1_score(labels[test_indices], predictions[test_indices], average='weighted'))
+
+        # Served from memory, then from disk by another worker, without running the model
+        self.assertTrue(service.evaluate(model, version)['cached'])
+        other_worker = EvaluationService(cache_dir=cache_dir, package_dir=package_dir, sources=sources)
+        self.assertEqual(other_worker.cached(version)['confusion_matrix'], result['confusion_matrix'])
+        self.assertEqual(model.rows, len(test_indices))
+
+        # A training job saved a new model: the result of the one still served stays valid
+        with open(model_path, 'wb') as f:
+            f.write(b"model v2, retrained")
+        self.assertEqual(registry.model_version, version)
+        self.assertTrue(service.evaluate(*registry.versioned_model())['cached'])
+
+        # Once loaded, the new model is evaluated again, and replaces the result of the old one
+        registry.load_model()
+        model, version = registry.versioned_model()
+        self.assertIsNone(service.cached(version))
+        self.assertFalse(service.evaluate(model, version)['cached'])
+        self.assertEqual(model.rows, len(test_indices))
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        # So are new labels: the package is updated first
+        np.save(sources['labels'], (labels + 1) % NUM_CLASSES)
+        self.assertIsNone(service.cached(version))
+        self.assertNotEqual(service.evaluate(model, version)['dataset'], result['dataset'])
+        logging.debug("Evaluation cache test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
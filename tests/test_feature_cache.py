@@ -0,0 +1,83 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import logging
+import numpy as np
+from PIL import Image
+from src.api.feature_cache import ImageFeatureCache
+from src.api.util_model import compute_image_features
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+def make_jpeg(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color=color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+class TestImageFeatureCache(unittest.TestCase):
+
+    def test_memory_tier_is_lru_bounded(self):
+        logging.info("Testing LRU eviction of the memory tier.")
+        cache = ImageFeatureCache(max_entries=2)
+        cache.put("a", np.ones(4))
+        cache.put("b", np.ones(4) * 2)
+        self.assertIsNotNone(cache.get("a"))  # "a" becomes the most recently used entry
+        cache.put("c", np.ones(4) * 3)
+        self.assertIsNone(cache.get("b"))
+        np.testing.assert_array_equal(cache.get("a"), np.ones(4))
+        np.testing.assert_array_equal(cache.get("c"), np.ones(4) * 3)
+        logging.debug("LRU eviction test passed.")
+
+    def test_disk_tier_is_shared_between_instances(self):
+        logging.info("Testing the shared on-disk tier.")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = ImageFeatureCache(max_entries=0, disk_dir=tmp_dir)
+            key = writer.key(b"image bytes")
+            writer.put(key, np.arange(4, dtype=np.float32))
+
+            reader = ImageFeatureCache(max_entries=10, disk_dir=tmp_dir)
+            np.testing.assert_array_equal(reader.get(key), np.arange(4, dtype=np.float32))
+
+            other_backbone = ImageFeatureCache(max_entries=10, disk_dir=tmp_dir, backbone_version="other")
+            self.assertIsNone(other_backbone.get(key))
+        logging.debug("Disk tier test passed.")
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        logging.info("Testing the bounded disk tier.")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ImageFeatureCache(max_entries=0, disk_dir=tmp_dir, max_disk_entries=3)
+            keys = [cache.key(f"image {index}".encode()) for index in range(5)]
+            for index, key in enumerate(keys[:3]):
+                cache.put(key, np.full(4, index, dtype=np.float32))
+                past = time.time() - 100 + index
+                os.utime(cache._disk_path(key), (past, past))
+            self.assertIsNotNone(cache.get(keys[0]))  # The oldest file becomes the most recently used
+
+            for key in keys[3:]:
+                cache.put(key, np.zeros(4, dtype=np.float32))
+            self.assertEqual([cache.get(key) is not None for key in keys], [True, False, False, True, True])
+        logging.debug("Disk eviction test passed.")
+
+    @patch('src.api.util_model.extract_image_features')
+    def test_compute_image_features_skips_backbone_on_hits(self, mock_extract):
+        logging.info("Testing that cached images skip the backbone.")
+        mock_extract.side_effect = lambda batch: np.ones((len(batch), 1280), dtype=np.float32)
+        cache = ImageFeatureCache(max_entries=10)
+        red, blue = make_jpeg('red'), make_jpeg('blue')
+
+        features, errors = compute_image_features([red, b"not an image"], cache)
+        self.assertEqual(features.shape, (2, 1280))
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(mock_extract.call_count, 1)
+
+        compute_image_features([red, blue], cache)
+        self.assertEqual(mock_extract.call_count, 2)
+        self.assertEqual(len(mock_extract.call_args[0][0]), 1)  # only the blue image was a miss
+        logging.debug("Cache hit test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
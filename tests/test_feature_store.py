@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import logging
+import numpy as np
+import scipy.sparse as sp
+from PIL import Image
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.api.database import Base, Product
+from src.api.image_features import IMAGE_FEATURE_DIM
+from src.api.feature_store import (
+    FeatureStore, feature_store_version, featurize_products, load_store_features, backfill_feature_store,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+# Stand-in for the backbone: the mean of each channel, repeated to the size of the pooled features
+def fake_extractor(batch):
+    return np.tile(np.asarray(batch).mean(axis=(1, 2)), (1, IMAGE_FEATURE_DIM // 3 + 1))[:, :IMAGE_FEATURE_DIM]
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = FeatureStore(self.root, 'backbone-v1-tfidf-abc')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_put_get_in_requested_order(self):
+        logging.info("Testing reads of features stored in several shards.")
+        text = sp.random(6, 20, density=0.3, format='csr', dtype=np.float32, random_state=0)
+        images = np.arange(24, dtype=np.float32).reshape(6, 4)
+        self.store.put([1, 2, 3], text[:3], images[:3])
+        self.store.put([4, 5, 6], text[3:], images[3:])
+
+        text_features, image_features = self.store.get([5, 1, 6])
+        np.testing.assert_array_equal(text_features.toarray(), text[[4, 0, 5]].toarray())
+        np.testing.assert_array_equal(image_features, images[[4, 0, 5]])
+        self.assertEqual(len(self.store), 6)
+        self.assertEqual(self.store.missing([1, 7, 6, 8]), [7, 8])
+        with self.assertRaises(KeyError):
+            self.store.get([1, 7])
+        logging.debug("Feature store read test passed.")
+
+    def test_latest_shard_wins_and_compact(self):
+        logging.info("Testing overwrites, compaction and a second worker.")
+        text = sp.identity(3, format='csr', dtype=np.float32)
+        self.store.put([1, 2, 3], text, np.zeros((3, 4), np.float32))
+        self.store.put([2], text[:1], np.ones((1, 4), np.float32))
+        other_worker = FeatureStore(self.root, self.store.version)
+        np.testing.assert_array_equal(other_worker.get([2])[1], np.ones((1, 4)))
+
+        self.store.compact()
+        self.assertEqual(len(os.listdir(self.store.directory)), 1)
+        # The other worker notices that its shards were merged away
+        _, image_features = other_worker.get([1, 2, 3])
+        np.testing.assert_array_equal(image_features[:, 0], [0, 1, 0])
+        logging.debug("Compaction test passed.")
+
+    def test_put_merges_recent_shards_above_max_shards(self):
+        logging.info("Testing the automatic compaction of a store written one product at a time.")
+        store = FeatureStore(self.root, 'backbone-v1-tfidf-tiered', max_shards=4)
+        text = sp.identity(40, format='csr', dtype=np.float32)
+        for product_id in range(40):
+            store.put([product_id], text[product_id], np.full((1, 4), product_id, np.float32))
+            self.assertLessEqual(len(os.listdir(store.directory)), 4)
+        store.put([3], text[3], np.full((1, 4), -1, np.float32))  # The latest features still win
+
+        text_features, image_features = FeatureStore(self.root, store.version).get(list(range(40)))
+        np.testing.assert_array_equal(text_features.toarray(), text.toarray())
+        self.assertEqual(image_features[:, 0].tolist(), [-1 if index == 3 else index for index in range(40)])
+        logging.debug("Automatic compaction test passed.")
+
+    def test_listing_is_reused_while_the_directory_is_unchanged(self):
+        logging.info("Testing the cached listing of the shards.")
+        self.store.put([1], sp.identity(1, format='csr'), np.zeros((1, 4), np.float32))
+        past = time.time() - 10
+        os.utime(self.store.directory, (past, past))
+        with patch.object(self.store, '_shard_paths', wraps=self.store._shard_paths) as shard_paths:
+            for _ in range(5):
+                self.assertIn(1, self.store)
+            self.assertEqual(shard_paths.call_count, 1)
+
+            # A shard written by another worker changes the mtime of the directory
+            FeatureStore(self.root, self.store.version).put([2], sp.identity(1, format='csr'), np.ones((1, 4), np.float32))
+            self.assertIn(2, self.store)
+            self.assertEqual(shard_paths.call_count, 2)
+        logging.debug("Cached listing test passed.")
+
+    def test_version_follows_the_vectorizer_file(self):
+        logging.info("Testing the version of the stored features.")
+        path = os.path.join(self.root, 'vectorizer.joblib')
+        with open(path, 'wb') as f:
+            f.write(b'v1')
+        version = feature_store_version('backbone-v1', path)
+        self.assertTrue(version.startswith('backbone-v1-tfidf-'))
+        with open(path, 'wb') as f:
+            f.write(b'vectorizer v2')
+        self.assertNotEqual(feature_store_version('backbone-v1', path), version)
+
+    def test_products_are_featurized_once(self):
+        logging.info("Testing featurization and backfill from the products table.")
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        for index, color in enumerate(['red', 'green', 'blue']):
+            image_path = os.path.join(self.root, f"{index}.jpg")
+            Image.new('RGB', (64, 48), color).save(image_path, 'JPEG')
+            session.add(Product(image_path=image_path, designation=f"{color} lamp", description="desk", category=str(index)))
+        session.add(Product(image_path=os.path.join(self.root, 'missing.jpg'), designation="x", description="y", category="0"))
+        session.commit()
+        products = session.query(Product).order_by(Product.id).all()
+        vectorizer = TfidfVectorizer().fit(["red lamp desk", "green lamp desk", "blue lamp desk", "x y"])
+
+        counts = backfill_feature_store(session, self.store, vectorizer, chunk_size=2, extractor=fake_extractor)
+        self.assertEqual(counts, {'featurized': 3, 'failed': 1})
+        self.assertEqual(self.store.missing([product.id for product in products]), [products[3].id])
+
+        # Training reads the stored features: no image is opened again
+        os.remove(products[0].image_path)
+        text_features, image_features, y, product_ids, errors = load_store_features(
+            self.store, vectorizer, products[:3], extractor=fake_extractor
+        )
+        self.assertEqual(product_ids, [product.id for product in products[:3]])
+        self.assertEqual(errors, {})
+        np.testing.assert_array_equal(y, [0, 1, 2])
+        np.testing.assert_allclose(text_features.toarray(), vectorizer.transform(
+            [product.designation + ' ' + product.description for product in products[:3]]).toarray(), rtol=1e-6)
+        self.assertEqual(image_features.shape, (3, IMAGE_FEATURE_DIM))
+        self.assertGreater(image_features[0, 0], image_features[0, 1])  # Red image
+        self.assertEqual(featurize_products(self.store, vectorizer, products[:3], extractor=fake_extractor), {})
+        logging.debug("Featurization test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from src.api.hashing_vectorizer import HashingTfidfVectorizer, build_hashing_vectorizer, load_text_vectorizer
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestHashingVectorizer(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = [
+            "Chaise de jardin en bois", "Table basse en verre", "Jeu de société pour enfants",
+            "Chaise pliante en métal", "Livre de cuisine italienne", "Console de jeux portable",
+        ]
+        self.tfidf = TfidfVectorizer(max_features=50).fit(self.texts)
+
+    def test_transform_matches_tfidf(self):
+        logging.info("Testing that the hashing vectorizer reproduces the TF-IDF weights.")
+        # Enough columns for the few terms not to collide
+        hashing = HashingTfidfVectorizer.from_tfidf_vectorizer(self.tfidf, n_features=2 ** 18)
+        self.assertEqual(len(np.unique(hashing.source_columns)), len(self.tfidf.vocabulary_))
+
+        texts = self.texts + ["Chaise inconnue du vocabulaire", "mot absent"]
+        expected = self.tfidf.transform(texts).toarray()
+        features = hashing.transform(texts)
+        self.assertEqual((features.shape[1], features.dtype), (2 ** 18, np.float32))
+        # Same weights, in the hashed columns; unknown terms are dropped like the vocabulary does
+        np.testing.assert_allclose(features[:, hashing.source_columns].toarray(), expected, atol=1e-6)
+        self.assertEqual(features.nnz, np.count_nonzero(expected))
+        # The dataset features of the TF-IDF vectorizer convert to the same rows
+        converted = hashing.convert_tfidf_features(self.tfidf.transform(texts))
+        np.testing.assert_allclose(converted.toarray(), features.toarray(), atol=1e-6)
+        logging.debug("Transform test passed.")
+
+    def test_collisions_and_persistence(self):
+        logging.info("Testing a small hashing vectorizer saved and loaded memory-mapped.")
+        hashing = HashingTfidfVectorizer.from_tfidf_vectorizer(self.tfidf, n_features=8)
+        features = hashing.transform(self.texts)
+        np.testing.assert_allclose(np.sqrt(features.multiply(features).sum(axis=1)).A1, np.ones(len(self.texts)), atol=1e-6)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'Hashing_Vectorizer.json')
+        hashing.save(path)
+        self.assertEqual(sorted(os.listdir(directory)), [
+            'Hashing_Vectorizer.idf.npy', 'Hashing_Vectorizer.json', 'Hashing_Vectorizer.source_columns.npy',
+        ])
+        loaded = load_text_vectorizer(path)
+        self.assertIsInstance(loaded.idf, np.memmap)
+        np.testing.assert_array_equal(loaded.transform(self.texts).toarray(), features.toarray())
+        with self.assertRaises(ValueError):
+            loaded.convert_tfidf_features(np.zeros((1, 3)))
+
+        # Reused when the number of columns is unchanged, rebuilt otherwise
+        tfidf_path = os.path.join(directory, 'Tfidf_Vectorizer.joblib')
+        from joblib import dump
+        dump(self.tfidf, tfidf_path)
+        self.assertEqual(build_hashing_vectorizer(tfidf_path, path, n_features=8).n_features, 8)
+        self.assertEqual(build_hashing_vectorizer(tfidf_path, path, n_features=16).n_features, 16)
+        self.assertEqual(load_text_vectorizer(path).n_features, 16)
+        logging.debug("Persistence test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import patch
+import logging
+import numpy as np
+import src.api.image_features as image_features
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestImageFeatures(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Build the extractor without downloading the ImageNet weights
+        image_features.load_feature_extractor(weights=None)
+
+    def test_load_feature_extractor_is_shared(self):
+        logging.info("Testing that the feature extractor is only built once.")
+        with patch('src.api.image_features.build_feature_extractor') as mock_build:
+            first = image_features.load_feature_extractor()
+            second = image_features.load_feature_extractor()
+        self.assertIs(first, second)
+        mock_build.assert_not_called()
+        logging.debug("Shared feature extractor test passed.")
+
+    def test_extract_image_features_shape(self):
+        logging.info("Testing extract_image_features output shape.")
+        batch = np.random.rand(3, 224, 224, 3).astype(np.float32)
+        features = image_features.extract_image_features(batch)
+        self.assertEqual(features.shape, (3, image_features.IMAGE_FEATURE_DIM))
+        self.assertEqual(features.dtype, np.float32)
+        logging.debug("Feature shape test passed.")
+
+    def test_extract_image_features_chunks_large_batches(self):
+        logging.info("Testing that chunked extraction matches a single pass.")
+        batch = np.random.rand(5, 224, 224, 3).astype(np.float32)
+        single_pass = image_features.extract_image_features(batch, batch_size=8)
+        chunked = image_features.extract_image_features(batch, batch_size=2)
+        np.testing.assert_allclose(single_pass, chunked, rtol=1e-4, atol=1e-5)
+        logging.debug("Chunked extraction test passed.")
+
+    def test_extract_image_features_empty_batch(self):
+        logging.info("Testing extract_image_features with an empty batch.")
+        features = image_features.extract_image_features(np.zeros((0, 224, 224, 3), dtype=np.float32))
+        self.assertEqual(features.shape, (0, image_features.IMAGE_FEATURE_DIM))
+        logging.debug("Empty batch test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
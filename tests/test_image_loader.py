@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import logging
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from src.api.image_loader import ParallelImageLoader
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+# Preprocessing stand-in: a (1, 8, 8, 3) batch of the resized image
+def small_preprocess(image):
+    return np.asarray(image.convert('RGB').resize((8, 8)), dtype=np.float32)[np.newaxis] / 255.0
+
+def jpeg_bytes(color):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+class TestParallelImageLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        colors = ['red', 'green', 'blue', 'white', 'black', 'yellow', 'gray']
+        self.sources = [jpeg_bytes(color) for color in colors]
+        # Files as well as raw bytes, one unreadable path and one invalid image
+        path = os.path.join(self.tmp_dir, 'file.jpg')
+        with open(path, 'wb') as f:
+            f.write(jpeg_bytes('purple'))
+        self.sources[2] = path
+        self.sources.insert(4, os.path.join(self.tmp_dir, 'missing.jpg'))
+        self.sources.insert(6, b'not an image')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def load_all(self, loader, batch_size=3):
+        batches = list(loader.iter_batches(self.sources, small_preprocess, batch_size))
+        indices = [index for batch_indices, _, _ in batches for index in batch_indices]
+        images = np.concatenate([batch for _, batch, _ in batches if batch is not None])
+        errors = {}
+        for _, _, batch_errors in batches:
+            errors.update(batch_errors)
+        return batches, indices, images, errors
+
+    def test_batches_keep_input_order_and_report_errors(self):
+        logging.info("Testing batching, ordering and error reporting of the image loader.")
+        batches, indices, images, errors = self.load_all(ParallelImageLoader(workers=4, prefetch=4))
+        self.assertEqual(indices, [0, 1, 2, 3, 5, 7, 8])
+        self.assertEqual([len(batch_indices) for batch_indices, _, _ in batches], [3, 3, 1])
+        self.assertEqual(images.shape, (7, 8, 8, 3))
+        self.assertTrue(errors[4].startswith("Cannot read image"))
+        self.assertTrue(errors[6].startswith("Invalid image"))
+        # Red, then green
+        self.assertGreater(images[0, 0, 0, 0], 0.9)
+        self.assertGreater(images[1, 0, 0, 1], 0.4)
+        logging.debug("Image loader ordering test passed.")
+
+    def test_threads_give_the_same_result_as_inline_decoding(self):
+        logging.info("Testing that parallel and inline decoding agree.")
+        _, inline_indices, inline_images, inline_errors = self.load_all(ParallelImageLoader(workers=0))
+        _, indices, images, errors = self.load_all(ParallelImageLoader(workers=3, prefetch=2))
+        self.assertEqual(indices, inline_indices)
+        self.assertEqual(errors.keys(), inline_errors.keys())
+        np.testing.assert_array_equal(images, inline_images)
+
+    def test_prefetch_bounds_images_loaded_ahead(self):
+        logging.info("Testing the prefetch bound of the image loader.")
+        lock = threading.Lock()
+        state = {'loaded': 0, 'consumed': 0, 'max_ahead': 0}
+
+        def counting_preprocess(image):
+            with lock:
+                state['loaded'] += 1
+                state['max_ahead'] = max(state['max_ahead'], state['loaded'] - state['consumed'])
+            return small_preprocess(image)
+
+        sources = [jpeg_bytes('red')] * 40
+        loader = ParallelImageLoader(workers=4, prefetch=5)
+        for batch_indices, _, _ in loader.iter_batches(sources, counting_preprocess, batch_size=2):
+            with lock:
+                state['consumed'] += len(batch_indices)
+        self.assertEqual(state['consumed'], 40)
+        # The images of the batch being assembled plus the prefetched ones
+        self.assertLessEqual(state['max_ahead'], 5 + 2)
+        logging.debug(f"At most {state['max_ahead']} images were loaded ahead of the consumer.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import logging
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.api.feature_store import FeatureStore, featurize_products, serving_feature_store_version
+from src.api.database import Base, Product, get_untrained_products, mark_products_trained
+from src.api.incremental_training import sample_replay_indices, fine_tune_model, run_incremental_training
+from src.api.retrain_model import build_model
+from src.api.tflite_model import metadata_path
+from src.api.training_data import compute_split_indices
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+TEXT_DIM = 50
+IMAGE_DIM = 8
+NUM_CLASSES = 3
+
+# Small dataset whose class is visible in both inputs
+def make_dataset(n_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, NUM_CLASSES, n_samples)
+    text = sp.random(n_samples, TEXT_DIM, density=0.1, format='csr', dtype=np.float32, random_state=seed)
+    text = text + sp.csr_matrix((np.ones(n_samples, dtype=np.float32), (np.arange(n_samples), labels)), shape=text.shape)
+    images = rng.normal(size=(n_samples, IMAGE_DIM)).astype(np.float32)
+    images[np.arange(n_samples), labels] += 3
+    return text.tocsr(), images, labels
+
+class TestIncrementalTraining(unittest.TestCase):
+
+    def test_sample_replay_indices(self):
+        logging.info("Testing the replay sample of the training split.")
+        train_indices = np.arange(100, 200)
+        sample = sample_replay_indices(train_indices, 30)
+        self.assertEqual(len(sample), 30)
+        self.assertEqual(len(set(sample)), 30)
+        self.assertTrue(np.all(np.diff(sample) > 0))
+        self.assertTrue(set(sample) <= set(train_indices))
+        np.testing.assert_array_equal(sample, sample_replay_indices(train_indices, 30))
+        self.assertEqual(len(sample_replay_indices(train_indices, 500)), 100)
+        logging.debug("Replay sample test passed.")
+
+    def test_fine_tune_model_mixes_new_and_replayed_rows(self):
+        logging.info("Testing fine-tuning from the current weights.")
+        X_text, images, labels = make_dataset(300)
+        splits = compute_split_indices(300)
+        new_text, new_images, new_labels = make_dataset(20, seed=1)
+        model = build_model(TEXT_DIM, IMAGE_DIM, NUM_CLASSES)
+        weights = model.get_weights()
+
+        history, replay_rows = fine_tune_model(
+            model, new_text, new_images, new_labels, X_text, images, labels, splits['train'], splits['val'],
+            replay_ratio=2, epochs=2, learning_rate=1e-3, batch_size=16,
+        )
+        self.assertEqual(replay_rows, 40)
+        self.assertLessEqual(len(history.epoch), 2)
+        self.assertAlmostEqual(float(model.optimizer.learning_rate.numpy()), 1e-3, places=6)
+        self.assertFalse(all(np.array_equal(a, b) for a, b in zip(weights, model.get_weights())))
+
+        with self.assertRaises(ValueError):
+            fine_tune_model(model, new_text, new_images, new_labels + NUM_CLASSES, X_text, images, labels,
+                            splits['train'], splits['val'], epochs=1)
+        logging.debug("Fine-tuning test passed.")
+
+    def test_run_incremental_training_marks_products_trained(self):
+        logging.info("Testing an incremental training run against a database.")
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        for index in range(6):
+            session.add(Product(image_path=f"{index}.jpg", designation="d", description="x", category="1", state=0))
+        session.add(Product(image_path="old.jpg", designation="d", description="x", category="2", state=1))
+        session.commit()
+        pending_ids = [product.id for product in get_untrained_products(session)]
+
+        X_text, images, labels = make_dataset(200)
+        new_text, new_images, new_labels = make_dataset(6, seed=2)
+        model = build_model(TEXT_DIM, IMAGE_DIM, NUM_CLASSES)
+        model_path = os.path.join(tempfile.mkdtemp(), 'model.keras')
+
+        with patch('src.api.util_model.load_product_features',
+                   return_value=(new_text, new_images, new_labels, pending_ids, {})), \
+             patch('src.api.image_features.load_feature_extractor'), \
+             patch('joblib.load'), \
+             patch('src.api.incremental_training.load_model', return_value=model), \
+             patch('src.api.incremental_training.load_dataset', return_value=(X_text, images, labels, {'fingerprint': 'abc'})), \
+             patch('src.api.incremental_training.load_split_indices', return_value=compute_split_indices(200)), \
+             patch('src.api.incremental_training.MODEL_PATH', model_path), \
+             patch('src.api.incremental_training.FEATURE_STORE_DIR', os.path.dirname(model_path)), \
+             patch('src.api.incremental_training.EXPORT_TFLITE', False):
+            result = run_incremental_training(session=session)
+
+        logging.debug(f"Incremental training result: {result}")
+        self.assertEqual(result['new_products'], 6)
+        self.assertEqual(result['replay_rows'], 12)
+        self.assertIsNotNone(result['f1_test'])
+        self.assertTrue(os.path.exists(model_path))
+        self.assertEqual(get_untrained_products(session), [])
+
+        # Nothing to do once every product is trained
+        self.assertEqual(run_incremental_training(session=session)['new_products'], 0)
+        self.assertEqual(mark_products_trained(session, []), 0)
+        logging.debug("Incremental training run test passed.")
+
+    def test_training_reads_features_ingested_with_tflite_backend(self):
+        logging.info("Testing incremental training on features ingested by the TFLite backend.")
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        for index in range(6):
+            session.add(Product(image_path=f"{index}.jpg", designation="d", description="x", category="1", state=0))
+        session.commit()
+        products = get_untrained_products(session)
+        product_ids = [product.id for product in products]
+
+        directory = tempfile.mkdtemp()
+        tflite_path = os.path.join(directory, 'model.tflite')
+        with open(metadata_path(tflite_path), 'w') as f:
+            json.dump({'backbone_version': 'efficientnetb0-imagenet-gap-v2-tflite-dynamic'}, f)
+        vectorizer_path = os.path.join(directory, 'vectorizer.pkl')
+        new_text, new_images, new_labels = make_dataset(6, seed=2)
+
+        # Ingestion in the API: the store of its warmup, filled with the TFLite backbone
+        store = FeatureStore(directory, serving_feature_store_version('tflite', tflite_path, vectorizer_path))
+        with patch('src.api.util_model.load_product_features',
+                   return_value=(new_text, new_images, new_labels, product_ids, {})):
+            self.assertEqual(featurize_products(store, None, products, extractor=lambda batch: batch), {})
+
+        X_text, images, labels = make_dataset(200)
+        model = build_model(TEXT_DIM, IMAGE_DIM, NUM_CLASSES)
+        with patch('src.api.util_model.load_product_features') as load_product_features, \
+             patch('src.api.feature_store.load_serving_extractor') as load_serving_extractor, \
+             patch('joblib.load'), \
+             patch('src.api.incremental_training.load_model', return_value=model), \
+             patch('src.api.incremental_training.load_dataset', return_value=(X_text, images, labels, {'fingerprint': 'abc'})), \
+             patch('src.api.incremental_training.load_split_indices', return_value=compute_split_indices(200)), \
+             patch('src.api.incremental_training.MODEL_PATH', os.path.join(directory, 'model.keras')), \
+             patch('src.api.incremental_training.VECTORIZER_PATH', vectorizer_path), \
+             patch('src.api.incremental_training.TFLITE_MODEL_PATH', tflite_path), \
+             patch('src.api.incremental_training.SERVING_BACKEND', 'tflite'), \
+             patch('src.api.incremental_training.FEATURE_STORE_DIR', directory), \
+             patch('src.api.incremental_training.EXPORT_TFLITE', False):
+            result = run_incremental_training(session=session)
+
+        # Every feature came from the store: no image was read and no backbone was loaded
+        self.assertEqual(result['new_products'], 6)
+        load_product_features.assert_not_called()
+        load_serving_extractor.assert_not_called()
+        self.assertEqual(get_untrained_products(session), [])
+        logging.debug("TFLite ingestion and training test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import unittest
+import logging
+from src.api.inference_executor import InferenceExecutor, InferenceQueueFull
+from src.api.batching import MicroBatcher
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestInferenceExecutor(unittest.TestCase):
+
+    def test_run_off_the_event_loop(self):
+        logging.info("Testing that work runs on the inference threads.")
+        executor = InferenceExecutor(max_workers=1, max_pending=4)
+
+        async def scenario():
+            return await executor.run(lambda: threading.current_thread().name)
+
+        thread_name = asyncio.run(scenario())
+        executor.shutdown()
+        self.assertTrue(thread_name.startswith("inference"))
+        self.assertEqual(executor.pending, 0)
+        logging.debug("Executor run test passed.")
+
+    def test_rejects_when_queue_is_full(self):
+        logging.info("Testing backpressure of the inference executor.")
+        executor = InferenceExecutor(max_workers=1, max_pending=2, retry_after=3)
+        release = threading.Event()
+        first = executor.submit(release.wait)
+        second = executor.submit(release.wait)
+        with self.assertRaises(InferenceQueueFull) as context:
+            executor.submit(release.wait)
+        self.assertEqual(context.exception.retry_after, 3)
+        release.set()
+        first.result()
+        second.result()
+        executor.shutdown()
+        self.assertEqual(executor.pending, 0)
+        logging.debug("Backpressure test passed.")
+
+    def test_batcher_rejects_when_queue_is_full(self):
+        logging.info("Testing backpressure of the micro-batcher queue.")
+        release = threading.Event()
+        executor = InferenceExecutor(max_workers=1, max_pending=4)
+
+        def process_batch(items):
+            release.wait()
+            return items
+
+        async def scenario():
+            batcher = MicroBatcher(process_batch, max_batch_size=1, max_wait_ms=0, executor=executor, max_queue_size=1)
+            running = asyncio.ensure_future(batcher.submit("running"))
+            await asyncio.sleep(0.05)
+            queued = asyncio.ensure_future(batcher.submit("queued"))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(InferenceQueueFull):
+                await batcher.submit("rejected")
+            release.set()
+            results = await asyncio.gather(running, queued)
+            await batcher.stop()
+            return results
+
+        self.assertEqual(asyncio.run(scenario()), ["running", "queued"])
+        executor.shutdown()
+        logging.debug("Batcher backpressure test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
 import io
+import os
+import tempfile
 from fastapi.testclient import TestClient
 from PIL import Image
 import unittest
 import logging
+# A temporary database, set before the app creates its engine (see conftest.py)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
 from src.api.main import app
 
 # Configure logging
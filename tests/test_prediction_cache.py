@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import logging
+from src.api.prediction_cache import (
+    MemoryPredictionBackend, SqlitePredictionBackend, PredictionCache, create_prediction_cache, normalize_text,
+)
+from src.api.startup import ModelRegistry
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FileRegistry(ModelRegistry):
+    """Registry whose models are the bytes of their file, instead of Keras models."""
+
+    def _load_servable(self, model_path, tflite_model_path):
+        with open(model_path, 'rb') as f:
+            return f.read(), None, 'backbone', [model_path]
+
+class TestPredictionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmp_dir.name, 'model.keras')
+        with open(self.model_path, 'wb') as f:
+            f.write(b"model v1")
+        self.clock = FakeClock()
+        self.registry = FileRegistry(os.path.join(self.tmp_dir.name, 'vectorizer.joblib'), self.model_path, 'model.tflite')
+        self.registry.load_model()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_cache(self, backend, ttl_seconds=60):
+        return PredictionCache(backend, lambda: self.registry.version, ttl_seconds=ttl_seconds, clock=self.clock)
+
+    def save_model(self, content):
+        with open(self.model_path, 'wb') as f:
+            f.write(content)
+
+    def test_key_ignores_whitespace_and_case(self):
+        logging.info("Testing text normalization of the cache key.")
+        cache = self.make_cache(MemoryPredictionBackend())
+        self.assertEqual(normalize_text("  Red\tShoe \n"), "red shoe")
+        self.assertEqual(cache.key("Red  Shoe", "Size 42", b"img"), cache.key("red shoe", " size 42 ", b"img"))
+        self.assertNotEqual(cache.key("Red Shoe", "Size 42", b"img"), cache.key("Red Shoe", "Size 42", b"other"))
+        logging.debug("Key normalization test passed.")
+
+    def test_ttl_and_lru_eviction(self):
+        logging.info("Testing TTL expiry and LRU eviction.")
+        cache = self.make_cache(MemoryPredictionBackend(max_entries=2), ttl_seconds=10)
+        keys = [cache.key(f"product {i}", "", b"img") for i in range(3)]
+        cache.put(keys[0], {"predicted_class": 0})
+        cache.put(keys[1], {"predicted_class": 1})
+        self.assertIsNotNone(cache.get(keys[0]))  # keys[0] becomes the most recently used entry
+        cache.put(keys[2], {"predicted_class": 2})
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), {"predicted_class": 0})
+
+        self.clock.now += 11
+        self.assertIsNone(cache.get(keys[0]))
+        logging.debug("TTL and LRU test passed.")
+
+    def test_new_model_invalidates_entries(self):
+        logging.info("Testing invalidation when a new model is loaded.")
+        for backend in (MemoryPredictionBackend(), SqlitePredictionBackend(os.path.join(self.tmp_dir.name, 'cache.sqlite'))):
+            self.save_model(b"model v1")
+            self.registry.load_model()
+            cache = self.make_cache(backend)
+            key = cache.key("Red shoe", "Size 42", b"img")
+            cache.put(key, {"predicted_class": 3, "confidence": 0.9})
+            self.assertEqual(cache.get(key), {"predicted_class": 3, "confidence": 0.9})
+
+            # A training job saved a new model, but the previous one is still the one served
+            self.save_model(b"retrained model v2")
+            self.assertEqual(cache.key("Red shoe", "Size 42", b"img"), key)
+            self.assertEqual(cache.get(key), {"predicted_class": 3, "confidence": 0.9})
+            self.assertEqual(self.registry.model, b"model v1")
+
+            self.registry.load_model()
+            new_key = cache.key("Red shoe", "Size 42", b"img")
+            self.assertNotEqual(key, new_key)
+            self.assertIsNone(cache.get(new_key))
+            self.assertEqual(len(backend), 0)
+
+            cache.put(key, {"predicted_class": 3})  # Computed by the previous model: not stored
+            self.assertEqual(len(backend), 0)
+        logging.debug("Invalidation test passed.")
+
+    def test_version_of_a_model_rewritten_while_loading(self):
+        logging.info("Testing the version of a model file rewritten while it was loaded.")
+        version = self.registry.version
+        load_servable = self.registry._load_servable
+
+        def load_then_rewrite(model_path, tflite_model_path):
+            loaded = load_servable(model_path, tflite_model_path)
+            self.save_model(b"model saved during the load")
+            return loaded
+
+        self.registry._load_servable = load_then_rewrite
+        self.registry.load_model()
+        rewritten = self.registry.version
+        self.assertNotEqual(rewritten, version)
+        del self.registry._load_servable
+        self.registry.load_model()
+        self.assertNotIn(self.registry.version, (version, rewritten))
+        logging.debug("Rewritten model test passed.")
+
+    def test_disk_backend_is_shared_and_bounded(self):
+        logging.info("Testing the SQLite backend.")
+        path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+        writer = self.make_cache(SqlitePredictionBackend(path, max_entries=2))
+        keys = [writer.key(f"product {i}", "", b"img") for i in range(3)]
+        for index, key in enumerate(keys):
+            self.clock.now += 1
+            writer.put(key, {"predicted_class": index})
+
+        reader = self.make_cache(SqlitePredictionBackend(path))
+        self.assertIsNone(reader.get(keys[0]))
+        self.assertEqual(reader.get(keys[2]), {"predicted_class": 2})
+        self.assertIsNone(create_prediction_cache('none', lambda: self.registry.version))
+        with self.assertRaises(ValueError):
+            create_prediction_cache('redis', lambda: self.registry.version)
+        logging.debug("SQLite backend test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+import tensorflow as tf
+from src.api.sparse_features import to_sparse_tensor, load_text_features, SparseFeatureDataset
+from src.api.retrain_model import build_model
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestSparseFeatures(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.text = sp.random(40, 30, density=0.1, format='csr', dtype=np.float32, random_state=0)
+        self.images = rng.random((40, 8), dtype=np.float32)
+        self.labels = rng.integers(0, 3, 40)
+
+    def test_to_sparse_tensor_matches_dense(self):
+        logging.info("Testing to_sparse_tensor conversion.")
+        tensor = to_sparse_tensor(self.text)
+        np.testing.assert_allclose(tf.sparse.to_dense(tensor).numpy(), self.text.toarray())
+        logging.debug("Sparse tensor conversion test passed.")
+
+    def test_load_text_features_converts_legacy_npy(self):
+        logging.info("Testing conversion of a legacy dense .npy file.")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            np.save(os.path.join(tmp_dir, 'features.npy'), self.text.toarray())
+            npz_path = os.path.join(tmp_dir, 'features.npz')
+            matrix = load_text_features(npz_path)
+            self.assertTrue(sp.isspmatrix_csr(matrix))
+            self.assertTrue(os.path.exists(npz_path))
+            np.testing.assert_allclose(load_text_features(npz_path).toarray(), self.text.toarray())
+        logging.debug("Legacy conversion test passed.")
+
+    def test_dataset_batches(self):
+        logging.info("Testing SparseFeatureDataset batching.")
+        dataset = SparseFeatureDataset(self.text, self.images, self.labels, batch_size=16)
+        self.assertEqual(len(dataset), 3)
+        (text_batch, image_batch), label_batch = dataset[2]
+        self.assertIsInstance(text_batch, tf.SparseTensor)
+        self.assertEqual(tuple(text_batch.dense_shape.numpy()), (8, 30))
+        self.assertEqual(image_batch.shape, (8, 8))
+        np.testing.assert_array_equal(label_batch, self.labels[32:])
+        logging.debug("Dataset batching test passed.")
+
+    def test_dataset_over_index_subset(self):
+        logging.info("Testing SparseFeatureDataset restricted to a subset of rows.")
+        indices = np.array([5, 1, 30, 12, 7])
+        dataset = SparseFeatureDataset(self.text, self.images, self.labels, batch_size=2, indices=indices)
+        self.assertEqual(len(dataset), 3)
+        (text_batch, image_batch), label_batch = dataset[0]
+        np.testing.assert_allclose(tf.sparse.to_dense(text_batch).numpy(), self.text[[5, 1]].toarray())
+        np.testing.assert_array_equal(image_batch, self.images[[5, 1]])
+        np.testing.assert_array_equal(label_batch, self.labels[[5, 1]])
+
+        shuffled = SparseFeatureDataset(self.text, self.images, self.labels, batch_size=2, shuffle=True, indices=indices)
+        seen = np.concatenate([shuffled[index][1] for index in range(len(shuffled))])
+        self.assertCountEqual(seen.tolist(), self.labels[indices].tolist())
+        logging.debug("Index subset test passed.")
+
+    def test_sparse_model_trains_and_predicts(self):
+        logging.info("Testing that the model trains and predicts on sparse input.")
+        model = build_model(30, 8, 3)
+        model.fit(SparseFeatureDataset(self.text, self.images, self.labels, batch_size=16, shuffle=True), epochs=1, verbose=0)
+        predictions = model.predict(SparseFeatureDataset(self.text, self.images, batch_size=16), verbose=0)
+        self.assertEqual(predictions.shape, (40, 3))
+        dense_predictions = model.predict_on_batch([self.text.toarray(), self.images])
+        np.testing.assert_allclose(predictions, dense_predictions, rtol=1e-4, atol=1e-5)
+        logging.debug("Sparse model test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
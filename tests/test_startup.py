@@ -0,0 +1,103 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import logging
+from src.api.startup import ModelRegistry, wait_for_database, COMPONENT_READY, COMPONENT_FAILED
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class SlowRegistry(ModelRegistry):
+    """Registry whose components take a fixed time to load instead of reading model files."""
+
+    def __init__(self, delay=0.2, failing=None):
+        super().__init__('vectorizer.joblib', 'model.keras', 'model.tflite')
+        self.delay = delay
+        self.failing = failing
+
+    def _load(self, name):
+        time.sleep(self.delay)
+        if name == self.failing:
+            raise RuntimeError(f"cannot load the {name}")
+
+    def load_vectorizer(self):
+        self._load('vectorizer')
+
+    def load_model(self):
+        self._load('model')
+
+    def load_backbone(self):
+        self._load('backbone')
+
+class TestStartup(unittest.TestCase):
+
+    def test_wait_for_database_backs_off_exponentially(self):
+        logging.info("Testing the exponential backoff of the database wait.")
+        answers = iter([False, False, False, True])
+        delays = []
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+
+        with patch('src.api.startup.asyncio.sleep', fake_sleep):
+            available = asyncio.run(wait_for_database(lambda: next(answers), initial_delay=0.5, max_delay=1.5))
+        self.assertTrue(available)
+        self.assertEqual(delays, [0.5, 1.0, 1.5])
+        logging.debug("Backoff test passed.")
+
+    def test_wait_for_database_gives_up_after_max_wait(self):
+        logging.info("Testing the maximum wait for the database.")
+        available = asyncio.run(wait_for_database(lambda: False, initial_delay=0.01, max_wait=0.05))
+        self.assertFalse(available)
+        logging.debug("Max wait test passed.")
+
+    def test_warmup_loads_components_concurrently(self):
+        logging.info("Testing the parallel warmup of the registry.")
+        registry = SlowRegistry(delay=0.3)
+        self.assertFalse(registry.models_ready)
+
+        start = time.perf_counter()
+        self.assertTrue(registry.warmup(max_workers=3))
+        self.assertLess(time.perf_counter() - start, 0.8)  # Sequential loading would take 0.9s
+
+        report = registry.status()
+        self.assertTrue(registry.models_ready)
+        self.assertFalse(report['ready'])  # The database is not ready yet
+        self.assertEqual({component['status'] for component in report['components'].values()}, {COMPONENT_READY})
+        registry.database_ready = True
+        self.assertTrue(registry.status()['ready'])
+        logging.debug("Parallel warmup test passed.")
+
+    def test_warmup_reports_failed_component(self):
+        logging.info("Testing the report of a component that failed to load.")
+        registry = SlowRegistry(delay=0, failing='model')
+        self.assertFalse(registry.warmup())
+        report = registry.status()
+        self.assertEqual(report['components']['model']['status'], COMPONENT_FAILED)
+        self.assertIn("cannot load the model", report['components']['model']['error'])
+        self.assertEqual(report['components']['backbone']['status'], COMPONENT_READY)
+        self.assertFalse(registry.models_ready)
+        logging.debug("Failed component test passed.")
+
+    def test_importing_the_app_does_not_load_the_ml_libraries(self):
+        logging.info("Testing that importing the API module leaves TensorFlow, Keras and scikit-learn to the warmup.")
+        # A fresh interpreter: the other tests of the run already imported these libraries
+        code = (
+            "import sys\n"
+            "import src.api.main\n"
+            "print(','.join(name for name in ('tensorflow', 'keras', 'sklearn') if name in sys.modules))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root, DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/test.db")
+        result = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True, timeout=300)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+        logging.debug("Lazy import test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from tensorflow.keras.models import load_model
+from src.api.retrain_model import build_model
+from src.api.sparse_features import SparseFeatureDataset
+from src.api.text_reduction import fit_text_projection
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestTextReduction(unittest.TestCase):
+
+    def setUp(self):
+        self.text = sp.random(300, 200, density=0.05, format='csr', dtype=np.float32, random_state=0)
+
+    def test_fit_text_projection(self):
+        logging.info("Testing the SVD and hashing projections of the TF-IDF features.")
+        projection = fit_text_projection(self.text, 16, 'svd', indices=np.arange(250), max_rows=100)
+        self.assertEqual((projection.shape, projection.dtype), ((200, 16), np.float32))
+        # The components of a truncated SVD are orthonormal
+        np.testing.assert_allclose(projection.T @ projection, np.eye(16), atol=1e-4)
+
+        hashing = fit_text_projection(self.text, 16, 'hashing')
+        self.assertEqual(hashing.shape, (200, 16))
+        np.testing.assert_array_equal(np.abs(hashing).sum(axis=1), np.ones(200))
+        np.testing.assert_array_equal(hashing, fit_text_projection(self.text, 16, 'hashing'))
+
+        with self.assertRaises(ValueError):
+            fit_text_projection(self.text, 200)
+        with self.assertRaises(ValueError):
+            fit_text_projection(self.text, 16, 'pca')
+        logging.debug("Projection test passed.")
+
+    def test_projection_is_a_frozen_layer_of_the_model(self):
+        logging.info("Testing a model built with a text projection.")
+        projection = fit_text_projection(self.text, 16)
+        images = np.random.default_rng(0).normal(size=(300, 8)).astype(np.float32)
+        labels = np.random.default_rng(1).integers(0, 3, 300)
+        model = build_model(200, 8, 3, text_projection=projection)
+        full_model = build_model(200, 8, 3)
+        self.assertLess(model.count_params(), full_model.count_params())
+
+        model.fit(SparseFeatureDataset(self.text, images, labels, batch_size=64), epochs=1, verbose=0)
+        np.testing.assert_array_equal(model.get_layer('text_projection').get_weights()[0], projection)
+
+        # Saved with the model: whoever loads it applies the same projection
+        path = os.path.join(tempfile.mkdtemp(), 'model.keras')
+        model.save(path)
+        loaded = load_model(path)
+        self.assertFalse(loaded.get_layer('text_projection').trainable)
+        inputs = SparseFeatureDataset(self.text, images, batch_size=300)[0][0]
+        np.testing.assert_allclose(loaded.predict_on_batch(inputs), model.predict_on_batch(inputs), atol=1e-5)
+        logging.debug("Frozen projection test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
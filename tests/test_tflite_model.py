@@ -0,0 +1,69 @@
+import os
+import json
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from src.api.image_features import IMAGE_FEATURE_DIM, load_feature_extractor
+from src.api.retrain_model import build_model
+from src.api.sparse_features import to_sparse_tensor
+from src.api.tflite_model import export_tflite, evaluate_export_parity, metadata_path, TFLiteModel
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestTFLiteExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.tflite_path = os.path.join(cls.tmp_dir.name, 'model.tflite')
+        cls.model = build_model(50, IMAGE_FEATURE_DIM, num_classes=3)
+        cls.metadata = export_tflite(
+            cls.model, cls.tflite_path, quantization='dynamic',
+            feature_extractor=load_feature_extractor(weights=None), image_size=(64, 64)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_export_writes_signatures(self):
+        logging.info("Testing the exported artifact and its metadata.")
+        self.assertTrue(os.path.exists(self.tflite_path))
+        with open(metadata_path(self.tflite_path)) as f:
+            metadata = json.load(f)
+        self.assertEqual(set(metadata['signatures']), {'classify', 'backbone', 'head'})
+        self.assertEqual(metadata['signatures']['head']['inputs']['text_input']['shape'], [-1, 50])
+        self.assertEqual(metadata['quantization'], 'dynamic')
+        self.assertTrue(metadata['backbone_version'].endswith('tflite-dynamic'))
+        logging.debug("Export metadata test passed.")
+
+    def test_head_matches_keras(self):
+        logging.info("Testing the TFLite head against the Keras model.")
+        rng = np.random.default_rng(0)
+        text = sp.random(8, 50, density=0.1, format='csr', dtype=np.float32, random_state=0)
+        image_features = rng.random((8, IMAGE_FEATURE_DIM), dtype=np.float32)
+
+        expected = np.asarray(self.model.predict_on_batch([to_sparse_tensor(text), image_features]))
+        predictions = TFLiteModel(self.tflite_path).predict_on_batch([to_sparse_tensor(text), image_features])
+        self.assertEqual(predictions.shape, (8, 3))
+        np.testing.assert_allclose(predictions, expected, atol=0.05)
+
+        report = evaluate_export_parity(self.model, self.tflite_path, text, image_features, np.argmax(expected, axis=1))
+        self.assertGreaterEqual(report['prediction_agreement'], 0.75)
+        with open(metadata_path(self.tflite_path)) as f:
+            self.assertIn('parity', json.load(f))
+        logging.debug("Head parity test passed.")
+
+    def test_backbone_extracts_pooled_features(self):
+        logging.info("Testing the TFLite backbone signature.")
+        tflite_model = TFLiteModel(self.tflite_path)
+        features = tflite_model.extract_image_features(np.zeros((3, 64, 64, 3), dtype=np.float32), batch_size=2)
+        self.assertEqual(features.shape, (3, IMAGE_FEATURE_DIM))
+        self.assertEqual(tflite_model.extract_image_features(np.zeros((0, 64, 64, 3))).shape, (0, IMAGE_FEATURE_DIM))
+        logging.debug("Backbone signature test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+import logging
+import numpy as np
+import scipy.sparse as sp
+from sklearn.model_selection import train_test_split
+from src.api.sparse_features import save_text_features
+from src.api.training_data import load_training_data, compute_split_indices, load_split_indices
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+class TestTrainingData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.paths = [os.path.join(self.tmp_dir.name, name) for name in ('text.npz', 'images.npy', 'labels.npy')]
+        self.text = sp.random(50, 20, density=0.1, format='csr', dtype=np.float32, random_state=0)
+        self.images = rng.random((50, 8), dtype=np.float32)
+        self.labels = rng.integers(0, 4, 50)
+        save_text_features(self.paths[0], self.text)
+        np.save(self.paths[1], self.images)
+        np.save(self.paths[2], self.labels)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_dense_arrays_are_memory_mapped(self):
+        logging.info("Testing that the training data is opened memory-mapped.")
+        text, images, labels = load_training_data(*self.paths)
+        self.assertIsInstance(images, np.memmap)
+        self.assertIsInstance(labels, np.memmap)
+        np.testing.assert_allclose(text.toarray(), self.text.toarray())
+        np.testing.assert_array_equal(images, self.images)
+
+        np.save(self.paths[2], self.labels[:10])
+        with self.assertRaises(ValueError):
+            load_training_data(*self.paths)
+        logging.debug("Memory-mapping test passed.")
+
+    def test_split_matches_previous_train_test_split(self):
+        logging.info("Testing that the index split reproduces the previous array splits.")
+        splits = compute_split_indices(50)
+        self.assertEqual(sorted(np.concatenate(list(splits.values())).tolist()), list(range(50)))
+
+        # Previous behaviour: train_test_split on the arrays, then again on the remainder
+        images_train, images_test = train_test_split(self.images, test_size=0.10, random_state=42)
+        images_train, images_val = train_test_split(images_train, test_size=0.20, random_state=42)
+        np.testing.assert_array_equal(self.images[splits['train']], images_train)
+        np.testing.assert_array_equal(self.images[splits['val']], images_val)
+        np.testing.assert_array_equal(self.images[splits['test']], images_test)
+        logging.debug("Split parity test passed.")
+
+    def test_split_is_persisted_per_dataset(self):
+        logging.info("Testing that the split is computed once per dataset.")
+        path = os.path.join(self.tmp_dir.name, 'split_indices.npz')
+        first = load_split_indices(50, path=path)
+        self.assertTrue(os.path.exists(path))
+        modified_at = os.path.getmtime(path)
+        second = load_split_indices(50, path=path)
+        np.testing.assert_array_equal(first['test'], second['test'])
+        self.assertEqual(os.path.getmtime(path), modified_at)
+
+        resized = load_split_indices(60, path=path)
+        self.assertEqual(sum(len(indices) for indices in resized.values()), 60)
+        logging.debug("Split persistence test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import logging
+from src.api.training_jobs import (
+    TrainingJobManager, TrainingJobRunning, JOB_SUCCEEDED, JOB_CANCELLED, JOB_RUNNING, FINISHED_STATES,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+
+# Training function run by the test jobs: a tiny model fitted with the job's callbacks
+def fake_training(callbacks=None, epochs=3, batch_delay=0.0):
+    import numpy as np
+    from tensorflow import keras
+
+    x = np.random.rand(64, 4).astype('float32')
+    y = (x.sum(axis=1) > 2).astype('int32')
+    model = keras.Sequential([keras.Input(shape=(4,)), keras.layers.Dense(2, activation='softmax')])
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    slow = keras.callbacks.LambdaCallback(on_train_batch_end=lambda batch, logs: time.sleep(batch_delay))
+    history = model.fit(x, y, batch_size=8, epochs=epochs, verbose=0, callbacks=[slow] + list(callbacks or []))
+    return {'epochs': len(history.epoch)}
+
+
+# Slow variant, to observe a running job
+def slow_fake_training(callbacks=None):
+    return fake_training(callbacks, epochs=50, batch_delay=0.05)
+
+
+class TestTrainingJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs_dir = tempfile.mkdtemp()
+        self.succeeded = threading.Event()
+        self.manager = TrainingJobManager(
+            self.jobs_dir,
+            cpu_threads=1,
+            nice=0,
+            cancel_grace=20,
+            on_success=lambda status: self.succeeded.set(),
+            targets={'full': f"{__name__}:fake_training", 'slow': f"{__name__}:slow_fake_training"},
+        )
+
+    def tearDown(self):
+        # Let the watcher threads record the outcome of the jobs before removing their files
+        deadline = time.time() + 30
+        while self.manager._processes and time.time() < deadline:
+            time.sleep(0.1)
+        shutil.rmtree(self.jobs_dir, ignore_errors=True)
+
+    def wait_for(self, job_id, states, timeout=120):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.manager.get(job_id)
+            if job and job.get('state') in states:
+                return job
+            time.sleep(0.2)
+        self.fail(f"Job {job_id} did not reach {states}: {self.manager.get(job_id)}")
+
+    def test_job_reports_epoch_metrics_and_succeeds(self):
+        logging.info("Testing a training job from start to success.")
+        job = self.manager.start('full')
+        self.assertIn(job['state'], ('queued', JOB_RUNNING))
+
+        job = self.wait_for(job['id'], FINISHED_STATES)
+        logging.debug(f"Final status: {job}")
+        self.assertEqual(job['state'], JOB_SUCCEEDED)
+        self.assertEqual(job['result'], {'epochs': 3})
+        self.assertEqual([entry['epoch'] for entry in job['metrics']], [1, 2, 3])
+        self.assertIn('loss', job['metrics'][0])
+        self.assertEqual(job['eta_seconds'], 0)
+        self.assertTrue(self.succeeded.wait(10))
+
+    def test_only_one_job_runs_and_cancel_stops_it(self):
+        logging.info("Testing the single-job lock and cancellation.")
+        job = self.manager.start('slow')
+        running = self.wait_for(job['id'], (JOB_RUNNING,))
+        self.assertEqual(running['id'], job['id'])
+
+        with self.assertRaises(TrainingJobRunning) as raised:
+            self.manager.start('full')
+        self.assertEqual(raised.exception.job_id, job['id'])
+
+        # Wait for a first ETA before cancelling
+        deadline = time.time() + 120
+        while self.manager.get(job['id']).get('eta_seconds') is None and time.time() < deadline:
+            time.sleep(0.2)
+        self.assertGreater(self.manager.get(job['id'])['eta_seconds'], 0)
+
+        self.assertTrue(self.manager.cancel(job['id'])['cancel_requested'])
+        job = self.wait_for(job['id'], FINISHED_STATES)
+        logging.debug(f"Cancelled status: {job}")
+        self.assertEqual(job['state'], JOB_CANCELLED)
+        self.assertFalse(self.succeeded.is_set())
+
+        # The lock is released once the job ended
+        deadline = time.time() + 10
+        while self.manager._processes and time.time() < deadline:
+            time.sleep(0.1)
+        job = self.manager.start('full')
+        self.assertEqual(self.wait_for(job['id'], FINISHED_STATES)['state'], JOB_SUCCEEDED)
+
+    def test_unknown_job(self):
+        logging.info("Testing lookups of unknown jobs.")
+        self.assertIsNone(self.manager.get('0123abcd'))
+        self.assertIsNone(self.manager.get('../etc'))
+        self.assertIsNone(self.manager.cancel('0123abcd'))
+        with self.assertRaises(ValueError):
+            self.manager.start('unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import io
+import json
+import zipfile
+import unittest
+import logging
+from src.api.util_batch import build_multipart_items, read_archive_items
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+
+def make_archive(manifest, files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr("manifest.json", json.dumps(manifest))
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+class TestUtilBatch(unittest.TestCase):
+
+    def test_build_multipart_items(self):
+        logging.info("Testing build_multipart_items.")
+        items = build_multipart_items(["d1", "d2"], ["x1", "x2"], [b"img1", b"too large image"], 10, 8)
+        self.assertEqual(items[0], {'designation': "d1", 'description': "x1", 'image': b"img1"})
+        self.assertIn('error', items[1])
+        logging.debug("Multipart items test passed.")
+
+    def test_build_multipart_items_length_mismatch(self):
+        logging.info("Testing build_multipart_items with mismatched lists.")
+        with self.assertRaises(ValueError):
+            build_multipart_items(["d1"], [], [b"img"], 10, 100)
+        with self.assertRaises(ValueError):
+            build_multipart_items(["d1", "d2"], ["x1", "x2"], [b"a", b"b"], 1, 100)
+        logging.debug("Length mismatch test passed.")
+
+    def test_read_archive_items_keeps_order_and_reports_errors(self):
+        logging.info("Testing read_archive_items.")
+        manifest = [
+            {"designation": "d1", "description": "x1", "image": "images/1.jpg"},
+            {"designation": "d2", "description": "x2", "image": "missing.jpg"},
+            {"designation": "d3"},
+            {"designation": "d4", "description": "x4", "image": "images/4.jpg"},
+        ]
+        archive = make_archive(manifest, {"images/1.jpg": b"one", "images/4.jpg": b"four"})
+        items = read_archive_items(archive, 10, 100)
+        self.assertEqual(len(items), 4)
+        self.assertEqual(items[0]['image'], b"one")
+        self.assertIn('error', items[1])
+        self.assertIn('error', items[2])
+        self.assertEqual(items[3]['designation'], "d4")
+        logging.debug("Archive items test passed.")
+
+    def test_read_archive_items_invalid_archive(self):
+        logging.info("Testing read_archive_items with invalid archives.")
+        with self.assertRaises(ValueError):
+            read_archive_items(b"not a zip", 10, 100)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr("images/1.jpg", b"one")
+        with self.assertRaises(ValueError):
+            read_archive_items(buffer.getvalue(), 10, 100)
+        logging.debug("Invalid archive test passed.")
+
+    def test_read_archive_items_bounds_forged_sizes(self):
+        logging.info("Testing read_archive_items with a member whose header understates its size.")
+        manifest = [
+            {"designation": "d1", "description": "x1", "image": "bomb.jpg"},
+            {"designation": "d2", "description": "x2", "image": "images/2.jpg"},
+        ]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest))
+            archive.writestr("bomb.jpg", b"\0" * (10 * 1024 * 1024))
+            archive.writestr("images/2.jpg", b"two")
+        data = bytearray(buffer.getvalue())
+        # Claim 10 bytes in the local and central headers of the 10 MB member
+        for signature, offset in ((b"PK\x03\x04", 22), (b"PK\x01\x02", 24)):
+            position = data.find(signature, data.find(signature) + 1)  # Second record: bomb.jpg
+            data[position + offset:position + offset + 4] = (10).to_bytes(4, 'little')
+
+        items = read_archive_items(bytes(data), 10, 100)
+        self.assertIn('error', items[0])
+        self.assertEqual(items[1]['image'], b"two")
+
+        # A member really larger than the limit is refused after limit + 1 bytes, from a file too
+        buffer = io.BytesIO(make_archive(manifest[1:], {"images/2.jpg": b"x" * 101}))
+        self.assertIn('error', read_archive_items(buffer, 10, 100)[0])
+        logging.debug("Forged size test passed.")
+
+    def test_read_archive_items_bounds_total_size(self):
+        logging.info("Testing the limit on the decompressed size of all the images of an archive.")
+        manifest = [{"designation": f"d{index}", "description": "x", "image": f"{index}.jpg"} for index in range(5)]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest))
+            for index in range(5):
+                archive.writestr(f"{index}.jpg", b"\0" * 80)  # Each one under the image limit
+
+        self.assertEqual(len(read_archive_items(buffer.getvalue(), 10, 100, max_total_bytes=400)), 5)
+        with self.assertRaises(ValueError):
+            read_archive_items(buffer.getvalue(), 10, 100, max_total_bytes=399)
+        # Images refused on their own do not count
+        self.assertEqual(len(read_archive_items(buffer.getvalue(), 10, 50, max_total_bytes=100)), 5)
+        logging.debug("Total size test passed.")
+
+if __name__ == '__main__':
+    unittest.main()
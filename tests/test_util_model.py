@@ -2,7 +2,9 @@ import unittest
 from unittest.mock import patch, MagicMock
 import logging
 import numpy as np
-from src.api.util_model import predict_classification, train_model_on_new_data, evaluate_model_on_untrained_data
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+from src.api.util_model import predict_classification, train_model_on_new_data, evaluate_model_on_untrained_data, preprocess_image
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -63,5 +65,72 @@ class TestUtilModel(unittest.TestCase):
         mock_evaluate.assert_called_once_with(X_text, X_image, mock_session)
         logging.debug("Model evaluation test passed.")
 
+    def test_train_without_readable_images_raises(self):
+        logging.info("Testing training when no image of the new products can be read.")
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from src.api.database import Base, Product
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        session.add_all([Product(image_path=f"missing_{index}.jpg", designation="lamp", description="desk", category="1")
+                         for index in range(3)])
+        session.commit()
+        vectorizer = TfidfVectorizer().fit(["lamp desk"])
+        model = MagicMock()
+        with self.assertRaisesRegex(ValueError, "None of the new products"):
+            train_model_on_new_data(model, vectorizer, session)
+        with self.assertRaisesRegex(ValueError, "None of the new products"):
+            evaluate_model_on_untrained_data(model, vectorizer, session)
+        model.fit.assert_not_called()
+        self.assertEqual(session.query(Product).filter(Product.state == 0).count(), 3)
+        logging.debug("Unreadable images test passed.")
+
+# Function reproducing the previous preprocessing: full decode, LANCZOS and float64 scaling
+def reference_preprocess_image(image, target_size=(224, 224)):
+    image = ImageOps.fit(image.convert('RGB'), target_size, Image.LANCZOS)
+    return (np.array(image) / 255.0)[np.newaxis]
+
+def make_photo(size=(2016, 1512), image_format='JPEG'):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size[1], 0:size[0]]
+    pixels = np.stack([x / size[0] * 255, y / size[1] * 255, (x + y) % 512 / 2], axis=-1)
+    pixels += rng.normal(0, 6, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(2))
+    draw = ImageDraw.Draw(image)
+    for _ in range(100):
+        x0, y0, radius = rng.integers(0, size[0]), rng.integers(0, size[1]), rng.integers(10, 150)
+        draw.ellipse([x0, y0, x0 + radius, y0 + radius], fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+class TestPreprocessImage(unittest.TestCase):
+
+    def test_draft_decode_matches_reference(self):
+        logging.info("Testing the reduced-resolution JPEG decode against the full decode.")
+        data = make_photo()
+        expected = reference_preprocess_image(Image.open(BytesIO(data)))
+        processed = preprocess_image(Image.open(BytesIO(data)))
+        self.assertEqual(processed.shape, (1, 224, 224, 3))
+        self.assertEqual(processed.dtype, np.float32)
+        self.assertLess(np.abs(processed - expected).mean(), 0.01)
+        self.assertLess(np.abs(processed - expected).max(), 0.15)
+        logging.debug("JPEG parity test passed.")
+
+    def test_non_jpeg_and_grayscale_inputs(self):
+        logging.info("Testing preprocessing of PNG and grayscale images.")
+        data = make_photo(size=(300, 200), image_format='PNG')
+        expected = reference_preprocess_image(Image.open(BytesIO(data)))
+        processed = preprocess_image(Image.open(BytesIO(data)))
+        self.assertLess(np.abs(processed - expected).mean(), 0.01)
+
+        grayscale = preprocess_image(Image.new('L', (64, 48), color=128))
+        self.assertEqual(grayscale.shape, (1, 224, 224, 3))
+        np.testing.assert_allclose(grayscale, 128 / 255.0, atol=1e-6)
+        logging.debug("PNG and grayscale test passed.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file